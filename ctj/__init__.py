@@ -0,0 +1,49 @@
+from .aio import AsyncIncrementalDecoder, adecode, aencode, aprobe
+from .batch import decode_many, optimize_many, probe_many
+from .coefficients import Coefficients, read_coefficients, write_coefficients
+from .compress import encode
+from .decompress import decode, decode_region
+from .errors import JpegError, JpegWarning, LimitExceededError
+from .incremental import IncrementalDecoder
+from .library import library_info
+from .mmap_jpeg_source import MmapJpegSource
+from .optimize import Optimized, optimize
+from .pool import DecoderPool, EncoderPool
+from .probe import JpegInfo, Metadata, probe, read_metadata
+from .progressive import Preview, decode_progressive
+from .requantize import requantize
+from .transform import transform
+
+__all__ = [
+    "AsyncIncrementalDecoder",
+    "Coefficients",
+    "DecoderPool",
+    "EncoderPool",
+    "IncrementalDecoder",
+    "JpegError",
+    "JpegInfo",
+    "JpegWarning",
+    "LimitExceededError",
+    "Metadata",
+    "MmapJpegSource",
+    "Optimized",
+    "Preview",
+    "adecode",
+    "aencode",
+    "aprobe",
+    "decode",
+    "decode_region",
+    "decode_many",
+    "decode_progressive",
+    "encode",
+    "library_info",
+    "optimize",
+    "optimize_many",
+    "probe",
+    "probe_many",
+    "read_coefficients",
+    "read_metadata",
+    "requantize",
+    "transform",
+    "write_coefficients",
+]
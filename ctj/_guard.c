@@ -0,0 +1,184 @@
+/*
+ * Non-local exits for libjpeg errors, which ctypes cannot make.
+ *
+ * libjpeg reports a fatal error by calling error_exit, which must not return.
+ * The C idiom is a setjmp() before each library call and a longjmp() back to
+ * it from error_exit. Python frames cannot be jumped over, so both ends are
+ * here: each ctj_call_* function calls one libjpeg function under a setjmp(),
+ * and returns 0 if it was jumped out of, 1 otherwise. The function's own
+ * result, if any, is stored through the result pointer.
+ *
+ * The jump buffer is found through the client_data field of the cinfo, which
+ * points at a struct ctj_state that the Python ErrorManager owns. A warning
+ * or progress callback written in Python can ask for the call in progress to
+ * stop by setting abort; the trampolines below jump out once the callback has
+ * returned, so that no Python frame is ever skipped.
+ *
+ * Build with "python setup.py build_ext --inplace". This is a Python extension
+ * module only so that setuptools knows how to build and install it; ctypes
+ * loads it as a plain shared library.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <setjmp.h>
+#include <stdlib.h>
+
+#ifdef _WIN32
+#define CTJ_EXPORT __declspec(dllexport)
+#else
+#define CTJ_EXPORT __attribute__((visibility("default")))
+#endif
+
+/* The start of jpeg_common_fields, which both cinfo structs begin with */
+struct ctj_common {
+    void *err;
+    void *mem;
+    void *progress;
+    void *client_data;
+};
+
+/* Kept in step with error_manager._GuardState */
+struct ctj_state {
+    jmp_buf *jump;                          /* of the innermost guarded call */
+    void (*emit_message)(void *, int);      /* Python hook for warnings */
+    void (*progress_monitor)(void *);       /* Python hook for progress */
+    int abort;                              /* a hook asked to stop */
+};
+
+#define STATE(cinfo) ((struct ctj_state *) ((struct ctj_common *) (cinfo))->client_data)
+
+static void jump_out(struct ctj_state *state)
+{
+    if (state == NULL || state->jump == NULL)
+        abort();  /* as the standard error_exit would exit(): nowhere to return to */
+    longjmp(*state->jump, 1);
+}
+
+CTJ_EXPORT void ctj_error_exit(void *cinfo)
+{
+    jump_out(STATE(cinfo));
+}
+
+CTJ_EXPORT void ctj_emit_message(void *cinfo, int msg_level)
+{
+    struct ctj_state *state = STATE(cinfo);
+    if (msg_level >= 0 || state == NULL)
+        return;  /* trace messages are for debugging libjpeg itself */
+    if (state->emit_message != NULL)
+        state->emit_message(cinfo, msg_level);
+    if (state->abort)
+        jump_out(state);
+}
+
+CTJ_EXPORT void ctj_progress_monitor(void *cinfo)
+{
+    struct ctj_state *state = STATE(cinfo);
+    if (state == NULL)
+        return;
+    if (state->progress_monitor != NULL)
+        state->progress_monitor(cinfo);
+    if (state->abort)
+        jump_out(state);
+}
+
+/* The body of each ctj_call_* function: call under a setjmp() if cinfo has a state */
+#define GUARDED(cinfo, call) \
+    { \
+        struct ctj_state *volatile state = STATE(cinfo); \
+        jmp_buf *volatile outer; \
+        jmp_buf jump; \
+        if (state == NULL) { \
+            call; \
+            return 1; \
+        } \
+        outer = state->jump; \
+        if (setjmp(jump)) { \
+            state->jump = outer; \
+            return 0; \
+        } \
+        state->jump = &jump; \
+        call; \
+        state->jump = outer; \
+        return 1; \
+    }
+
+/* Argument and result kinds, as the names of the functions below spell them */
+typedef void *P;
+typedef int I;
+typedef unsigned int U;
+typedef unsigned long L;
+typedef unsigned char B;  /* libjpeg's boolean on Windows; it is int elsewhere */
+
+#define CALL1(name, R, A) \
+    CTJ_EXPORT int ctj_call_##name(void *function, R *result, A a) \
+    GUARDED(a, *result = ((R (*)(A)) function)(a))
+#define CALL2(name, R, A, B_) \
+    CTJ_EXPORT int ctj_call_##name(void *function, R *result, A a, B_ b) \
+    GUARDED(a, *result = ((R (*)(A, B_)) function)(a, b))
+#define CALL3(name, R, A, B_, C) \
+    CTJ_EXPORT int ctj_call_##name(void *function, R *result, A a, B_ b, C c) \
+    GUARDED(a, *result = ((R (*)(A, B_, C)) function)(a, b, c))
+#define CALL5(name, R, A, B_, C, D, E) \
+    CTJ_EXPORT int ctj_call_##name(void *function, R *result, A a, B_ b, C c, D d, E e) \
+    GUARDED(a, *result = ((R (*)(A, B_, C, D, E)) function)(a, b, c, d, e))
+#define CALL6(name, R, A, B_, C, D, E, F) \
+    CTJ_EXPORT int ctj_call_##name(void *function, R *result, A a, B_ b, C c, D d, E e, F f) \
+    GUARDED(a, *result = ((R (*)(A, B_, C, D, E, F)) function)(a, b, c, d, e, f))
+
+#define CALL1V(name, A) \
+    CTJ_EXPORT int ctj_call_##name(void *function, A a) \
+    GUARDED(a, ((void (*)(A)) function)(a))
+#define CALL2V(name, A, B_) \
+    CTJ_EXPORT int ctj_call_##name(void *function, A a, B_ b) \
+    GUARDED(a, ((void (*)(A, B_)) function)(a, b))
+#define CALL3V(name, A, B_, C) \
+    CTJ_EXPORT int ctj_call_##name(void *function, A a, B_ b, C c) \
+    GUARDED(a, ((void (*)(A, B_, C)) function)(a, b, c))
+#define CALL4V(name, A, B_, C, D) \
+    CTJ_EXPORT int ctj_call_##name(void *function, A a, B_ b, C c, D d) \
+    GUARDED(a, ((void (*)(A, B_, C, D)) function)(a, b, c, d))
+#define CALL5V(name, A, B_, C, D, E) \
+    CTJ_EXPORT int ctj_call_##name(void *function, A a, B_ b, C c, D d, E e) \
+    GUARDED(a, ((void (*)(A, B_, C, D, E)) function)(a, b, c, d, e))
+
+CALL1(p_p, P, P)
+CALL1(i_p, I, P)
+CALL1(b_p, B, P)
+CALL2(i_pi, I, P, I)
+CALL2(b_pi, B, P, I)
+CALL2(i_pb, I, P, B)
+CALL2(u_pu, U, P, U)
+CALL3(i_ppp, I, P, P, P)
+CALL3(b_ppp, B, P, P, P)
+CALL3(u_ppu, U, P, P, U)
+/* The memory manager's access_virt_barray and request_virt_barray */
+CALL5(p_ppuui, P, P, P, U, U, I)
+CALL5(p_ppuub, P, P, P, U, U, B)
+CALL6(p_piiuuu, P, P, I, I, U, U, U)
+CALL6(p_pibuuu, P, P, I, B, U, U, U)
+
+CALL1V(v_p, P)
+CALL2V(v_pp, P, P)
+CALL2V(v_pi, P, I)
+CALL2V(v_pb, P, B)
+CALL3V(v_ppp, P, P, P)
+CALL3V(v_ppu, P, P, U)
+CALL3V(v_ppl, P, P, L)
+CALL3V(v_pii, P, I, I)
+CALL3V(v_pib, P, I, B)
+CALL3V(v_piu, P, I, U)
+CALL3V(v_pil, P, I, L)
+CALL3V(v_pip, P, I, P)
+CALL4V(v_pipu, P, I, P, U)
+CALL5V(v_pipii, P, I, P, I, I)
+CALL5V(v_pipib, P, I, P, I, B)
+
+static struct PyModuleDef guard_module = {
+    PyModuleDef_HEAD_INIT, "_guard", "setjmp() guards for libjpeg calls, loaded with ctypes.", -1, NULL,
+};
+
+PyMODINIT_FUNC PyInit__guard(void)
+{
+    return PyModule_Create(&guard_module);
+}
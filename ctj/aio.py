@@ -0,0 +1,181 @@
+"""
+asyncio front end to the codec.
+
+adecode(), aencode() and aprobe() run the blocking functions on a bounded
+thread pool. Only a limited number of calls may be queued at once; further
+callers wait at await, so an overloaded server slows its producers down rather
+than building an unbounded queue of images in memory. The buffers are handed to
+libjpeg with jpeg_mem_src and jpeg_mem_dest, so worker threads hold the GIL
+only between calls, and for the few callbacks that libjpeg makes into Python:
+warnings about corrupt data, and the scan counting of max_scans. (probe() reads
+headers through a Python source manager, but only a few times per image.)
+
+AsyncIncrementalDecoder decodes an image from an asyncio.StreamReader a chunk
+at a time, as it arrives, on the same bounded thread pool.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import os
+import threading
+import weakref
+from typing import AsyncIterator, Optional
+
+import numpy
+
+from .compress import encode
+from .decompress import decode
+from .incremental import IncrementalDecoder
+from .probe import JpegInfo, probe
+
+
+class BoundedExecutor(object):
+    """
+    A thread pool that lets at most max_pending calls wait for or use its workers,
+    per event loop. workers defaults to os.cpu_count(), and max_pending to 4 * workers.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.max_pending = max_pending if max_pending is not None else 4 * self.workers
+        if self.workers < 1 or self.max_pending < 1:
+            raise ValueError("workers and max_pending must be at least 1")
+        self._executor = None
+        self._lock = threading.Lock()
+        # asyncio.Semaphore belongs to one event loop, so each loop gets its own
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="ctj-aio")
+            return self._executor
+
+    async def run(self, function, *args, **kwargs):
+        """Call function(*args, **kwargs) on a worker thread, once there is room for it."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+        async with semaphore:
+            return await loop.run_in_executor(self._get_executor(), functools.partial(function, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# Shared by the functions below when no executor is given
+default_executor = BoundedExecutor()
+
+
+def _check_buffer(buf) -> None:
+    if hasattr(buf, "read"):
+        raise TypeError("Read the whole file first, or decode it with AsyncIncrementalDecoder, "
+                        "so that worker threads do not wait on reads")
+
+
+async def adecode(buf, executor: Optional[BoundedExecutor] = None, **options) -> numpy.ndarray:
+    """decode() a bytes-like object or file descriptor on a worker thread."""
+    _check_buffer(buf)
+    return await (default_executor if executor is None else executor).run(decode, buf, **options)
+
+
+async def aencode(image, executor: Optional[BoundedExecutor] = None, **options):
+    """encode() an image on a worker thread."""
+    return await (default_executor if executor is None else executor).run(encode, image, **options)
+
+
+async def aprobe(source, executor: Optional[BoundedExecutor] = None, **options) -> JpegInfo:
+    """probe() a path, file or buffer on a worker thread."""
+    return await (default_executor if executor is None else executor).run(probe, source, **options)
+
+
+class AsyncIncrementalDecoder(object):
+    """
+    Decodes a JPEG image from an asyncio.StreamReader as its data arrives.
+
+    Each chunk of up to chunk_size bytes is fed to an IncrementalDecoder on a
+    worker thread of executor, or of default_executor, one chunk at a time, so
+    the event loop only waits for data. Iterate with async for to get the rows
+    as they are decoded, or await read() for the whole image. options are
+    passed to IncrementalDecoder.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, chunk_size: int = 1 << 16,
+                 executor: Optional[BoundedExecutor] = None, **options):
+        self.reader = reader
+        self.chunk_size = chunk_size
+        self.executor = default_executor if executor is None else executor
+        self.decoder = IncrementalDecoder(**options)
+        self._pending: Optional[asyncio.Future] = None  # the call of the decoder on a worker
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def _run(self, function, *args):
+        # A worker thread cannot be stopped: if the caller is cancelled, the call goes on,
+        # and close() waits for it
+        self._pending = asyncio.ensure_future(self.executor.run(function, *args))
+        return await asyncio.shield(self._pending)
+
+    def __aiter__(self) -> AsyncIterator[numpy.ndarray]:
+        return self.rows()
+
+    async def rows(self) -> AsyncIterator[numpy.ndarray]:
+        """Yield each batch of newly decoded rows, until the image is done or the stream ends."""
+        decoder = self.decoder
+        while not decoder.done:
+            chunk = await self.reader.read(self.chunk_size)
+            rows = await (self._run(decoder.feed, chunk) if chunk else self._run(decoder.finish))
+            if rows is not None and len(rows):
+                yield rows
+            if not chunk:
+                break
+
+    async def read(self) -> numpy.ndarray:
+        """Decode the whole image, and return it."""
+        async for _ in self.rows():
+            pass
+        return self.decoder.image
+
+    @property
+    def image(self) -> Optional[numpy.ndarray]:
+        return self.decoder.image
+
+    @property
+    def done(self) -> bool:
+        return self.decoder.done
+
+    @property
+    def truncated(self) -> bool:
+        return self.decoder.truncated
+
+    def close(self) -> None:
+        """Give the decompression object back, once the decoder is not in use on a worker thread."""
+        pending, self._pending = self._pending, None
+        if pending is not None and not pending.done():
+            pending.add_done_callback(self._close_after)
+        else:
+            self.decoder.close()
+
+    def _close_after(self, pending: asyncio.Future) -> None:
+        if not pending.cancelled():
+            pending.exception()  # retrieved, so that asyncio does not log it
+        self.decoder.close()
+
+
+__all__ = [
+    "AsyncIncrementalDecoder",
+    "BoundedExecutor",
+    "adecode",
+    "aencode",
+    "aprobe",
+    "default_executor",
+]
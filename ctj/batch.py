@@ -0,0 +1,337 @@
+"""
+Probing, decoding, optimizing and transcoding many images at once.
+
+ctypes releases the GIL for the whole of each libjpeg call, so worker threads
+decode in parallel. With memory sources libjpeg calls back into Python only to
+report corrupt data, and to count the scans of a progressive image when
+max_scans is set; otherwise only the setup of each image and the
+jpeg_read_scanlines loop take the GIL, briefly.
+
+transcode() uses worker processes instead, and hands results back in shared
+memory blocks, so large images are never pickled through a pipe.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import itertools
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy
+
+from .compress import encode
+from .decompress import decode
+from .optimize import optimize
+from .pixel_formats import PixelFormat
+from .pool import DecoderPool
+from .probe import probe
+
+
+def _run(executor: concurrent.futures.Executor, task: Callable, items: Iterable, ordered: bool, prefetch: int,
+         discard: Optional[Callable] = None):
+    """
+    Submit task(item) for each item, keeping at most prefetch results unconsumed,
+    and yield (index, future) pairs in order or as they complete. Unfinished
+    tasks are cancelled when the generator is closed, and discard(result) is
+    called for each result that was computed but never consumed.
+    """
+    numbered = enumerate(items)
+    pending = collections.OrderedDict(
+        (executor.submit(task, item), index) for index, item in itertools.islice(numbered, prefetch))
+    try:
+        while pending:
+            if ordered:
+                done = [next(iter(pending))]
+                concurrent.futures.wait(done)
+            else:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                pending.update((executor.submit(task, item), i) for i, item in itertools.islice(numbered, 1))
+                yield index, future
+    finally:
+        for future in pending:
+            if not future.cancel() and discard is not None and future.exception() is None:
+                discard(future.result())
+
+
+def _map_many(func: Callable, items: Iterable, workers: int, ordered: bool, prefetch: Optional[int],
+              name: str) -> Iterator:
+    """
+    The body of decode_many() and the like: func(item) for each item on a pool of
+    worker threads named after name, yielding results as decode_many() does.
+    """
+    prefetch = prefetch if prefetch is not None else 2 * workers
+    if workers < 1 or prefetch < 1:
+        raise ValueError("workers and prefetch must be at least 1")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ctj-{name}") as executor, \
+            contextlib.closing(_run(executor, func, items, ordered, prefetch)) as results:
+        for index, future in results:
+            yield future.result() if ordered else (index, future.result())
+
+
+def decode_many(
+        buffers: Iterable,
+        workers: Optional[int] = None,
+        ordered: bool = True,
+        pixel_format: Optional[PixelFormat] = None,
+        prefetch: Optional[int] = None,
+        pool: Optional[DecoderPool] = None,
+        **decode_options,
+) -> Iterator:
+    """
+    Decode each JPEG buffer of an iterable with decode(), on a pool of worker threads.
+    decode_options, such as max_size, are passed on to decode().
+
+    If ordered is true, images are yielded in the order of buffers; otherwise
+    (index, image) pairs are yielded as soon as each image is done. workers
+    defaults to os.cpu_count(). At most prefetch buffers (default 2 * workers)
+    are taken from buffers ahead of the results consumed, so it may be a lazy
+    stream of any length. An exception raised while decoding is raised here when
+    its result is reached, and the remaining buffers are abandoned.
+    """
+    workers = workers if workers is not None else os.cpu_count() or 1
+    task = functools.partial(decode, pixel_format=pixel_format, pool=pool, **decode_options)
+    return _map_many(task, buffers, workers, ordered, prefetch, "decode")
+
+
+def probe_many(
+        sources: Iterable,
+        workers: Optional[int] = None,
+        ordered: bool = True,
+        prefetch: Optional[int] = None,
+        **probe_options,
+) -> Iterator:
+    """
+    probe() each path, file or buffer of an iterable, on a pool of worker threads.
+
+    Reading files releases the GIL, so with many more workers than cores the
+    I/O of some files overlaps the parsing of others; workers defaults to 32.
+    ordered and prefetch are as for decode_many().
+    """
+    workers = workers if workers is not None else 32
+    return _map_many(functools.partial(probe, **probe_options), sources, workers, ordered, prefetch, "probe")
+
+
+def optimize_many(
+        buffers: Iterable,
+        workers: Optional[int] = None,
+        ordered: bool = True,
+        prefetch: Optional[int] = None,
+        **optimize_options,
+) -> Iterator:
+    """
+    optimize() each JPEG buffer or file of an iterable, on a pool of worker threads.
+    optimize_options, such as progressive and copy_markers, are passed on to optimize().
+
+    Each result is an Optimized, whose saved bytes can be added up as they come.
+    workers, ordered and prefetch are as for decode_many().
+    """
+    workers = workers if workers is not None else os.cpu_count() or 1
+    return _map_many(functools.partial(optimize, **optimize_options), buffers, workers, ordered, prefetch, "optimize")
+
+
+class WorkerStats(NamedTuple):
+    images: int
+    pixels: int  # decoded pixels
+    input_bytes: int
+    output_bytes: int
+    seconds: float  # time spent reading, decoding and encoding, excluding idle time
+
+    @property
+    def megapixels_per_second(self) -> float:
+        return self.pixels / self.seconds / 1e6 if self.seconds else 0.0
+
+    @property
+    def images_per_second(self) -> float:
+        return self.images / self.seconds if self.seconds else 0.0
+
+
+class TranscodeResult(object):
+    """
+    One image from transcode(), held in a shared memory block until close().
+
+    data is a memoryview of the JPEG stream or, when transcoding to pixels, a
+    NumPy array of shape (height, width, bytes_per_pixel). Both refer to the
+    shared memory directly: copy them to keep them after close().
+    """
+
+    def __init__(self, path, block_name: str, shape: Tuple[int, ...], worker: int, input_bytes: int,
+                 seconds: float):
+        self.path = path
+        self.worker = worker  # process id of the worker that produced the image
+        self.input_bytes = input_bytes
+        self.seconds = seconds
+        self._block = shared_memory.SharedMemory(name=block_name)
+        if len(shape) == 1:
+            self.data = self._block.buf[:shape[0]]
+        else:
+            self.data = numpy.ndarray(shape, dtype=numpy.uint8, buffer=self._block.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.path!r}>"
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def close(self) -> None:
+        """Free the shared memory block. Fails if views of data are still in use."""
+        if self._block is not None:
+            data, self.data = self.data, None
+            if isinstance(data, memoryview):
+                data.release()
+            del data
+            self._block.close()
+            self._block.unlink()
+            self._block = None
+
+
+def _transcode_file(path, pixel_format, reencode, progressive, encode_options) -> tuple:
+    """Worker process side of transcode(): leaves the result in a new shared memory block."""
+    start = time.perf_counter()
+    with open(path, "rb") as file:
+        data = file.read()
+    image = decode(data, pixel_format=pixel_format)
+    pixels = image.shape[0] * image.shape[1]
+    if reencode:
+        if pixel_format is None and image.shape[2] == 4:
+            pixel_format = "CMYK"  # what decode() gives for CMYK and YCCK images by default
+        result = numpy.frombuffer(encode(image, pixel_format=pixel_format, progressive=progressive, **encode_options),
+                                  dtype=numpy.uint8)
+    else:
+        result = image
+    block = shared_memory.SharedMemory(create=True, size=result.nbytes)
+    try:
+        numpy.ndarray(result.shape, dtype=numpy.uint8, buffer=block.buf)[...] = result
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    block.close()
+    # The parent process takes the block over and unlinks it, so this process must
+    # not have its resource tracker "clean up" the block when it exits
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block.name, result.shape, os.getpid(), len(data), pixels, time.perf_counter() - start
+
+
+def _discard(result: tuple) -> None:
+    block = shared_memory.SharedMemory(name=result[0])
+    block.close()
+    block.unlink()
+
+
+class Transcode(object):
+    """
+    Iterator over the TranscodeResult objects of one transcode() call.
+
+    stats maps each worker's process id to its WorkerStats so far, and is
+    updated as results are consumed.
+    """
+
+    def __init__(self, results: Iterator, paths: Dict[int, object], ordered: bool, executor):
+        self.stats: Dict[int, WorkerStats] = {}
+        self._results = results
+        self._paths = paths
+        self._ordered = ordered
+        self._executor = executor
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            index, future = next(self._results)
+        except StopIteration:
+            self.close()
+            raise
+        block_name, shape, worker, input_bytes, pixels, seconds = future.result()
+        result = TranscodeResult(self._paths.pop(index), block_name, shape, worker, input_bytes, seconds)
+        previous = self.stats.get(worker, WorkerStats(0, 0, 0, 0, 0.0))
+        self.stats[worker] = WorkerStats(
+            previous.images + 1,
+            previous.pixels + pixels,
+            previous.input_bytes + input_bytes,
+            previous.output_bytes + result.nbytes,
+            previous.seconds + seconds,
+        )
+        return result if self._ordered else (index, result)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def total(self) -> WorkerStats:
+        """The stats of all workers added together."""
+        return WorkerStats(*(sum(column) for column in zip(WorkerStats(0, 0, 0, 0, 0.0), *self.stats.values())))
+
+    def close(self) -> None:
+        """Stop transcoding, freeing the shared memory of any results not yet consumed."""
+        if self._executor is not None:
+            self._results.close()
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def transcode(
+        paths: Iterable,
+        workers: Optional[int] = None,
+        ordered: bool = True,
+        pixel_format: Optional[PixelFormat] = None,
+        reencode: bool = True,
+        progressive: bool = False,
+        prefetch: Optional[int] = None,
+        **encode_options,
+) -> Transcode:
+    """
+    Decode each JPEG file in paths and encode it again, in a pool of worker processes.
+
+    encode_options, such as quality and subsampling, are passed to encode(). The
+    results are progressive if progressive is true, with the scans of
+    jpeg_simple_progression, as optimize() makes them. If reencode is false the
+    decoded pixels are returned instead. Each result is a
+    TranscodeResult whose data lives in shared memory; close it when done. If
+    ordered is false, (index, result) pairs are produced as soon as each one is
+    done. workers and prefetch are as for decode_many(). The returned iterator
+    also collects per-worker throughput in its stats attribute.
+    """
+    workers = workers if workers is not None else os.cpu_count() or 1
+    prefetch = prefetch if prefetch is not None else 2 * workers
+    if workers < 1 or prefetch < 1:
+        raise ValueError("workers and prefetch must be at least 1")
+    paths_by_index = {}
+
+    def numbered_paths():
+        for index, path in enumerate(paths):
+            paths_by_index[index] = path
+            yield path
+
+    task = functools.partial(_transcode_file, pixel_format=pixel_format, reencode=reencode, progressive=progressive,
+                             encode_options=encode_options)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    results = _run(executor, task, numbered_paths(), ordered, prefetch, discard=_discard)
+    return Transcode(results, paths_by_index, ordered, executor)
+
+
+__all__ = [
+    "Transcode",
+    "TranscodeResult",
+    "WorkerStats",
+    "decode_many",
+    "optimize_many",
+    "probe_many",
+    "transcode",
+]
@@ -0,0 +1,380 @@
+"""
+DCT coefficients of JPEG images, seen as NumPy arrays.
+
+libjpeg keeps the quantized coefficients of each component in a virtual block
+array, which jpeg_read_coefficients fills and jpeg_write_coefficients codes.
+Unless max_memory_to_use is set, which ctj never does, a realized array is held
+in memory whole, in one allocation of up to a gigabyte, so its rows of blocks
+can be seen as one NumPy array without copying.
+
+read_coefficients() returns such views; the decompressor that owns their memory
+stays out of its pool until the last of them is garbage collected.
+write_coefficients() codes coefficients from any arrays of the right shape.
+"""
+
+import ctypes
+import os
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy
+
+from .decompress import _open_input, _raise_source_error
+from .error_manager import guarded_method
+from .jpeglib import (
+    DCTSIZE,
+    DCTSIZE2,
+    C_MAX_BLOCKS_IN_MCU,
+    J_COLOR_SPACE,
+    JBLOCK,
+    JPEG_HEADER_OK,
+    JPOOL_IMAGE,
+    MAX_SAMP_FACTOR,
+    NUM_QUANT_TBLS,
+    j_common_ptr,
+    jpeg_add_quant_table,
+    jpeg_finish_compress,
+    jpeg_read_coefficients,
+    jpeg_read_header,
+    jpeg_save_markers,
+    jpeg_set_colorspace,
+    jpeg_set_defaults,
+    jpeg_simple_progression,
+    jpeg_write_coefficients,
+    jvirt_barray_ptr,
+)
+from .library import c_free
+from .limits import DecodeLimits
+from .pool import Decompressor, DecoderPool, EncoderPool, default_decoder_pool, default_encoder_pool
+
+# From jmorecfg.h
+JPEG_MAX_DIMENSION = 65500
+MAX_COMPONENTS = 10
+
+# Huffman coding takes AC coefficients of up to 10 bits, and differences of DC
+# coefficients of up to 11 bits; libjpeg-turbo does not check that when coding
+_AC_LIMIT = 1023
+_DC_RANGE = (-1024, 1023)
+
+
+def request_block_arrays(handle, shapes: Sequence[Tuple[int, int]]) -> ctypes.Array:
+    """
+    Ask the memory manager of handle, a Decompressor or Compressor, for one virtual
+    block array of (rows, columns) blocks per shape, for the current image. They
+    are realized by the next jpeg_read_coefficients or jpeg_write_coefficients.
+    """
+    request = guarded_method(handle.cinfo.mem.contents.request_virt_barray)
+    common = ctypes.cast(handle.c_info, j_common_ptr)
+    arrays = (jvirt_barray_ptr * len(shapes))()
+    for i, (rows, columns) in enumerate(shapes):
+        # maxaccess is all the rows, so that block_array_view can define them in one call
+        arrays[i] = request(common, JPOOL_IMAGE, False, columns, rows, rows)
+    return arrays
+
+
+class Coefficients(NamedTuple):
+    blocks: Tuple[numpy.ndarray, ...]  # (rows, columns, DCTSIZE2) int16 blocks of each component
+    quant_tables: Tuple[numpy.ndarray, ...]  # (DCTSIZE2,) uint16 quantizers of each component
+    width: int
+    height: int
+    colorspace: J_COLOR_SPACE  # of the coded components
+    sampling: Tuple[Tuple[int, int], ...]  # (h_samp_factor, v_samp_factor) of each component
+    progressive: bool
+
+
+def block_shape(width: int, height: int, sampling: Sequence[Tuple[int, int]], component: int) -> Tuple[int, int]:
+    """(rows, columns) of blocks that libjpeg codes for a component of an image."""
+    h, v = sampling[component]
+    max_h = max(factors[0] for factors in sampling)
+    max_v = max(factors[1] for factors in sampling)
+    return -(-height * v // (max_v * DCTSIZE)), -(-width * h // (max_h * DCTSIZE))
+
+
+def block_array_view(handle, array, rows: int, columns: int, writable: bool = False, owner=None) -> numpy.ndarray:
+    """
+    (rows, columns, DCTSIZE2) int16 view of the top left blocks of a realized
+    virtual block array of handle, in natural (not zigzag) order. It is only
+    valid until the memory of the current image is freed; the view keeps owner
+    alive, to put that off.
+
+    A writable view counts as writing every row: rows must then be all the rows of
+    an array from request_block_arrays, and every block that libjpeg will read
+    must be filled in.
+    """
+    access = guarded_method(handle.cinfo.mem.contents.access_virt_barray)
+    common = ctypes.cast(handle.c_info, j_common_ptr)
+    # Arrays that libjpeg requested itself may only be accessed a few rows at a time,
+    # but when the array is in memory whole, the rows accessed are followed by the rest
+    first = access(common, array, 0, rows if writable else 1, writable)
+    last = access(common, array, rows - 1, 1, writable)
+    pointer_size = ctypes.sizeof(ctypes.c_void_p)
+    start = ctypes.cast(first, ctypes.c_void_p).value
+    if ctypes.cast(last, ctypes.c_void_p).value != start + (rows - 1) * pointer_size:
+        raise ValueError("Coefficient array is not held in memory whole")
+    addresses = numpy.ctypeslib.as_array(ctypes.cast(first, ctypes.POINTER(ctypes.c_size_t)), (rows,))
+    block_size = ctypes.sizeof(JBLOCK)
+    stride = int(addresses[1] - addresses[0]) if rows > 1 else columns * block_size
+    if stride < columns * block_size or numpy.any(numpy.diff(addresses) != stride):
+        raise ValueError("Coefficient array over 1 GB is not contiguous")
+    size = (rows - 1) * stride + columns * block_size
+    memory = (ctypes.c_char * size).from_address(int(addresses[0]))
+    memory.owner = owner
+    view = numpy.ndarray((rows, columns, DCTSIZE2), dtype=numpy.int16, buffer=memory,
+                         strides=(stride, block_size, block_size // DCTSIZE2))
+    view.flags.writeable = writable
+    return view
+
+
+class _ImageMemory(object):
+    """Stands for the memory of a decompressor's image, for as long as views of it are in use."""
+
+
+class _CoefficientReader(object):
+    """
+    Reads the quantized DCT coefficients of buf on entering, into arrays, as
+    read_coefficients() does, with the APPn and COM markers whose codes are in
+    save kept for the caller, and gives the decompression object back to pool on
+    exit. input_bytes is the size of the stream, or what was read of a file object.
+    """
+
+    def __init__(self, buf, pool: Optional[DecoderPool] = None, save: Iterable[int] = (),
+                 max_scans: Optional[int] = None, max_pixels: Optional[int] = None,
+                 max_memory: Optional[int] = None, warnings_as_errors: bool = False):
+        self.buf = buf
+        self.pool = default_decoder_pool if pool is None else pool
+        self.save = tuple(save)
+        self.limits = DecodeLimits(max_scans=max_scans, max_pixels=max_pixels, max_memory=max_memory)
+        self.warnings_as_errors = warnings_as_errors
+        self.decompressor: Optional[Decompressor] = None
+        self.arrays = None
+        self.input_bytes: Optional[int] = None
+        self._source = None
+        self._owner = None
+
+    def __enter__(self) -> "_CoefficientReader":
+        data, self._source = _open_input(self.buf)
+        if data is not None:
+            self.input_bytes = data.size
+        elif self._source is None:
+            self.input_bytes = os.fstat(self.buf).st_size - os.lseek(self.buf, 0, os.SEEK_CUR)
+        self.decompressor = self.pool.acquire()
+        try:
+            self._read(data)
+        except BaseException:
+            self._release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._release()
+
+    def _read(self, data: Optional[numpy.ndarray]) -> None:
+        decompressor = self.decompressor
+        decompressor.errors.warnings_as_errors = self.warnings_as_errors
+        c_info = decompressor.c_info
+        cinfo = decompressor.cinfo
+        source = self._source
+        if source is not None:
+            source.attach(decompressor)
+        elif data is None:
+            decompressor.file_source(self.buf)
+        else:
+            decompressor.memory_source(data.ctypes.data, data.size)
+        for code in self.save:
+            jpeg_save_markers(c_info, code, 0xFFFF)
+        if jpeg_read_header(c_info, True) != JPEG_HEADER_OK:
+            _raise_source_error(source)
+            raise ValueError("No image in JPEG buffer")
+        if cinfo.data_precision != 8:
+            raise ValueError(f"Unsupported JPEG sample precision {cinfo.data_precision}")
+        limits = self.limits
+        if limits:
+            limits.check_header(decompressor, buffered=True)
+        self.arrays = jpeg_read_coefficients(c_info)
+        if limits:
+            limits.check()
+        if not self.arrays:
+            _raise_source_error(source)
+            raise ValueError("JPEG data source suspended")
+        if source is not None:
+            self.input_bytes = source.bytes_read + source.bytes_skipped
+
+    def quant_tables(self) -> List[numpy.ndarray]:
+        """The quantization table of each component, as it was when the component's first scan began."""
+        cinfo = self.decompressor.cinfo
+        tables = []
+        for i in range(cinfo.num_components):
+            component = cinfo.comp_info[i]
+            table = component.quant_table or cinfo.quant_tbl_ptrs[component.quant_tbl_no]
+            if not table:
+                raise ValueError(f"No quantization table for component {i}")
+            tables.append(numpy.array(table.contents.quantval, dtype=numpy.uint16))
+        return tables
+
+    def hold(self, owner) -> None:
+        """Keep the decompression object, and so its arrays, out of the pool after exit, until owner is collected."""
+        self._owner = owner
+
+    def _release(self) -> None:
+        decompressor, self.decompressor = self.decompressor, None
+        if decompressor is None:
+            return
+        if not decompressor.failed:
+            for code in self.save:
+                jpeg_save_markers(decompressor.c_info, code, 0)
+        if self._source is not None:
+            decompressor.cinfo.src = None  # the decompressor must not keep source alive
+        if self._owner is None:
+            self.pool.release(decompressor)
+        else:
+            self.pool.release_later(decompressor, self._owner)
+
+
+def read_coefficients(
+        buf,
+        pool: Optional[DecoderPool] = None,
+        max_scans: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+        max_memory: Optional[int] = None,
+        warnings_as_errors: bool = False,
+) -> Coefficients:
+    """
+    Read the quantized DCT coefficients of a JPEG image, without decoding it.
+
+    buf and the other arguments are as for decode(). The blocks of each component
+    are a read-only view of libjpeg's own buffer, whose rows of blocks that libjpeg
+    pads the image with are left out; multiply them by quant_tables to dequantize.
+    The decompression object, borrowed from pool, is held until every view, or
+    array derived from one without copying, is garbage collected. It then goes
+    back to the pool if that happens on the thread that read the image, and is
+    destroyed otherwise.
+    """
+    with _CoefficientReader(buf, pool, max_scans=max_scans, max_pixels=max_pixels, max_memory=max_memory,
+                            warnings_as_errors=warnings_as_errors) as reader:
+        decompressor = reader.decompressor
+        cinfo = decompressor.cinfo
+        owner = _ImageMemory()
+        reader.hold(owner)
+        blocks = []
+        for i in range(cinfo.num_components):
+            component = cinfo.comp_info[i]
+            blocks.append(block_array_view(decompressor, reader.arrays[i], component.height_in_blocks,
+                                           component.width_in_blocks, owner=owner))
+        return Coefficients(
+            blocks=tuple(blocks),
+            quant_tables=tuple(reader.quant_tables()),
+            width=cinfo.image_width,
+            height=cinfo.image_height,
+            colorspace=J_COLOR_SPACE(cinfo.jpeg_color_space),
+            sampling=tuple((cinfo.comp_info[i].h_samp_factor, cinfo.comp_info[i].v_samp_factor)
+                           for i in range(cinfo.num_components)),
+            progressive=bool(cinfo.progressive_mode),
+        )
+
+
+def write_coefficients(
+        coefficients: Coefficients,
+        progressive: bool = False,
+        optimize: bool = False,
+        pool: Optional[EncoderPool] = None,
+) -> bytes:
+    """
+    Code quantized DCT coefficients as a JPEG image, and return the stream.
+
+    coefficients is as read_coefficients() returns it, or made up likewise: blocks
+    may be any integer arrays of the shape that block_shape() gives, and
+    components that share a quantization table get a single DQT entry; at most
+    four different tables are possible. The result is baseline, unless a table
+    needs 16-bit values, or progressive is true; optimize computes Huffman tables
+    for it. The compression object is borrowed from pool.
+    """
+    width, height = coefficients.width, coefficients.height
+    sampling = coefficients.sampling
+    components = len(coefficients.blocks)
+    # libjpeg reports these with errors that it cannot recover from when error_exit returns
+    if not 0 < components <= MAX_COMPONENTS:
+        raise ValueError(f"JPEG images have 1 to {MAX_COMPONENTS} components, not {components}")
+    if len(sampling) != components or len(coefficients.quant_tables) != components:
+        raise ValueError(f"Coefficients of {components} components need as many sampling factors and tables")
+    if not 0 < width <= JPEG_MAX_DIMENSION or not 0 < height <= JPEG_MAX_DIMENSION:
+        raise ValueError(f"Cannot encode a {width}x{height} image as JPEG")
+    if any(not (0 < h <= MAX_SAMP_FACTOR and 0 < v <= MAX_SAMP_FACTOR) for h, v in sampling) \
+            or components > 1 and sum(h * v for h, v in sampling) > C_MAX_BLOCKS_IN_MCU:
+        raise ValueError(f"Unsupported sampling factors {tuple(sampling)}")
+    blocks = []
+    for i, component in enumerate(coefficients.blocks):
+        component = numpy.asarray(component)
+        shape = block_shape(width, height, sampling, i) + (DCTSIZE2,)
+        if component.shape != shape:
+            raise ValueError(f"Component {i} has blocks of shape {component.shape}, but the image needs {shape}")
+        dc = component[..., 0]
+        if component.size and (numpy.abs(component[..., 1:]).max() > _AC_LIMIT
+                               or not _DC_RANGE[0] <= dc.min() <= dc.max() <= _DC_RANGE[1]):
+            raise ValueError(f"Component {i} has coefficients out of the range that JPEG can code")
+        blocks.append(component)
+    tables = []  # distinct quantization tables, as bytes
+    table_numbers = []
+    for i, table in enumerate(coefficients.quant_tables):
+        table = numpy.asarray(table).reshape(DCTSIZE2)
+        if table.min() < 1 or table.max() > 32767:
+            raise ValueError(f"Quantization table of component {i} has values outside 1 to 32767")
+        key = table.astype(numpy.uint32).tobytes()
+        if key not in tables:
+            tables.append(key)
+        table_numbers.append(tables.index(key))
+    if len(tables) > NUM_QUANT_TBLS:
+        raise ValueError(f"JPEG allows {NUM_QUANT_TBLS} quantization tables, not {len(tables)}")
+
+    buffer = ctypes.POINTER(ctypes.c_ubyte)()
+    size = ctypes.c_ulong(0)
+    pool = default_encoder_pool if pool is None else pool
+    compressor = pool.acquire()
+    try:
+        c_info = compressor.c_info
+        cinfo = compressor.cinfo
+        compressor.memory_destination(ctypes.byref(buffer), ctypes.byref(size))
+        cinfo.image_width = width
+        cinfo.image_height = height
+        cinfo.input_components = components
+        cinfo.in_color_space = coefficients.colorspace
+        jpeg_set_defaults(c_info)
+        # jpeg_set_defaults would convert RGB to YCbCr, for instance
+        jpeg_set_colorspace(c_info, coefficients.colorspace)
+        if cinfo.num_components != components:
+            raise ValueError(f"{J_COLOR_SPACE(coefficients.colorspace).name} images have "
+                             f"{cinfo.num_components} components, not {components}")
+        for number, table in enumerate(tables):
+            jpeg_add_quant_table(c_info, number, (ctypes.c_uint * DCTSIZE2).from_buffer_copy(table), 100, False)
+        for i, (h, v) in enumerate(sampling):
+            cinfo.comp_info[i].h_samp_factor = h
+            cinfo.comp_info[i].v_samp_factor = v
+            cinfo.comp_info[i].quant_tbl_no = table_numbers[i]
+        if progressive:
+            jpeg_simple_progression(c_info)
+        cinfo.optimize_coding = optimize
+        shapes = [(-(-component.shape[0] // v) * v, -(-component.shape[1] // h) * h)
+                  for component, (h, v) in zip(blocks, sampling)]
+        arrays = request_block_arrays(compressor, shapes)
+        jpeg_write_coefficients(c_info, arrays)
+        for i, component in enumerate(blocks):
+            rows, columns = component.shape[:2]
+            view = block_array_view(compressor, arrays[i], shapes[i][0], columns, writable=True)
+            view[:rows] = component
+        jpeg_finish_compress(c_info)
+        compressor.finish_memory()
+    finally:
+        pool.release(compressor)
+    address = ctypes.cast(buffer, ctypes.c_void_p).value
+    try:
+        return ctypes.string_at(address, size.value)
+    finally:
+        c_free(address)
+
+
+__all__ = [
+    "Coefficients",
+    "block_array_view",
+    "block_shape",
+    "read_coefficients",
+    "request_block_arrays",
+    "write_coefficients",
+]
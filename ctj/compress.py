@@ -0,0 +1,185 @@
+"""
+One-shot encoding of pixel buffers into JPEG images.
+
+The compressed stream is written with jpeg_mem_dest, or jpeg_stdio_dest for a
+file descriptor, so the library never calls back into Python while encoding.
+"""
+
+import ctypes
+from typing import Optional, Union
+
+import numpy
+
+from .jpeglib import (
+    JCS_CMYK,
+    JCS_YCbCr,
+    JCS_YCCK,
+    jpeg_finish_compress,
+    jpeg_set_colorspace,
+    jpeg_set_defaults,
+    jpeg_set_quality,
+    jpeg_simple_progression,
+    jpeg_start_compress,
+)
+from .library import c_free
+from .pixel_formats import PIXEL_SIZES, PixelFormat, color_space
+from .pool import EncoderPool, default_encoder_pool
+from .scanlines import RowPointers, buffer_address
+
+# Luma (horizontal, vertical) sampling factors; chroma is always sampled 1x1
+SUBSAMPLING = {
+    "4:4:4": (1, 1),
+    "4:2:2": (2, 1),
+    "4:2:0": (2, 2),
+    "4:4:0": (1, 2),
+    "4:1:1": (4, 1),
+}
+
+
+# Components sampled as luma: Y, and the K of YCCK, as TurboJPEG does. Those of
+# other JPEG color spaces all keep the 1x1 of jpeg_set_colorspace.
+_FULL_RESOLUTION = {
+    JCS_YCbCr: (0,),
+    JCS_YCCK: (0, 3),
+}
+
+
+def _sampling_factors(subsampling: str):
+    try:
+        return SUBSAMPLING[subsampling if ":" in subsampling else ":".join(subsampling)]
+    except KeyError:
+        raise ValueError(
+            f"Unknown subsampling {subsampling!r}; expected one of {', '.join(SUBSAMPLING)}") from None
+
+
+def _default_pixel_format(components: int) -> PixelFormat:
+    if components == 1:
+        return "GRAY"
+    if components == 3:
+        return "RGB"
+    raise ValueError(f"pixel_format is required for images with {components} components")
+
+
+def _as_pixels(image) -> numpy.ndarray:
+    """(height, width, components) uint8 view of image, whose rows may be padded but not split."""
+    pixels = numpy.asarray(image)
+    if pixels.dtype != numpy.uint8:
+        raise ValueError(f"Image must have dtype uint8, not {pixels.dtype}")
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, numpy.newaxis]
+    if pixels.ndim != 3:
+        raise ValueError(f"Image must have shape (height, width[, components]), not {pixels.shape}")
+    if pixels.strides[1:] != (pixels.shape[2], 1):
+        pixels = numpy.ascontiguousarray(pixels)
+    return pixels
+
+
+def encode(
+        image,
+        quality: int = 75,
+        subsampling: str = "4:2:0",
+        pixel_format: Optional[PixelFormat] = None,
+        progressive: bool = False,
+        out=None,
+        pool: Optional[EncoderPool] = None,
+) -> Union[bytes, bytearray, memoryview, None]:
+    """
+    Compress an image held in memory.
+
+    image is a uint8 array of shape (height, width) or (height, width, bytes_per_pixel).
+    pixel_format names its layout, as in PIXEL_FORMATS; it may be omitted for GRAY and RGB.
+    quality, from 1 to 100, scales libjpeg's standard quantization tables, as in cjpeg.
+    subsampling is one of SUBSAMPLING and is ignored for grayscale output. CMYK is
+    coded as YCCK, as TurboJPEG does, so that it can be subsampled too: C, M and Y
+    become luma and chroma, and K is kept at full resolution, as luma is.
+    progressive codes the image in libjpeg's standard progression of scans.
+
+    Returns the JPEG stream as bytes. If out, a writable bytes-like object, is given,
+    the stream is written there instead, and a memoryview of the bytes used is
+    returned; ValueError is raised if it does not fit. A bytearray out is instead
+    resized to hold exactly the stream, and returned. If out is an OS file
+    descriptor, the stream is written to it and None is returned.
+    The compression object is borrowed from pool, or from default_encoder_pool.
+    """
+    if not 1 <= quality <= 100:
+        raise ValueError(f"quality must be from 1 to 100, not {quality}")
+    pixels = _as_pixels(image)
+    height, width, components = pixels.shape
+    in_color_space = color_space(pixel_format if pixel_format is not None else _default_pixel_format(components))
+    if PIXEL_SIZES[in_color_space] != components:
+        raise ValueError(f"Pixel format {in_color_space.name} needs {PIXEL_SIZES[in_color_space]} components, "
+                         f"but the image has {components}")
+    if not 0 < width <= 65500 or not 0 < height <= 65500:
+        raise ValueError(f"Cannot encode a {width}x{height} image as JPEG")
+    h_samp_factor, v_samp_factor = _sampling_factors(subsampling)
+    rows = RowPointers(pixels, height, row_stride=pixels.strides[0], row_size=width * components, writable=False)
+
+    out_address = None
+    buffer = ctypes.POINTER(ctypes.c_ubyte)()
+    size = ctypes.c_ulong(0)
+    if out is not None and not isinstance(out, int):
+        # libjpeg starts in out, and only mallocs a bigger buffer if the stream outgrows it
+        out_address, size.value = buffer_address(out)
+        buffer = ctypes.cast(out_address, ctypes.POINTER(ctypes.c_ubyte))
+
+    pool = default_encoder_pool if pool is None else pool
+    compressor = pool.acquire()
+    try:
+        cinfo = compressor.cinfo
+        if isinstance(out, int):
+            compressor.file_destination(out)
+        else:
+            # libjpeg keeps pointers to buffer and size, and updates them in jpeg_finish_compress
+            compressor.memory_destination(ctypes.byref(buffer), ctypes.byref(size))
+        cinfo.image_width = width
+        cinfo.image_height = height
+        cinfo.input_components = components
+        cinfo.in_color_space = in_color_space
+        jpeg_set_defaults(compressor.c_info)
+        if in_color_space == JCS_CMYK:
+            jpeg_set_colorspace(compressor.c_info, JCS_YCCK)
+        jpeg_set_quality(compressor.c_info, quality, True)
+        full_resolution = _FULL_RESOLUTION.get(cinfo.jpeg_color_space, ())
+        for i in range(cinfo.num_components):
+            component = cinfo.comp_info[i]
+            if i in full_resolution:
+                component.h_samp_factor, component.v_samp_factor = h_samp_factor, v_samp_factor
+            else:
+                component.h_samp_factor = component.v_samp_factor = 1
+        if progressive:
+            jpeg_simple_progression(compressor.c_info)
+        jpeg_start_compress(compressor.c_info, True)
+        rows.write_scanlines(cinfo)
+        jpeg_finish_compress(compressor.c_info)
+        compressor.finish_file()
+        compressor.finish_memory()
+    finally:
+        pool.release(compressor)  # which frees the buffer of a failed image
+
+    if isinstance(out, int):
+        return None
+    address = ctypes.cast(buffer, ctypes.c_void_p).value
+    if out is None:
+        try:
+            return ctypes.string_at(address, size.value)
+        finally:
+            c_free(address)
+    if isinstance(out, bytearray):
+        if address == out_address:
+            del out[size.value:]
+        else:
+            try:
+                out[:] = (ctypes.c_char * size.value).from_address(address)
+            finally:
+                c_free(address)
+        return out
+    if address != out_address:
+        c_free(address)
+        raise ValueError(f"JPEG stream of {size.value} bytes does not fit in out")
+    return memoryview(out).cast("B")[:size.value]
+
+
+__all__ = [
+    "SUBSAMPLING",
+    "encode",
+]
@@ -0,0 +1,252 @@
+"""
+One-shot decoding of JPEG images into NumPy arrays.
+
+The whole compressed buffer is handed to libjpeg with jpeg_mem_src, or a file
+descriptor with jpeg_stdio_src, so the library never calls back into Python
+for the entropy-coded data: only to check the marker segments, and to count
+the scans of a multi-scan image when max_scans is given.
+"""
+
+import ctypes
+import io
+import os
+from typing import NamedTuple, Optional, Tuple
+
+import numpy
+
+from .jpeglib import (
+    JDIMENSION,
+    JPEG_HEADER_OK,
+    jpeg_calc_output_dimensions,
+    jpeg_crop_scanline,
+    jpeg_finish_decompress,
+    jpeg_read_header,
+    jpeg_skip_scanlines,
+    jpeg_start_decompress,
+)
+from .limits import DecodeLimits
+from .pixel_formats import PixelFormat, color_space
+from .pool import DecoderPool, default_decoder_pool
+from .py_jpeg_source import PyJpegSource
+from .scanlines import RowPointers
+
+
+class Region(NamedTuple):
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+def _as_bytes_array(buf) -> numpy.ndarray:
+    """Zero-copy uint8 view of any contiguous bytes-like object."""
+    data = numpy.frombuffer(buf, dtype=numpy.uint8)
+    if data.size == 0:
+        raise ValueError("Empty JPEG buffer")
+    return data
+
+
+def _open_input(buf) -> Tuple[Optional[numpy.ndarray], Optional[PyJpegSource]]:
+    """
+    (data, source) to read buf from: a view of a bytes-like object, or a PyJpegSource
+    for a file object, or for a file descriptor that cannot seek, such as a pipe.
+    Neither for other file descriptors.
+    """
+    if hasattr(buf, "read"):
+        return None, PyJpegSource(buf, adaptive=True)
+    if not isinstance(buf, int):
+        return _as_bytes_array(buf), None
+    try:
+        os.lseek(buf, 0, os.SEEK_CUR)
+    except OSError:
+        return None, PyJpegSource(io.FileIO(buf, closefd=False), adaptive=True)
+    return None, None
+
+
+def _raise_source_error(source: Optional[PyJpegSource]) -> None:
+    """Raise the exception that a Python data source could not pass through libjpeg, if any."""
+    if source is not None and source.error is not None:
+        raise source.error
+
+
+def _check_output(out: numpy.ndarray, shape: tuple) -> None:
+    """Rows of out may be padded, but pixels within a row must be packed."""
+    if out.dtype != numpy.uint8:
+        raise ValueError(f"out must have dtype uint8, not {out.dtype}")
+    if out.shape != shape:
+        raise ValueError(f"out has shape {out.shape}, but the decoded image needs {shape}")
+    if out.strides[1:] != (shape[2], 1):
+        raise ValueError("Each row of out must be contiguous")
+    if not out.flags.writeable:
+        raise ValueError("out is read-only")
+
+
+def _scale_to_fit(decompressor, max_size: Tuple[int, int]) -> None:
+    """
+    Choose the smallest libjpeg-turbo scaling factor, from 1/8 to 1 in eighths, whose output
+    still covers the largest size that fits within max_size with the image's aspect ratio.
+    An image that already fits is decoded at full size, never enlarged.
+    """
+    cinfo = decompressor.cinfo
+    max_width, max_height = max_size
+    if max_width < 1 or max_height < 1:
+        raise ValueError(f"max_size must be positive, not {max_size}")
+    fit = min(max_width / cinfo.image_width, max_height / cinfo.image_height, 1.0)
+    width = max(1, round(cinfo.image_width * fit))
+    height = max(1, round(cinfo.image_height * fit))
+    cinfo.scale_denom = 8
+    # jpeg_calc_output_dimensions has the final say on rounding
+    for cinfo.scale_num in range(1, 9):
+        jpeg_calc_output_dimensions(decompressor.c_info)
+        if cinfo.output_width >= width and cinfo.output_height >= height:
+            break
+
+
+def _crop(decompressor, region: Tuple[int, int, int, int]) -> Region:
+    """Limit decoding to region, widened to whole iMCU columns, and skip the rows above it."""
+    cinfo = decompressor.cinfo
+    x, y, width, height = region
+    if width < 1 or height < 1 or x < 0 or y < 0 \
+            or x + width > cinfo.output_width or y + height > cinfo.output_height:
+        raise ValueError(f"Region {tuple(region)} is not within the {cinfo.output_width}x{cinfo.output_height} image")
+    if width < cinfo.output_width:
+        # Fancy upsampling has no neighbours for the outermost columns of a cropped window,
+        # so ask for one more column on each side to keep those of the region exact.
+        # libjpeg then moves x_offset left and widens crop_width to iMCU boundaries.
+        left = max(x - 1, 0)
+        x_offset = JDIMENSION(left)
+        crop_width = JDIMENSION(min(x + width + 1, cinfo.output_width) - left)
+        jpeg_crop_scanline(decompressor.c_info, ctypes.byref(x_offset), ctypes.byref(crop_width))
+        x, width = x_offset.value, crop_width.value
+    if y > 0:
+        jpeg_skip_scanlines(decompressor.c_info, y)
+    return Region(x, y, width, height)
+
+
+def decode(
+        buf,
+        pixel_format: Optional[PixelFormat] = None,
+        out: Optional[numpy.ndarray] = None,
+        pool: Optional[DecoderPool] = None,
+        max_size: Optional[Tuple[int, int]] = None,
+        max_scans: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+        max_memory: Optional[int] = None,
+        warnings_as_errors: bool = False,
+) -> numpy.ndarray:
+    """
+    Decode a complete JPEG image, in memory or in a file.
+
+    buf is any contiguous bytes-like object, read in place with jpeg_mem_src, or an
+    OS file descriptor, read from its current position with jpeg_stdio_src, which
+    reads ahead and leaves the position past the image. Either way libjpeg reads
+    the data without calling back into Python. Other binary file objects, and
+    pipes, are read through a PyJpegSource with an adaptive buffer. pixel_format is a name from PIXEL_FORMATS or a
+    J_COLOR_SPACE; by default libjpeg chooses (RGB for color images, GRAY for
+    grayscale, CMYK for CMYK). The result has shape
+    (height, width, bytes_per_pixel) and is written into out, if given.
+    The decompression object is borrowed from pool, or from default_decoder_pool.
+
+    max_size=(width, height) decodes a reduced image for thumbnails: the inverse
+    DCT scales by the smallest factor from 1/8 to 1, in eighths, that still gives
+    at least the largest size fitting within max_size; an image that fits already
+    is not enlarged. Any remaining resize is left to the caller, to do on the much
+    smaller result.
+
+    max_scans, max_pixels and max_memory bound the work of decoding untrusted
+    images, as described for DecodeLimits: an image that would exceed them
+    raises LimitExceededError, without its scans being read any further.
+
+    Fatal errors in the data raise JpegError. Corrupt data that libjpeg can decode
+    around, such as a truncated file, is reported as a JpegWarning, or raises
+    JpegError too if warnings_as_errors is true.
+    """
+    limits = DecodeLimits(max_scans=max_scans, max_pixels=max_pixels, max_memory=max_memory)
+    return _decode(buf, pixel_format, out, pool, max_size, None, limits, warnings_as_errors)[0]
+
+
+def decode_region(
+        buf,
+        region: Tuple[int, int, int, int],
+        pixel_format: Optional[PixelFormat] = None,
+        out: Optional[numpy.ndarray] = None,
+        pool: Optional[DecoderPool] = None,
+        max_size: Optional[Tuple[int, int]] = None,
+        max_scans: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+        max_memory: Optional[int] = None,
+        warnings_as_errors: bool = False,
+) -> Tuple[numpy.ndarray, Region]:
+    """
+    Decode only part of a JPEG image, and return (image, Region).
+
+    region=(x, y, width, height), in output pixels after any scaling, is the part
+    wanted: libjpeg decodes whole iMCU columns only for the window around it,
+    skips the rows above it and stops after its last row. The window actually
+    decoded may be wider than asked for, so Region gives the position and size
+    of image within the full output. The other arguments are as for decode().
+    """
+    limits = DecodeLimits(max_scans=max_scans, max_pixels=max_pixels, max_memory=max_memory)
+    return _decode(buf, pixel_format, out, pool, max_size, region, limits, warnings_as_errors)
+
+
+def _decode(buf, pixel_format: Optional[PixelFormat], out: Optional[numpy.ndarray], pool: Optional[DecoderPool],
+            max_size: Optional[Tuple[int, int]], region: Optional[Tuple[int, int, int, int]], limits: DecodeLimits,
+            warnings_as_errors: bool) -> Tuple[numpy.ndarray, Optional[Region]]:
+    """decode(), or decode_region() if region is given; the Region is None for the whole image."""
+    data, source = _open_input(buf)
+    pool = default_decoder_pool if pool is None else pool
+    decompressor = pool.acquire()
+    decompressor.errors.warnings_as_errors = warnings_as_errors
+    try:
+        cinfo = decompressor.cinfo
+        if source is not None:
+            source.attach(decompressor)
+        elif data is None:
+            decompressor.file_source(buf)
+        else:
+            decompressor.memory_source(data.ctypes.data, data.size)
+        if jpeg_read_header(decompressor.c_info, True) != JPEG_HEADER_OK:
+            _raise_source_error(source)
+            raise ValueError("No image in JPEG buffer")
+        if cinfo.data_precision != 8:
+            raise ValueError(f"Unsupported JPEG sample precision {cinfo.data_precision}")
+        if pixel_format is not None:
+            cinfo.out_color_space = color_space(pixel_format)
+        if max_size is not None:
+            _scale_to_fit(decompressor, max_size)
+        if limits:
+            limits.check_header(decompressor)
+        if not jpeg_start_decompress(decompressor.c_info):
+            _raise_source_error(source)
+            raise ValueError("JPEG data source suspended")
+        decoded = None if region is None else _crop(decompressor, region)
+        height = cinfo.output_height if decoded is None else decoded.height
+        shape = (height, cinfo.output_width, cinfo.output_components)
+        if limits:
+            # All the scans of a multi-scan image have been read by now, and the output is still to come
+            limits.check(height * shape[1] * shape[2] if out is None else 0)
+        if out is None:
+            out = numpy.empty(shape, dtype=numpy.uint8)
+        else:
+            _check_output(out, shape)
+        rows = RowPointers(out, height, row_stride=out.strides[0], row_size=shape[1] * shape[2])
+        if rows.read_scanlines(cinfo) < height:
+            _raise_source_error(source)
+            raise ValueError("JPEG data source suspended")
+        if decoded is None:
+            jpeg_finish_decompress(decompressor.c_info)
+        # Otherwise the rows below the region are never decoded: releasing the
+        # decompressor abandons the image with jpeg_abort_decompress
+    finally:
+        if source is not None:
+            cinfo.src = None  # the decompressor must not keep source alive
+        pool.release(decompressor)
+    return out, decoded
+
+
+__all__ = [
+    "Region",
+    "decode",
+    "decode_region",
+]
@@ -0,0 +1,311 @@
+"""
+Turning libjpeg's errors into Python exceptions, without leaving the process.
+
+The standard error manager prints fatal errors and calls exit(). The usual C
+alternative is a setjmp() before each library call and a longjmp() back to it
+from error_exit. Neither can be done from Python, so the ctj._guard extension
+does both in C (see _guard.c): every binding that takes a cinfo calls its
+function through a wrapper that reports whether libjpeg jumped out of it, and
+the binding then raises the error as a JpegError. The object is then only
+aborted or destroyed, never called again.
+
+Callbacks written in Python stop the call in progress with fail_call(). Data
+sources then suspend; warnings and the progress monitor go through C
+trampolines, which jump out once the Python callback has returned.
+"""
+
+import ctypes
+import functools
+import warnings
+import weakref
+from typing import Callable, Dict, Optional
+
+from . import jpeglib
+from .errors import JpegError, JpegWarning
+from .jpeglib import (
+    JMSG_LENGTH_MAX,
+    j_common_ptr,
+    j_compress_ptr,
+    j_decompress_ptr,
+    jpeg_common_struct,
+    jpeg_error_mgr,
+    jpeg_progress_mgr,
+    jpeg_std_error,
+)
+from .library import LazyFunction, guard_library
+
+_PROTOTYPES = dict(jpeg_error_mgr._fields_)
+_PROGRESS_MONITOR = dict(jpeg_progress_mgr._fields_)["progress_monitor"]
+
+
+class _GuardState(ctypes.Structure):
+    """struct ctj_state of _guard.c, which the client_data of each cinfo points to."""
+    _fields_ = (
+        ("jump", ctypes.c_void_p),
+        ("emit_message", _PROTOTYPES["emit_message"]),
+        ("progress_monitor", _PROGRESS_MONITOR),
+        ("abort", ctypes.c_int),
+    )
+
+
+def _trampoline(name: str, prototype):
+    return ctypes.cast(getattr(guard_library(), name), prototype)
+
+
+class ErrorManager(object):
+    """
+    A jpeg_error_mgr that raises errors and warnings in Python instead of printing them and exiting.
+
+    Messages are formatted by the library's own format_message, from msg_code and
+    msg_parm. Warnings are counted in num_warnings and issued as JpegWarning; if
+    warnings_as_errors is set for the image, or the warnings filter turns them into
+    errors, the first one is fatal instead. A decompressor whose error manager has
+    failed should not be reused, only reset or closed, as libjpeg requires after an
+    error.
+    """
+
+    def __init__(self):
+        self.pub = jpeg_error_mgr()
+        jpeg_std_error(ctypes.byref(self.pub))  # message tables, format_message and reset_error_mgr
+        self.pub.error_exit = _trampoline("ctj_error_exit", _PROTOTYPES["error_exit"])
+        self.pub.emit_message = _trampoline("ctj_emit_message", _PROTOTYPES["emit_message"])
+        self.state = _GuardState()
+        self.state.emit_message = self._emit_hook = _PROTOTYPES["emit_message"](self._emit_message)
+        self._progress = jpeg_progress_mgr()
+        self._progress.progress_monitor = _trampoline("ctj_progress_monitor", _PROGRESS_MONITOR)
+        self._progress_hook = None
+        self.warnings_as_errors = False
+        self.overrides: Dict[int, Exception] = {}  # msg_code -> what to raise instead of libjpeg's error
+        self.error: Optional[Exception] = None  # waiting to be raised
+        self.failed = False  # an error has been recorded since reset()
+        _managers[ctypes.addressof(self.pub)] = self
+
+    def attach(self, cinfo) -> None:
+        """Become the error manager of cinfo, before jpeg_CreateCompress or jpeg_CreateDecompress."""
+        cinfo.err = ctypes.pointer(self.pub)
+        # The Create functions keep client_data, which libjpeg itself never uses
+        cinfo.client_data = ctypes.addressof(self.state)
+
+    @property
+    def num_warnings(self) -> int:
+        """Corrupt-data warnings for the current image."""
+        return self.pub.num_warnings
+
+    def format_message(self, c_info) -> str:
+        """The message for the current msg_code and msg_parm."""
+        buffer = ctypes.create_string_buffer(JMSG_LENGTH_MAX)
+        self.pub.format_message(ctypes.cast(c_info, j_common_ptr), buffer)
+        return buffer.value.decode(errors="replace")
+
+    def fail(self, c_info, error: Exception) -> None:
+        """Record error, unless there is one already, and have the call in progress stop."""
+        if self.error is None and not self.failed:
+            self.error = error
+        self.failed = True
+        self.state.abort = 1
+
+    def raise_error(self) -> None:
+        """Raise the recorded error, if any, once."""
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def monitor(self, cinfo, callback: Optional[Callable]) -> None:
+        """
+        Have libjpeg call callback(c_info) as its progress monitor for cinfo, or stop
+        that if callback is None. callback may fail() the call in progress.
+        """
+        if callback is None:
+            cinfo.progress = None
+            self._progress_hook = None
+            self.state.progress_monitor = _PROGRESS_MONITOR()  # NULL
+        else:
+            self.state.progress_monitor = self._progress_hook = _PROGRESS_MONITOR(callback)
+            cinfo.progress = ctypes.pointer(self._progress)
+
+    def reset(self) -> None:
+        """Forget the errors and warnings of the last image."""
+        self.error = None
+        self.failed = False
+        self.state.abort = 0
+        self.pub.num_warnings = 0
+        self.warnings_as_errors = False
+        self.overrides = {}
+
+    def _emit_message(self, c_info, msg_level: int) -> None:
+        # Only warnings get here: ctj_emit_message drops trace messages
+        self.pub.num_warnings += 1
+        if self.failed:
+            return  # suspending after an error can cause more warnings
+        code = self.pub.msg_code
+        message = self.format_message(c_info)
+        if self.warnings_as_errors:
+            self.fail(c_info, JpegError(message, code))
+            return
+        try:
+            warnings.warn(JpegWarning(message, code), stacklevel=2)
+        except Warning:  # the warnings filter made it an error
+            self.fail(c_info, JpegError(message, code))
+
+    def _raise_failure(self, c_info) -> None:
+        # libjpeg jumped out of the call: from error_exit, or after a callback failed
+        self.failed = True
+        error, self.error = self.error, None
+        if error is None:
+            code = self.pub.msg_code
+            error = self.overrides.get(code) or JpegError(self.format_message(c_info), code)
+        raise error
+
+
+def library_error(code: int, *parameters: int) -> JpegError:
+    """A JpegError with libjpeg's message for code, formatted with integer parameters."""
+    manager = jpeg_error_mgr()
+    jpeg_std_error(ctypes.byref(manager))
+    manager.msg_code = code
+    for i, parameter in enumerate(parameters):
+        manager.msg_parm.i[i] = parameter
+    common = jpeg_common_struct()
+    common.err = ctypes.pointer(manager)
+    buffer = ctypes.create_string_buffer(JMSG_LENGTH_MAX)
+    manager.format_message(ctypes.pointer(common), buffer)
+    return JpegError(buffer.value.decode(errors="replace"), code)
+
+
+# Address of each ErrorManager's jpeg_error_mgr -> the ErrorManager
+_managers = weakref.WeakValueDictionary()
+
+
+def _struct_address(argument) -> Optional[int]:
+    if isinstance(argument, int):
+        return argument  # the scanline loops pass addresses
+    if isinstance(argument, ctypes._Pointer):
+        return ctypes.cast(argument, ctypes.c_void_p).value
+    obj = getattr(argument, "_obj", None)  # from ctypes.byref()
+    return None if obj is None else ctypes.addressof(obj)
+
+
+def _manager(c_info) -> Optional[ErrorManager]:
+    address = _struct_address(c_info)
+    if not address:
+        return None
+    # err is the first field of both jpeg_compress_struct and jpeg_decompress_struct
+    return _managers.get(ctypes.c_void_p.from_address(address).value)
+
+
+def fail_call(c_info, error: Exception) -> bool:
+    """
+    From a callback, stop the libjpeg call in progress and have it raise error on
+    return, as error_exit does. False if c_info has no ErrorManager.
+    """
+    manager = _manager(c_info)
+    if manager is None:
+        return False
+    manager.fail(c_info, error)
+    return True
+
+
+def warn_call(c_info, code: int) -> bool:
+    """
+    From a data source written in Python, issue libjpeg's warning code, as its own
+    sources do with WARNMS. False if the warning is fatal, and the source should
+    suspend.
+    """
+    manager = _manager(c_info)
+    if manager is None:
+        return True
+    manager.pub.msg_code = code
+    manager._emit_message(c_info, -1)
+    return not manager.failed
+
+
+# Kinds of argument and result, as the ctj_call_* functions of _guard.c are named
+_KINDS = {ctypes.c_int: "i", ctypes.c_ulong: "l", ctypes.c_uint: "u", ctypes.c_ubyte: "b"}
+
+
+def _kind(ctype) -> str:
+    if ctype is None:
+        return "v"
+    kind = _KINDS.get(ctype)
+    if kind is not None:
+        return kind
+    if issubclass(ctype, (ctypes._Pointer, ctypes._CFuncPtr, ctypes.c_void_p, ctypes.c_char_p)):
+        return "p"
+    raise TypeError(f"No setjmp() guard for arguments of type {ctype.__name__}")
+
+
+@functools.lru_cache(maxsize=None)
+def _guard(restype, argtypes: tuple):
+    """The ctj_call_* function for a signature, with a prototype of its own."""
+    kinds = _kind(restype) + "_" + "".join(_kind(argtype) for argtype in argtypes)
+    if restype is not None:
+        argtypes = (ctypes.POINTER(restype),) + argtypes
+    return ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, *argtypes)(("ctj_call_" + kinds, guard_library()))
+
+
+def _check(c_info, completed: int) -> None:
+    manager = _manager(c_info)
+    if manager is not None:
+        if not completed:
+            manager._raise_failure(c_info)
+        if manager.error is not None:  # a data source failed, and the call suspended
+            manager.raise_error()
+
+
+def _guarded_call(target: int, restype, argtypes: tuple):
+    guard = _guard(restype, argtypes)
+    if restype is None:
+        def call(c_info, *args):
+            _check(c_info, guard(target, c_info, *args))
+        return call
+
+    simple = issubclass(restype, ctypes._SimpleCData)
+
+    def call_for_result(c_info, *args):
+        result = restype()
+        _check(c_info, guard(target, ctypes.byref(result), c_info, *args))
+        return result.value if simple else result
+    return call_for_result
+
+
+def guarded(function: LazyFunction):
+    """
+    LazyFunction wrapper for bindings whose first argument is a cinfo: call the
+    function under a setjmp() in _guard.c, and raise the error that libjpeg
+    reported during the call, if any.
+    """
+    target = ctypes.cast(function.resolve(), ctypes.c_void_p).value
+    return _guarded_call(target, function.restype, tuple(function.argtypes))
+
+
+def guarded_method(method):
+    """
+    Call a method of a libjpeg object, such as the memory manager's
+    access_virt_barray, as guarded() bindings are called. method is the
+    function pointer read from the struct; its first argument is a cinfo.
+    """
+    prototype = type(method)
+    return _guarded_call(ctypes.cast(method, ctypes.c_void_p).value, prototype._restype_, prototype._argtypes_)
+
+
+def _install() -> None:
+    for name, function in vars(jpeglib).items():
+        if not isinstance(function, LazyFunction):
+            continue
+        if name.startswith(("jpeg_abort", "jpeg_destroy")):
+            continue  # for cleaning up, which must not raise again
+        if function.argtypes and function.argtypes[0] in (j_common_ptr, j_compress_ptr, j_decompress_ptr):
+            function.wrapper = guarded
+            function._call = None  # if already bound
+
+
+_install()
+
+
+__all__ = [
+    "ErrorManager",
+    "fail_call",
+    "guarded",
+    "guarded_method",
+    "library_error",
+    "warn_call",
+]
@@ -0,0 +1,41 @@
+"""
+Exceptions and warnings for images that cannot, or may not, be decoded.
+"""
+
+from typing import Optional
+
+
+class JpegError(ValueError):
+    """A fatal error reported by libjpeg, or a warning treated as one."""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code  # libjpeg's msg_code, a J_MESSAGE_CODE from jerror.h
+
+
+class JpegWarning(UserWarning):
+    """Corrupt data that libjpeg could decode around."""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class LimitExceededError(JpegError):
+    """An image needs more of some resource than the caller allowed."""
+
+    def __init__(self, limit: str, value: Optional[int], maximum: int):
+        if value is None:
+            super().__init__(f"{limit} exceeds the limit of {maximum}")
+        else:
+            super().__init__(f"{limit} {value} exceeds the limit of {maximum}")
+        self.limit = limit  # name of the option, such as "max_scans"
+        self.value = value  # what the image needs, or at least how far it got; None if libjpeg did not say
+        self.maximum = maximum
+
+
+__all__ = [
+    "JpegError",
+    "JpegWarning",
+    "LimitExceededError",
+]
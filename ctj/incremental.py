@@ -0,0 +1,194 @@
+"""
+Decoding JPEG images while their data is still arriving.
+
+IncrementalDecoder drives libjpeg through a suspending PushJpegSource: every
+call into the library returns as soon as the data runs out, and is repeated
+when the next chunk is fed in, so rows come out while the rest of the image is
+still on its way. The arithmetic decoder is the exception, as it cannot
+suspend: arithmetic-coded images are decoded whole, once the stream has ended.
+"""
+
+from typing import Optional, Tuple
+
+import numpy
+
+from .decompress import _scale_to_fit
+from .errors import JpegError
+from .jpeglib import (
+    JPEG_HEADER_OK,
+    JPEG_SUSPENDED,
+    jpeg_finish_decompress,
+    jpeg_read_header,
+    jpeg_start_decompress,
+)
+from .pixel_formats import PixelFormat, color_space
+from .pool import DecoderPool, default_decoder_pool
+from .py_jpeg_source import PushJpegSource
+from .scanlines import RowPointers
+
+# What the decoder is waiting to do next
+_HEADER, _START, _SCANLINES, _FINISH, _DONE = range(5)
+
+
+class IncrementalDecoder(object):
+    """
+    Push-style decoder of one JPEG image: feed() it chunks of the stream as they
+    arrive, and each call returns the rows that became decodable.
+
+    pixel_format and max_size are as for decode(). The decompression object is
+    borrowed from pool, or from default_decoder_pool, until the image is done or
+    close() is called.
+
+    Once the header shows that an image is arithmetic-coded, its data is only
+    kept until finish(), which decodes all of it.
+    """
+
+    def __init__(
+            self,
+            pixel_format: Optional[PixelFormat] = None,
+            max_size: Optional[Tuple[int, int]] = None,
+            pool: Optional[DecoderPool] = None,
+    ):
+        self.pixel_format = pixel_format
+        self.max_size = max_size
+        self.image: Optional[numpy.ndarray] = None  # allocated once the header has been read
+        self.rows_decoded = 0
+        self._state = _HEADER
+        self._rows = None
+        self._held = None  # the chunks of an arithmetic-coded image, kept for finish()
+        self._source = PushJpegSource()
+        self._pool = default_decoder_pool if pool is None else pool
+        self._decompressor = self._pool.acquire()
+        self._source.attach(self._decompressor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        # Not close(): the collector may be finalizing the decompression object
+        # along with this one, in a cycle, or be running in another thread, so it
+        # is left to destroy itself rather than go back to a pool
+        if getattr(self, "_decompressor", None) is not None:
+            self._decompressor = None
+            self._source.close()
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    @property
+    def truncated(self) -> bool:
+        """True if finish() was called before the end of the image, whose missing rows are then gray."""
+        return self._source.truncated
+
+    @property
+    def shape(self) -> Optional[Tuple[int, int, int]]:
+        """(height, width, bytes_per_pixel) of the output, once known."""
+        return None if self.image is None else self.image.shape
+
+    def feed(self, chunk) -> Optional[numpy.ndarray]:
+        """
+        Add the next chunk of the JPEG stream, and decode as far as it allows.
+
+        Returns a view of image holding the rows completed by this chunk, which
+        may be none, or None while the header is still incomplete, or the image
+        is arithmetic-coded.
+        """
+        if self._decompressor is None:
+            raise ValueError("The image is already complete" if self.done else "The decoder is closed")
+        if self._held is not None:
+            self._held.append(bytes(chunk))
+            return None
+        return self._advance(self._source.push, chunk)
+
+    def finish(self) -> Optional[numpy.ndarray]:
+        """
+        Declare the end of the stream, and return the last rows. If the stream stopped
+        short, libjpeg completes the image as it would for a truncated file; see truncated.
+        """
+        if self._decompressor is None and not self.done:
+            raise ValueError("The decoder is closed")
+        if self._state == _HEADER:
+            # A fake EOI marker here would be a fatal error in libjpeg
+            self.close()
+            raise ValueError("JPEG data ends before the start of the image")
+        if self._state != _DONE:
+            return self._advance(self._end_stream)
+        return self.image[self.rows_decoded:]
+
+    def _end_stream(self) -> None:
+        if self._held:
+            self._source.push(b"".join(self._held))
+            self._held.clear()
+        self._source.end()
+
+    def _advance(self, update, *args) -> Optional[numpy.ndarray]:
+        """update(*args) the source, then decode; a failed image gives its decompression object back."""
+        try:
+            update(*args)
+            return self._decode()
+        except JpegError:
+            self.close()
+            raise
+
+    def _decode(self) -> Optional[numpy.ndarray]:
+        decompressor = self._decompressor
+        cinfo = decompressor.cinfo
+        first_row = self.rows_decoded
+        if self._state == _HEADER:
+            status = jpeg_read_header(decompressor.c_info, True)
+            if status == JPEG_SUSPENDED:
+                return None
+            if status != JPEG_HEADER_OK:
+                self.close()
+                raise ValueError("No image in JPEG data")
+            if cinfo.data_precision != 8:
+                self.close()
+                raise ValueError(f"Unsupported JPEG sample precision {cinfo.data_precision}")
+            if self.pixel_format is not None:
+                cinfo.out_color_space = color_space(self.pixel_format)
+            if self.max_size is not None:
+                _scale_to_fit(decompressor, self.max_size)
+            self._state = _START
+            if cinfo.arith_code:
+                # It would fail with JERR_CANT_SUSPEND at the first chunk boundary
+                self._held = []
+        if self._held is not None and not self._source.at_end:
+            return None
+        if self._state == _START:
+            # Multi-scan images are read completely here, suspending as often as needed
+            if not jpeg_start_decompress(decompressor.c_info):
+                return None
+            height, width, components = cinfo.output_height, cinfo.output_width, cinfo.output_components
+            self.image = numpy.empty((height, width, components), dtype=numpy.uint8)
+            self._rows = RowPointers(self.image, height)
+            self._state = _SCANLINES
+        if self._state == _SCANLINES:
+            self.rows_decoded += self._rows.read_scanlines(cinfo, first_row=self.rows_decoded)
+            if self.rows_decoded < self.image.shape[0]:
+                return self.image[first_row:self.rows_decoded]
+            self._state = _FINISH
+        if self._state == _FINISH:
+            # Read up to EOI, which may also need more data
+            if jpeg_finish_decompress(decompressor.c_info):
+                self._state = _DONE
+                self.close()
+        return self.image[first_row:self.rows_decoded]
+
+    def close(self) -> None:
+        """Give the decompression object back to its pool, abandoning any unfinished image."""
+        decompressor = getattr(self, "_decompressor", None)
+        if decompressor is not None:
+            self._decompressor = None
+            self._source.close()
+            if decompressor.cinfo is not None:
+                decompressor.cinfo.src = None
+                self._pool.release(decompressor)
+
+
+__all__ = [
+    "IncrementalDecoder",
+]
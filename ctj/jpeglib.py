@@ -15,13 +15,15 @@ from ctypes import (
     c_ulong,
     c_ushort,
     c_void_p,
-    cdll,
 )
+import sys
 from enum import IntFlag
 
-libjpeg_lib = cdll.LoadLibrary("jpeg62.dll")
+from .library import libjpeg_lib
+
 JPEG_LIB_VERSION = 62
-boolean: type = c_ubyte
+# jconfig.h makes boolean an unsigned char on Windows only; jmorecfg.h makes it an int elsewhere
+boolean: type = c_ubyte if sys.platform == "win32" else c_int
 JSAMPLE: type = c_ubyte
 J12SAMPLE: type = c_short
 J16SAMPLE: type = c_ushort
@@ -392,7 +394,7 @@ jpeg_compress_struct._fields_ = (
 
         ("input_components", c_int),  # # of color components in input image
 
-        ("in_color_space", J_COLOR_SPACE),  # colorspace of input image
+        ("in_color_space", c_int),  # colorspace of input image
 
         ("input_gamma", c_double),  # image gamma of input image
 
@@ -400,7 +402,7 @@ jpeg_compress_struct._fields_ = (
 
         ("num_components", c_int),  # # of color components in JPEG image
 
-        ("jpeg_color_space", J_COLOR_SPACE),  # colorspace of JPEG image
+        ("jpeg_color_space", c_int),  # colorspace of JPEG image
 
         ("comp_info", POINTER(jpeg_component_info)),
 
@@ -430,7 +432,7 @@ jpeg_compress_struct._fields_ = (
 
         ("smoothing_factor", c_int),  # 1..100, or 0 for no input smoothing
 
-        ("dct_method", J_DCT_METHOD),  # DCT algorithm selector
+        ("dct_method", c_int),  # DCT algorithm selector
 
         # The restart interval can be specified in absolute MCUs by setting
         # restart_interval, or in MCU rows by setting restart_in_rows
@@ -589,9 +591,9 @@ jpeg_decompress_struct._fields_ = (
 
         ("num_components", c_int),  # # of color components in JPEG image
 
-        ("jpeg_color_space", J_COLOR_SPACE),  # colorspace of JPEG image
+        ("jpeg_color_space", c_int),  # colorspace of JPEG image
 
-        ("out_color_space", J_COLOR_SPACE),  # colorspace for output
+        ("out_color_space", c_int),  # colorspace for output
 
         ("scale_num", c_uint),  # fraction by which to scale image
 
@@ -603,7 +605,7 @@ jpeg_decompress_struct._fields_ = (
 
         ("raw_data_out", boolean),  # TRUE=downsampled data wanted
 
-        ("dct_method", J_DCT_METHOD),  # IDCT algorithm selector
+        ("dct_method", c_int),  # IDCT algorithm selector
 
         ("do_fancy_upsampling", boolean),  # TRUE=apply fancy upsampling
 
@@ -612,7 +614,7 @@ jpeg_decompress_struct._fields_ = (
         ("quantize_colors", boolean),  # TRUE=colormapped output wanted
 
         # the following are ignored if not quantize_colors:
-        ("dither_mode", J_DITHER_MODE),  # type of color dithering to use
+        ("dither_mode", c_int),  # type of color dithering to use
 
         ("two_pass_quantize", boolean),  # TRUE=use two-pass color quantization
 
@@ -972,7 +974,7 @@ jpeg_marker_parser_method: type = CFUNCTYPE(boolean, j_decompress_ptr)
 
 # Default error-management setup
 jpeg_std_error = libjpeg_lib.jpeg_std_error
-jpeg_std_error.restype = jpeg_error_mgr
+jpeg_std_error.restype = POINTER(jpeg_error_mgr)
 jpeg_std_error.argtypes = [
     POINTER(jpeg_error_mgr),
 ]
@@ -1056,7 +1058,7 @@ jpeg_set_colorspace = libjpeg_lib.jpeg_set_colorspace
 jpeg_set_colorspace.restype = None
 jpeg_set_colorspace.argtypes = [
     j_compress_ptr,
-    J_COLOR_SPACE,
+    c_int,
 ]
 
 jpeg_default_colorspace = libjpeg_lib.jpeg_default_colorspace
@@ -1092,7 +1094,7 @@ jpeg_add_quant_table.argtypes = [
 ]
 
 jpeg_quality_scaling = libjpeg_lib.jpeg_quality_scaling
-jpeg_quality_scaling.restype = None
+jpeg_quality_scaling.restype = c_int
 jpeg_quality_scaling.argtypes = [
     c_int,
 ]
@@ -1119,13 +1121,13 @@ jpeg_suppress_tables.argtypes = [
 ]
 
 jpeg_alloc_quant_table = libjpeg_lib.jpeg_alloc_quant_table
-jpeg_alloc_quant_table.restype = JQUANT_TBL
+jpeg_alloc_quant_table.restype = POINTER(JQUANT_TBL)
 jpeg_alloc_quant_table.argtypes = [
     j_common_ptr,
 ]
 
 jpeg_alloc_huff_table = libjpeg_lib.jpeg_alloc_huff_table
-jpeg_alloc_huff_table.restype = JHUFF_TBL
+jpeg_alloc_huff_table.restype = POINTER(JHUFF_TBL)
 jpeg_alloc_huff_table.argtypes = [
     j_common_ptr,
 ]
@@ -1229,7 +1231,7 @@ jpeg_write_icc_profile.argtypes = [
 
 # Decompression startup: read start of JPEG datastream to see what's there
 jpeg_read_header = libjpeg_lib.jpeg_read_header
-jpeg_read_header.restype = None
+jpeg_read_header.restype = c_int
 jpeg_read_header.argtypes = [
     j_decompress_ptr,
     boolean,
@@ -1357,7 +1359,7 @@ jpeg_new_colormap.argtypes = [
 ]
 
 jpeg_consume_input = libjpeg_lib.jpeg_consume_input
-jpeg_consume_input.restype = None
+jpeg_consume_input.restype = c_int
 jpeg_consume_input.argtypes = [
     j_decompress_ptr,
 ]
@@ -1394,7 +1396,7 @@ jpeg_set_marker_processor.argtypes = [
 
 # Read or write raw DCT coefficients --- useful for lossless transcoding.
 jpeg_read_coefficients = libjpeg_lib.jpeg_read_coefficients
-jpeg_read_coefficients.restype = jvirt_barray_ptr
+jpeg_read_coefficients.restype = POINTER(jvirt_barray_ptr)
 jpeg_read_coefficients.argtypes = [
     j_decompress_ptr,
 ]
@@ -0,0 +1,357 @@
+"""
+Locate and lazily load the native libjpeg-turbo libraries.
+
+Nothing is loaded at import time. The shared library is opened the first
+time one of its functions is called, and each function is looked up only
+when it is first used, so importing the bindings costs almost nothing and
+works even on platforms where no library can be found.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import platform
+import re
+import sys
+import threading
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+from .resources import resource_filename
+
+
+class LibraryInfo(NamedTuple):
+    """
+    What library_info() could tell about the loaded build. This is best-effort:
+    version and simd come from strings in the library file, not from the API,
+    and simd is only a guess at what the library will use at runtime. On x86-64,
+    for instance, SSE2 is reported whenever the build includes it, without
+    asking the CPU, and AVX2 is only checked against the CPU on Linux.
+    """
+    path: str  # file that was actually loaded
+    origin: str  # "environment", "bundled" or "system"
+    version: Optional[str]  # e.g. "3.0.4", if the build says so
+    build: Optional[str]  # e.g. "20240707", if the build says so
+    simd: Tuple[str, ...]  # SIMD extensions compiled into this build that are probably in use
+
+
+class LazyFunction(object):
+    """
+    Stand-in for a ctypes foreign function that is resolved on first call.
+
+    restype, argtypes and errcheck may be assigned before the symbol is looked up;
+    they are copied onto the real function when it is resolved. If wrapper is set,
+    calls go instead to wrapper(self), made once on first call.
+    """
+    __slots__ = ("library", "__name__", "restype", "argtypes", "errcheck", "wrapper", "_function", "_call")
+
+    def __init__(self, library: "LazyLibrary", name: str):
+        self.library = library
+        self.__name__ = name
+        self.restype = ctypes.c_int
+        self.argtypes = None
+        self.errcheck = None
+        self.wrapper = None
+        self._function = None
+        self._call = None
+
+    def __repr__(self):
+        state = "resolved" if self._function is not None else "unresolved"
+        return f"<{type(self).__name__} {self.__name__} ({state})>"
+
+    def __call__(self, *args):
+        call = self._call
+        if call is None:
+            call = self.bind()
+        return call(*args)
+
+    def bind(self):
+        """Resolve the function now and return what calls go to: it, or its wrapper."""
+        if self._call is None:
+            function = self.resolve()
+            self._call = function if self.wrapper is None else self.wrapper(self)
+        return self._call
+
+    def resolve(self):
+        """Look up the symbol now and return the underlying ctypes function."""
+        if self._function is None:
+            function = self.library.load()[self.__name__]
+            function.restype = self.restype
+            if self.argtypes is not None:
+                function.argtypes = self.argtypes
+            if self.errcheck is not None:
+                function.errcheck = self.errcheck
+            self._function = function
+        return self._function
+
+    def with_argtypes(self, *argtypes) -> "LazyFunction":
+        """A separate binding of the same symbol that takes different argument types."""
+        variant = LazyFunction(self.library, self.__name__)
+        variant.restype = self.restype
+        variant.argtypes = argtypes
+        variant.errcheck = self.errcheck
+        variant.wrapper = self.wrapper
+        return variant
+
+
+class LazyLibrary(object):
+    """
+    A native library that is only located and opened when first needed.
+
+    Candidates are tried in order: the path named by environment variable env_var,
+    the file bundled with this package for the current platform, and then the
+    system library names. A candidate is only accepted if it exports the function
+    named by marker.
+    """
+
+    def __init__(self, env_var: str, bundled: dict, system: Sequence[str], link_name: str, marker: str):
+        self.env_var = env_var
+        self.bundled = bundled  # sys.platform -> file name inside the ctj package
+        self.system = tuple(system)  # names handed to the dynamic loader
+        self.link_name = link_name  # name for ctypes.util.find_library()
+        self.marker = marker
+        self.path = None
+        self.origin = None
+        self._cdll = None
+        self._info = None
+        self._missing = False  # load() failed once, for available()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> LazyFunction:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        function = LazyFunction(self, name)
+        # Cache the stand-in, so later lookups skip __getattr__
+        setattr(self, name, function)
+        return function
+
+    def candidates(self):
+        """Yield (origin, path_or_name) pairs in the order they will be tried."""
+        override = os.environ.get(self.env_var)
+        if override:
+            yield "environment", override
+            return  # An explicit override must not silently fall back
+        bundled = self.bundled.get(sys.platform)
+        if bundled is not None:
+            try:
+                yield "bundled", resource_filename("ctj", bundled)
+            except FileNotFoundError:
+                pass
+        yield from (("system", name) for name in self.system)
+        found = ctypes.util.find_library(self.link_name)
+        if found is not None:
+            yield "system", found
+
+    def load(self) -> ctypes.CDLL:
+        """Open the shared library, if that has not happened yet, and return it."""
+        if self._cdll is not None:
+            return self._cdll
+        with self._lock:
+            if self._cdll is None:
+                tried = []
+                for origin, name in self.candidates():
+                    try:
+                        cdll = ctypes.CDLL(name)
+                    except OSError as exc:
+                        tried.append(f"{name}: {exc}")
+                        continue
+                    if not hasattr(cdll, self.marker):
+                        tried.append(f"{name}: does not export {self.marker}")
+                        continue
+                    self.path = _loaded_path(cdll, self.marker) or name
+                    self.origin = origin
+                    self._cdll = cdll
+                    break
+                else:
+                    raise OSError(
+                        f"Could not load {self.link_name} library "
+                        f"(set {self.env_var} to its path); tried:\n  " + "\n  ".join(tried))
+        return self._cdll
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._cdll is not None
+
+    def available(self) -> bool:
+        """True if the library can be loaded. Loads it, but tries only once if that fails."""
+        if self._cdll is None and not self._missing:
+            try:
+                self.load()
+            except OSError:
+                self._missing = True
+        return self._cdll is not None
+
+    def has_symbol(self, name: str) -> bool:
+        """True if the loaded build exports the named function."""
+        return hasattr(self.load(), name)
+
+    def info(self) -> LibraryInfo:
+        """Describe the build that was loaded. Reads the library file once, so keep it off hot paths."""
+        if self._info is None:
+            self.load()
+            self._info = _inspect_build(self.path, self.origin)
+        return self._info
+
+
+# SIMD extensions, as named by libjpeg-turbo's JSIMD_FORCE<name> environment variables
+_SIMD_NAMES = ("MMX", "3DNOW", "SSE", "SSE2", "AVX2", "NEON", "DSPR2", "MMI", "ALTIVEC")
+_VERSION_RE = re.compile(rb"libjpeg-turbo version (\d+(?:\.\d+)*) \(build (\d+)\)")
+_SIMD_RE = re.compile(rb"JSIMD_FORCE(" + b"|".join(n.encode() for n in _SIMD_NAMES) + rb")\0")
+
+
+class _DlInfo(ctypes.Structure):
+    _fields_ = (
+        ("dli_fname", ctypes.c_char_p),
+        ("dli_fbase", ctypes.c_void_p),
+        ("dli_sname", ctypes.c_char_p),
+        ("dli_saddr", ctypes.c_void_p),
+    )
+
+
+def _loaded_path(cdll: ctypes.CDLL, symbol: str) -> Optional[str]:
+    """Full path of a loaded library, which may have been opened by soname alone."""
+    try:
+        if sys.platform == "win32":
+            buffer = ctypes.create_unicode_buffer(32768)
+            if ctypes.windll.kernel32.GetModuleFileNameW(ctypes.c_void_p(cdll._handle), buffer, len(buffer)):
+                return buffer.value
+            return None
+        dladdr = ctypes.CDLL(None).dladdr
+        dladdr.argtypes = (ctypes.c_void_p, ctypes.POINTER(_DlInfo))
+        info = _DlInfo()
+        address = ctypes.cast(cdll[symbol], ctypes.c_void_p)
+        if dladdr(address, ctypes.byref(info)) and info.dli_fname:
+            return os.fsdecode(info.dli_fname)
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+def _inspect_build(path: str, origin: str) -> LibraryInfo:
+    # libjpeg-turbo does not export its version or SIMD support through the API,
+    # but both are visible as strings in the binary: the version banner, and the
+    # JSIMD_FORCE* environment variable names that only SIMD-enabled builds query.
+    version = build = None
+    simd = ()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        pass  # e.g. a bare soname that the dynamic loader resolved for us
+    else:
+        match = _VERSION_RE.search(data)
+        if match is not None:
+            version, build = match.group(1).decode(), match.group(2).decode()
+        found = {m.group(1).decode() for m in _SIMD_RE.finditer(data)}
+        if b"JSIMD_FORCENONE\0" in data and os.environ.get("JSIMD_FORCENONE") != "1":
+            simd = tuple(n for n in _SIMD_NAMES if n in found and _cpu_supports(n))
+    return LibraryInfo(path=path, origin=origin, version=version, build=build, simd=simd)
+
+
+def _cpu_supports(simd_name: str) -> bool:
+    machine = platform.machine().lower()
+    if simd_name == "NEON":
+        return machine in ("arm64", "aarch64") or machine.startswith("arm")
+    if machine in ("x86_64", "amd64"):
+        if simd_name in ("MMX", "3DNOW", "SSE"):
+            return False  # Only the 32-bit x86 code paths use these
+    elif machine not in ("i386", "i686", "x86"):
+        return False
+    if simd_name == "AVX2" and sys.platform.startswith("linux"):
+        try:
+            with open("/proc/cpuinfo") as f:
+                return " avx2" in f.read()
+        except OSError:
+            pass
+    # Every x86-64 CPU has SSE2; elsewhere trust the library's own runtime check
+    return True
+
+
+_c_runtime = {}
+
+
+def _c_function(name: str, restype, argtypes):
+    """A function of the C runtime that libjpeg uses, looked up on first use."""
+    function = _c_runtime.get(name)
+    if function is None:
+        # Current Windows builds of libjpeg-turbo use the universal C runtime
+        runtime = ctypes.CDLL("ucrtbase" if sys.platform == "win32" else None, use_errno=True)
+        function = getattr(runtime, "_" + name if sys.platform == "win32" and name == "fdopen" else name)
+        function.restype = restype
+        function.argtypes = argtypes
+        _c_runtime[name] = function
+    return function
+
+
+def c_free(pointer) -> None:
+    """Release memory that the library allocated with malloc(), such as jpeg_mem_dest() output."""
+    _c_function("free", None, (ctypes.c_void_p,))(pointer)
+
+
+def c_fdopen(fd: int, mode: str) -> int:
+    """
+    Open a C stdio FILE on a duplicate of file descriptor fd, for jpeg_stdio_src and
+    jpeg_stdio_dest. Close it with c_fclose(), which leaves fd itself open.
+    """
+    duplicate = os.dup(fd)
+    file = _c_function("fdopen", ctypes.c_void_p, (ctypes.c_int, ctypes.c_char_p))(duplicate, mode.encode())
+    if not file:
+        os.close(duplicate)
+        raise OSError(ctypes.get_errno(), f"Cannot open file descriptor {fd} with mode {mode!r}")
+    return file
+
+
+def c_fclose(file: int) -> None:
+    """Flush and close a FILE from c_fdopen(), raising OSError if that fails."""
+    if _c_function("fclose", ctypes.c_int, (ctypes.c_void_p,))(file) != 0:
+        raise OSError("Error closing C stdio file")
+
+
+_guard = None
+
+
+def guard_library() -> ctypes.CDLL:
+    """The setjmp() guards of the ctj._guard extension (see _guard.c), loaded with ctypes."""
+    global _guard
+    if _guard is None:
+        try:
+            from . import _guard as module
+        except ImportError as exc:
+            raise OSError("The ctj._guard extension is not built; run: python setup.py build_ext --inplace") from exc
+        _guard = ctypes.CDLL(module.__file__)
+    return _guard
+
+
+libjpeg_lib = LazyLibrary(
+    env_var="CTJ_LIBJPEG",
+    bundled={"win32": "jpeg62.dll", "darwin": "libjpeg.62.dylib"},
+    system=("libjpeg.so.62", "libjpeg.62.dylib", "jpeg62.dll"),
+    link_name="jpeg",
+    marker="jpeg_std_error",
+)
+
+libturbojpeg_lib = LazyLibrary(
+    env_var="CTJ_LIBTURBOJPEG",
+    bundled={"win32": "turbojpeg.dll", "darwin": "libturbojpeg.dylib"},
+    system=("libturbojpeg.so.0", "libturbojpeg.0.dylib", "turbojpeg.dll"),
+    link_name="turbojpeg",
+    marker="tj3Init",
+)
+
+
+def library_info() -> LibraryInfo:
+    """Describe, as far as can be told, the libjpeg build used by ctj.jpeglib, loading it if necessary."""
+    return libjpeg_lib.info()
+
+
+__all__ = [
+    "LazyFunction",
+    "LazyLibrary",
+    "LibraryInfo",
+    "c_fclose",
+    "c_fdopen",
+    "c_free",
+    "guard_library",
+    "libjpeg_lib",
+    "libturbojpeg_lib",
+    "library_info",
+]
@@ -0,0 +1,124 @@
+"""
+Bounds on the work and memory that decoding one image may take.
+
+A hostile file can be small and still expensive: huge dimensions, or a
+progressive image with thousands of scans, each of which passes over the
+whole coefficient buffer. DecodeLimits checks what the header promises before
+any memory is committed, and counts scans while they are read.
+"""
+
+import ctypes
+from typing import Optional
+
+from .errors import LimitExceededError
+from .jpeglib import JBLOCK, jpeg_has_multiple_scans
+from .pool import Decompressor
+
+# From the J_MESSAGE_CODE enum of jerror.h
+JERR_NO_BACKING_STORE = 49
+
+
+def coefficient_buffer_size(decompressor: Decompressor) -> int:
+    """
+    Bytes that libjpeg allocates at once to hold all the coefficients of the image,
+    which it needs for multi-scan images and in buffered-image mode.
+    """
+    cinfo = decompressor.cinfo
+    size = 0
+    for i in range(cinfo.num_components):
+        component = cinfo.comp_info[i]
+        # Rounded up to whole MCUs, as jinit_d_coef_controller requests it
+        columns = -(-component.width_in_blocks // component.h_samp_factor) * component.h_samp_factor
+        rows = -(-component.height_in_blocks // component.v_samp_factor) * component.v_samp_factor
+        size += rows * columns * ctypes.sizeof(JBLOCK)
+    return size
+
+
+class DecodeLimits(object):
+    """
+    Limits on decoding one image; None means unlimited.
+
+    max_scans bounds the number of scans read, max_pixels the width times height
+    of the image as coded, before any scaling, and max_memory the bytes of the
+    two allocations that grow with the whole image: the buffer for all the
+    coefficients of a multi-scan image, and the decoded image. Both sizes are
+    computed from the header, and checked before either is allocated. libjpeg's
+    own working memory, which grows with the image width only, is bounded by
+    setting its max_memory_to_use, which libjpeg checks when it allocates the
+    coefficient buffer; exceeding that raises LimitExceededError without a
+    value. Scans are counted by a progress monitor, which stops the call that is
+    reading once one too many begins, through the error manager, and has it
+    raise LimitExceededError.
+    """
+
+    def __init__(self, max_scans: Optional[int] = None, max_pixels: Optional[int] = None,
+                 max_memory: Optional[int] = None):
+        for name, value in (("max_scans", max_scans), ("max_pixels", max_pixels), ("max_memory", max_memory)):
+            if value is not None and value < 1:
+                raise ValueError(f"{name} must be at least 1, not {value}")
+        self.max_scans = max_scans
+        self.max_pixels = max_pixels
+        self.max_memory = max_memory
+        self.exceeded: Optional[LimitExceededError] = None
+        self._decompressor = None
+        self._coefficients = 0  # bytes of the coefficient buffer, if max_memory counts it
+
+    def __bool__(self):
+        return self.max_scans is not None or self.max_pixels is not None or self.max_memory is not None
+
+    def check_header(self, decompressor: Decompressor, buffered: bool = False) -> None:
+        """
+        After jpeg_read_header, raise LimitExceededError if the image is too large, and
+        otherwise apply the limits for jpeg_start_decompress. buffered is True if the
+        coefficient buffer will be needed for a single-scan image too.
+        """
+        cinfo = decompressor.cinfo
+        pixels = cinfo.image_width * cinfo.image_height
+        if self.max_pixels is not None and pixels > self.max_pixels:
+            raise LimitExceededError("max_pixels", pixels, self.max_pixels)
+        multiple_scans = jpeg_has_multiple_scans(decompressor.c_info)
+        self._coefficients = 0
+        if self.max_memory is not None:
+            if multiple_scans or buffered:
+                self._coefficients = coefficient_buffer_size(decompressor)
+                if self._coefficients > self.max_memory:
+                    raise LimitExceededError("max_memory", self._coefficients, self.max_memory)
+            # The coefficient buffer plus all that libjpeg allocated before it must fit;
+            # what libjpeg reports when they do not is a failure to find a backing store
+            cinfo.mem.contents.max_memory_to_use = self.max_memory
+            decompressor.errors.overrides[JERR_NO_BACKING_STORE] = LimitExceededError(
+                "max_memory", None, self.max_memory)
+        self.exceeded = None
+        self._decompressor = decompressor
+        if self.max_scans is not None and multiple_scans:
+            decompressor.errors.monitor(cinfo, self._monitor)
+
+    def check(self, output_bytes: int = 0) -> None:
+        """
+        After jpeg_start_decompress or jpeg_read_coefficients, stop monitoring, and raise
+        LimitExceededError if a limit was hit meanwhile and not raised yet, or if the
+        coefficient buffer and output_bytes more would exceed max_memory.
+        """
+        decompressor, self._decompressor = self._decompressor, None
+        if decompressor is None:
+            return
+        decompressor.errors.monitor(decompressor.cinfo, None)
+        if self.exceeded is not None:
+            raise self.exceeded
+        if self.max_memory is not None:
+            size = self._coefficients + output_bytes
+            if size > self.max_memory:
+                raise LimitExceededError("max_memory", size, self.max_memory)
+
+    def _monitor(self, c_info) -> None:
+        scans = self._decompressor.cinfo.input_scan_number
+        if scans > self.max_scans and self.exceeded is None:
+            self.exceeded = LimitExceededError("max_scans", scans, self.max_scans)
+            # Stops the call in progress as soon as this returns, and has it raise the error
+            self._decompressor.errors.fail(c_info, self.exceeded)
+
+
+__all__ = [
+    "DecodeLimits",
+    "coefficient_buffer_size",
+]
@@ -0,0 +1,75 @@
+"""
+A JPEG file mapped into memory and read by libjpeg in place.
+"""
+
+import mmap
+import os
+from typing import Optional
+
+import numpy
+
+from .decompress import decode
+from .pool import Decompressor
+from .probe import JpegInfo, probe
+
+
+class MmapJpegSource(object):
+    """
+    A JPEG file mapped with mmap, for libjpeg to read through jpeg_mem_src.
+
+    The source manager points at the mapping once, with the whole file length
+    available, so libjpeg never refills it from Python and nothing is copied:
+    pages are read from disk as the decoder reaches them, and skipping a marker
+    only moves a pointer. file is a path or an open binary file.
+
+    buffer is a read-only NumPy view of the mapping, which decode() and probe()
+    accept like any other buffer. Views of it must be released before close().
+    """
+
+    def __init__(self, file):
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, "rb") as opened:
+                self.mmap = self._map(opened.fileno())
+        else:
+            self.mmap = self._map(file.fileno())
+        if hasattr(self.mmap, "madvise"):
+            # The decoder reads front to back, so let the kernel read ahead aggressively
+            self.mmap.madvise(mmap.MADV_SEQUENTIAL)
+        self.buffer: Optional[numpy.ndarray] = numpy.frombuffer(self.mmap, dtype=numpy.uint8)
+
+    @staticmethod
+    def _map(fileno: int) -> mmap.mmap:
+        if os.fstat(fileno).st_size == 0:
+            raise ValueError("Empty JPEG file")
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.buffer.size
+
+    def attach(self, decompressor: Decompressor) -> None:
+        """Make the whole mapping the data source of decompressor."""
+        decompressor.memory_source(self.buffer.ctypes.data, self.buffer.size)
+
+    def decode(self, **options) -> numpy.ndarray:
+        """decode() the mapped image."""
+        return decode(self.buffer, **options)
+
+    def probe(self, **options) -> JpegInfo:
+        """probe() the mapped image."""
+        return probe(self.buffer, **options)
+
+    def close(self) -> None:
+        if self.buffer is not None:
+            self.buffer = None
+            self.mmap.close()
+
+
+__all__ = [
+    "MmapJpegSource",
+]
@@ -0,0 +1,95 @@
+"""
+Smaller JPEG streams for the same image, as jpegtran -optimize -progressive makes them.
+
+optimize() reads the quantized DCT coefficients with jpeg_read_coefficients and
+hands libjpeg's own coefficient arrays straight to jpeg_write_coefficients, with
+Huffman tables computed for the image, and progressive or arithmetic coding if
+asked. Only the entropy coding changes: the coefficients, and so the decoded
+pixels, are exactly those of the original.
+"""
+
+import ctypes
+from typing import NamedTuple, Optional
+
+from .coefficients import _CoefficientReader
+from .jpeglib import (
+    jpeg_copy_critical_parameters,
+    jpeg_finish_compress,
+    jpeg_simple_progression,
+    jpeg_write_coefficients,
+)
+from .library import c_free
+from .pool import DecoderPool, EncoderPool, default_encoder_pool
+from .transform import COPY_MARKERS, _copy_markers, _saved_markers
+
+
+class Optimized(NamedTuple):
+    data: bytes  # the new JPEG stream
+    input_bytes: int  # size of the original stream, or of what was read of a file object
+
+    @property
+    def saved(self) -> int:
+        """Bytes saved; negative if the new stream is larger."""
+        return self.input_bytes - len(self.data)
+
+
+def optimize(
+        buf,
+        progressive: bool = True,
+        arithmetic: bool = False,
+        copy_markers: str = "all",
+        pool: Optional[DecoderPool] = None,
+        encoder_pool: Optional[EncoderPool] = None,
+        max_scans: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+        max_memory: Optional[int] = None,
+        warnings_as_errors: bool = False,
+) -> Optimized:
+    """
+    Code a JPEG image again, losslessly, with optimized Huffman tables, and return
+    the new stream and the bytes saved.
+
+    The result is progressive, with libjpeg's standard scans, unless progressive
+    is false. arithmetic uses arithmetic coding instead of Huffman coding, which
+    is smaller again but not supported by every decoder. copy_markers is one of
+    COPY_MARKERS; "none" strips all of them, and "icc" keeps only the color
+    profile. The other arguments are as for decode(), and the coding objects come
+    from pool and encoder_pool.
+    """
+    if copy_markers not in COPY_MARKERS:
+        raise ValueError(f"Unknown copy_markers {copy_markers!r}; expected one of {', '.join(COPY_MARKERS)}")
+    keep = COPY_MARKERS[copy_markers]
+    encoder_pool = default_encoder_pool if encoder_pool is None else encoder_pool
+    buffer = ctypes.POINTER(ctypes.c_ubyte)()
+    size = ctypes.c_ulong(0)
+    with _CoefficientReader(buf, pool, save=keep, max_scans=max_scans, max_pixels=max_pixels,
+                            max_memory=max_memory, warnings_as_errors=warnings_as_errors) as reader:
+        markers = _saved_markers(reader.decompressor.cinfo)
+        compressor = encoder_pool.acquire()
+        try:
+            jpeg_copy_critical_parameters(reader.decompressor.c_info, compressor.c_info)
+            out = compressor.cinfo
+            if progressive:
+                jpeg_simple_progression(compressor.c_info)
+            out.arith_code = arithmetic
+            out.optimize_coding = not arithmetic  # arithmetic coding adapts by itself
+            compressor.memory_destination(ctypes.byref(buffer), ctypes.byref(size))
+            # As in jpegtran, the compressor reads the decompressor's arrays, which are in memory whole
+            jpeg_write_coefficients(compressor.c_info, reader.arrays)
+            _copy_markers(compressor, markers, keep)
+            jpeg_finish_compress(compressor.c_info)
+            compressor.finish_memory()
+        finally:
+            encoder_pool.release(compressor)
+
+    address = ctypes.cast(buffer, ctypes.c_void_p).value
+    try:
+        return Optimized(ctypes.string_at(address, size.value), reader.input_bytes)
+    finally:
+        c_free(address)
+
+
+__all__ = [
+    "Optimized",
+    "optimize",
+]
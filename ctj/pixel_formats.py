@@ -0,0 +1,84 @@
+"""
+Names for the libjpeg-turbo pixel formats that the high-level API reads and writes.
+"""
+
+from typing import Union
+
+from .jpeglib import (
+    J_COLOR_SPACE,
+    JCS_CMYK,
+    JCS_EXT_ABGR,
+    JCS_EXT_ARGB,
+    JCS_EXT_BGR,
+    JCS_EXT_BGRA,
+    JCS_EXT_BGRX,
+    JCS_EXT_RGB,
+    JCS_EXT_RGBA,
+    JCS_EXT_RGBX,
+    JCS_EXT_XBGR,
+    JCS_EXT_XRGB,
+    JCS_GRAYSCALE,
+    JCS_RGB,
+    JCS_YCbCr,
+    JCS_YCCK,
+)
+
+PIXEL_FORMATS = {
+    "GRAY": JCS_GRAYSCALE,
+    "RGB": JCS_EXT_RGB,
+    "RGBX": JCS_EXT_RGBX,
+    "BGR": JCS_EXT_BGR,
+    "BGRX": JCS_EXT_BGRX,
+    "XBGR": JCS_EXT_XBGR,
+    "XRGB": JCS_EXT_XRGB,
+    "RGBA": JCS_EXT_RGBA,
+    "BGRA": JCS_EXT_BGRA,
+    "ABGR": JCS_EXT_ABGR,
+    "ARGB": JCS_EXT_ARGB,
+    "CMYK": JCS_CMYK,
+    "YCbCr": JCS_YCbCr,
+    "YCCK": JCS_YCCK,
+}
+
+# Bytes per pixel of each pixel format
+PIXEL_SIZES = {
+    JCS_GRAYSCALE: 1,
+    JCS_RGB: 3,
+    JCS_YCbCr: 3,
+    JCS_CMYK: 4,
+    JCS_YCCK: 4,
+    JCS_EXT_RGB: 3,
+    JCS_EXT_RGBX: 4,
+    JCS_EXT_BGR: 3,
+    JCS_EXT_BGRX: 4,
+    JCS_EXT_XBGR: 4,
+    JCS_EXT_XRGB: 4,
+    JCS_EXT_RGBA: 4,
+    JCS_EXT_BGRA: 4,
+    JCS_EXT_ABGR: 4,
+    JCS_EXT_ARGB: 4,
+}
+
+PixelFormat = Union[str, int, J_COLOR_SPACE]
+
+
+def color_space(pixel_format: PixelFormat) -> J_COLOR_SPACE:
+    """Convert a pixel format name such as "BGRA", or a J_COLOR_SPACE value, to a J_COLOR_SPACE."""
+    if isinstance(pixel_format, str):
+        try:
+            return PIXEL_FORMATS[pixel_format]
+        except KeyError:
+            raise ValueError(
+                f"Unknown pixel format {pixel_format!r}; expected one of {', '.join(PIXEL_FORMATS)}") from None
+    result = J_COLOR_SPACE(pixel_format)
+    if result not in PIXEL_SIZES:
+        raise ValueError(f"Unsupported pixel format {result!r}")
+    return result
+
+
+__all__ = [
+    "PIXEL_FORMATS",
+    "PIXEL_SIZES",
+    "PixelFormat",
+    "color_space",
+]
@@ -0,0 +1,376 @@
+"""
+Reusable libjpeg compression and decompression objects, and per-thread pools of them.
+
+Creating a jpeg_decompress_struct costs about as much as decoding a small
+thumbnail, so the high-level API borrows objects from a pool instead. Between
+images they are reset with jpeg_abort_(de)compress, which frees per-image
+memory but keeps the object itself.
+"""
+
+import collections
+import ctypes
+import threading
+import time
+import weakref
+from typing import Callable, Deque, NamedTuple, Optional
+
+from .jpeglib import (
+    FILE,
+    JCS_GRAYSCALE,
+    JHUFF_TBL,
+    JPEG_LIB_VERSION,
+    jpeg_abort_compress,
+    jpeg_abort_decompress,
+    jpeg_CreateCompress,
+    jpeg_CreateDecompress,
+    jpeg_compress_struct,
+    jpeg_decompress_struct,
+    jpeg_destroy_compress,
+    jpeg_destination_mgr,
+    jpeg_destroy_decompress,
+    jpeg_mem_dest,
+    jpeg_mem_src,
+    jpeg_set_defaults,
+    jpeg_source_mgr,
+    jpeg_stdio_dest,
+    jpeg_stdio_src,
+)
+from .error_manager import ErrorManager
+from .library import c_fclose, c_fdopen, c_free
+
+
+class _mem_destination_mgr(ctypes.Structure):
+    """my_mem_destination_mgr, the manager that jpeg_mem_dest makes, from jdatadst.c."""
+    _fields_ = (
+        ("pub", jpeg_destination_mgr),
+        ("outbuffer", ctypes.c_void_p),
+        ("outsize", ctypes.c_void_p),
+        ("newbuffer", ctypes.c_void_p),  # the buffer allocated last, or NULL if the caller's is still in use
+        ("buffer", ctypes.c_void_p),
+        ("bufsize", ctypes.c_size_t),
+    )
+
+
+class Decompressor(object):
+    """A jpeg_decompress_struct and its error manager, reusable for many images."""
+
+    def __init__(self):
+        self.errors = ErrorManager()
+        self.cinfo = jpeg_decompress_struct()
+        self.errors.attach(self.cinfo)
+        jpeg_CreateDecompress(ctypes.byref(self.cinfo), JPEG_LIB_VERSION, ctypes.sizeof(jpeg_decompress_struct))
+        self.c_info = ctypes.byref(self.cinfo)
+        self.last_used = time.monotonic()
+        self._max_memory = self.cinfo.mem.contents.max_memory_to_use  # as set from JPEGMEM
+        self._sources = {}  # address of the manager made by each jpeg_*_src function
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def _use_source(self, setup, *args) -> None:
+        # jpeg_mem_src and jpeg_stdio_src allocate their manager once, in the permanent
+        # pool, and refuse to reuse a different one; put back the one made last time.
+        # Its address is kept, not the pointer read from cinfo.src, which would
+        # share memory with that field and change along with it.
+        self.cinfo.src = ctypes.cast(self._sources.get(setup.__name__), ctypes.POINTER(jpeg_source_mgr))
+        setup(self.c_info, *args)
+        self._sources[setup.__name__] = ctypes.cast(self.cinfo.src, ctypes.c_void_p).value
+
+    def memory_source(self, address: int, size: int) -> None:
+        """Read the next image from size bytes at address, using jpeg_mem_src."""
+        self._use_source(jpeg_mem_src, ctypes.cast(address, ctypes.POINTER(ctypes.c_ubyte)), size)
+
+    def file_source(self, fd: int) -> None:
+        """Read the next image from file descriptor fd, using jpeg_stdio_src, until reset()."""
+        self._close_file()
+        self._file = c_fdopen(fd, "rb")
+        self._use_source(jpeg_stdio_src, ctypes.cast(self._file, ctypes.POINTER(FILE)))
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            file, self._file = self._file, None
+            c_fclose(file)
+
+    @property
+    def failed(self) -> bool:
+        """libjpeg reported a fatal error for the current image, and the object should not be reused."""
+        return self.errors.failed
+
+    def reset(self) -> None:
+        """Abandon the current image, keeping the object ready for the next one."""
+        if self.cinfo is not None:
+            jpeg_abort_decompress(self.c_info)
+            self.errors.monitor(self.cinfo, None)
+            self.cinfo.mem.contents.max_memory_to_use = self._max_memory
+            self.errors.reset()
+            self.last_used = time.monotonic()
+            self._close_file()
+
+    def close(self) -> None:
+        if getattr(self, "cinfo", None) is not None:
+            jpeg_destroy_decompress(self.c_info)
+            self.cinfo = None
+            self._close_file()
+
+
+class Compressor(object):
+    """A jpeg_compress_struct and its error manager, reusable for many images."""
+
+    def __init__(self):
+        self.errors = ErrorManager()
+        self.cinfo = jpeg_compress_struct()
+        self.errors.attach(self.cinfo)
+        jpeg_CreateCompress(ctypes.byref(self.cinfo), JPEG_LIB_VERSION, ctypes.sizeof(jpeg_compress_struct))
+        self.c_info = ctypes.byref(self.cinfo)
+        self.last_used = time.monotonic()
+        self._destinations = {}  # address of the manager made by each jpeg_*_dest function
+        self._file = None
+        self._memory_output = False  # memory_destination() is in use, and its buffer not handed over
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def _use_destination(self, setup, *args) -> None:
+        # Like the source functions, jpeg_mem_dest and jpeg_stdio_dest only reuse their own manager
+        self.cinfo.dest = ctypes.cast(self._destinations.get(setup.__name__), ctypes.POINTER(jpeg_destination_mgr))
+        setup(self.c_info, *args)
+        self._destinations[setup.__name__] = ctypes.cast(self.cinfo.dest, ctypes.c_void_p).value
+
+    def memory_destination(self, buffer, size) -> None:
+        """
+        Write the next image with jpeg_mem_dest; buffer and size are byref() arguments for it.
+        libjpeg only sets them in jpeg_finish_compress; call finish_memory() then to take
+        over the buffer, which reset() frees otherwise.
+        """
+        self._use_destination(jpeg_mem_dest, buffer, size)
+        self._memory_output = True
+
+    def finish_memory(self) -> None:
+        """After jpeg_finish_compress, leave the buffer of memory_destination() to the caller, to c_free()."""
+        self._memory_output = False
+
+    def _free_memory_output(self) -> None:
+        # Until jpeg_finish_compress reports it, the buffer that libjpeg allocated last
+        # is only known to the manager; the ones before it are freed already
+        if self._memory_output:
+            self._memory_output = False
+            dest = ctypes.cast(self.cinfo.dest, ctypes.POINTER(_mem_destination_mgr)).contents
+            if dest.newbuffer:
+                c_free(dest.newbuffer)
+                dest.newbuffer = None
+
+    def file_destination(self, fd: int) -> None:
+        """Write the next image to file descriptor fd, using jpeg_stdio_dest."""
+        self._free_memory_output()
+        self._close_file()
+        self._file = c_fdopen(fd, "wb")
+        self._use_destination(jpeg_stdio_dest, ctypes.cast(self._file, ctypes.POINTER(FILE)))
+
+    @property
+    def failed(self) -> bool:
+        """libjpeg reported a fatal error for the current image, and the object should not be reused."""
+        return self.errors.failed
+
+    def finish_file(self) -> None:
+        """Flush and close the file of file_destination(), raising OSError if writing failed."""
+        self._close_file()
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            file, self._file = self._file, None
+            c_fclose(file)
+
+    def reset(self) -> None:
+        """Abandon the current image, keeping the object ready for the next one."""
+        if self.cinfo is not None:
+            self._free_memory_output()
+            jpeg_abort_compress(self.c_info)
+            self.cinfo.progress = None
+            if self.cinfo.optimize_coding:
+                self._restore_huffman_tables()
+            self.errors.reset()
+            self.last_used = time.monotonic()
+            self._close_file()
+
+    def _restore_huffman_tables(self) -> None:
+        # optimize_coding computes tables in place of the standard ones, and libjpeg-turbo's
+        # jpeg_set_defaults only installs standard tables where there are none at all
+        for field, index, table in _standard_huffman_tables():
+            pointer = getattr(self.cinfo, field)[index]
+            if pointer:
+                ctypes.memmove(pointer, ctypes.byref(table), ctypes.sizeof(JHUFF_TBL))
+        self.cinfo.optimize_coding = False
+
+    def close(self) -> None:
+        if getattr(self, "cinfo", None) is not None:
+            self._free_memory_output()
+            jpeg_destroy_compress(self.c_info)
+            self.cinfo = None
+            self._close_file()
+
+
+_huffman_tables = []
+
+
+def _standard_huffman_tables():
+    """(field, index, JHUFF_TBL) copies of the tables that jpeg_set_defaults installs."""
+    if not _huffman_tables:
+        compressor = Compressor()
+        try:
+            compressor.cinfo.in_color_space = JCS_GRAYSCALE
+            compressor.cinfo.input_components = 1
+            jpeg_set_defaults(compressor.c_info)
+            for field in ("dc_huff_tbl_ptrs", "ac_huff_tbl_ptrs"):
+                for index, pointer in enumerate(getattr(compressor.cinfo, field)):
+                    if pointer:
+                        _huffman_tables.append((field, index, JHUFF_TBL.from_buffer_copy(pointer.contents)))
+        finally:
+            compressor.close()
+    return _huffman_tables
+
+
+class PoolStats(NamedTuple):
+    hits: int  # acquisitions served by an idle object
+    creations: int  # acquisitions that had to create a new object
+    evictions: int  # objects destroyed because the pool was full or they sat idle too long
+
+
+class HandlePool(object):
+    """
+    Idle objects made by factory, kept per thread so that acquiring one needs no lock.
+
+    At most max_idle objects are kept by each thread. Objects idle for longer than
+    idle_timeout seconds are destroyed the next time that thread uses the pool,
+    and objects that libjpeg failed in are destroyed when released. factory()
+    must return objects with reset() and close() methods and last_used and
+    failed attributes, like Decompressor and Compressor.
+    """
+
+    def __init__(self, factory: Callable, max_idle: int = 4, idle_timeout: Optional[float] = 60.0):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()  # guards the counters only
+        self._hits = 0
+        self._creations = 0
+        self._evictions = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.clear()
+
+    def _idle(self) -> Deque:
+        try:
+            return self._local.idle
+        except AttributeError:
+            self._local.idle = collections.deque()
+            return self._local.idle
+
+    def _evict(self, handle) -> None:
+        handle.close()
+        with self._lock:
+            self._evictions += 1
+
+    def evict_idle(self) -> None:
+        """Destroy this thread's objects that have been idle longer than idle_timeout."""
+        if self.idle_timeout is None:
+            return
+        idle = self._idle()
+        deadline = time.monotonic() - self.idle_timeout
+        # The oldest objects are at the left end
+        while idle and idle[0].last_used < deadline:
+            self._evict(idle.popleft())
+
+    def acquire(self):
+        """Take an idle object, or create one. Give it back with release()."""
+        self.evict_idle()
+        idle = self._idle()
+        if idle:
+            with self._lock:
+                self._hits += 1
+            return idle.pop()  # the most recently used, whose memory is most likely still cached
+        with self._lock:
+            self._creations += 1
+        return self.factory()
+
+    def release(self, handle) -> None:
+        """Reset handle and keep it for reuse by this thread, unless the pool is full or handle failed."""
+        failed = handle.failed
+        handle.reset()
+        idle = self._idle()
+        if not failed and len(idle) < self.max_idle:
+            idle.append(handle)
+        else:
+            self._evict(handle)
+
+    def release_later(self, handle, owner) -> None:
+        """
+        release() handle once owner is garbage collected, if that happens on this
+        thread. On any other thread handle is destroyed instead, so that the idle
+        objects of each thread are only ever those it acquired.
+        """
+        weakref.finalize(owner, self._release_from, handle, threading.get_ident())
+
+    def _release_from(self, handle, thread: int) -> None:
+        if threading.get_ident() == thread:
+            self.release(handle)
+        else:
+            self._evict(handle)
+
+    def clear(self) -> None:
+        """Destroy all of this thread's idle objects."""
+        idle = self._idle()
+        while idle:
+            self._evict(idle.pop())
+
+    @property
+    def stats(self) -> PoolStats:
+        with self._lock:
+            return PoolStats(self._hits, self._creations, self._evictions)
+
+
+class DecoderPool(HandlePool):
+    """Per-thread pool of Decompressor objects."""
+
+    def __init__(self, max_idle: int = 4, idle_timeout: Optional[float] = 60.0):
+        super().__init__(Decompressor, max_idle=max_idle, idle_timeout=idle_timeout)
+
+
+class EncoderPool(HandlePool):
+    """Per-thread pool of Compressor objects."""
+
+    def __init__(self, max_idle: int = 4, idle_timeout: Optional[float] = 60.0):
+        super().__init__(Compressor, max_idle=max_idle, idle_timeout=idle_timeout)
+
+
+# Shared by decode() and encode() when no pool is given
+default_decoder_pool = DecoderPool()
+default_encoder_pool = EncoderPool()
+
+
+__all__ = [
+    "Compressor",
+    "DecoderPool",
+    "Decompressor",
+    "EncoderPool",
+    "HandlePool",
+    "PoolStats",
+    "default_decoder_pool",
+    "default_encoder_pool",
+]
@@ -0,0 +1,354 @@
+"""
+Reading JPEG headers without decoding any pixels.
+
+probe() runs jpeg_read_header alone, behind a suspending source manager that
+reads the file a chunk at a time and seeks over markers that are skipped, so
+typically only the first few kilobytes of a file are ever read.
+read_metadata() does the same for the APPn and COM markers asked for, and
+returns their payloads: views of the caller's buffer when the image is in
+memory, or copies that libjpeg saved when it is read from a file.
+"""
+
+import ctypes
+import mmap
+import os
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy
+
+from .compress import SUBSAMPLING
+from .decompress import _as_bytes_array
+from .jpeglib import (
+    J_COLOR_SPACE,
+    JOCTET,
+    JPEG_APP0,
+    JPEG_COM,
+    JPEG_SUSPENDED,
+    jpeg_marker_parser_method,
+    jpeg_read_header,
+    jpeg_save_markers,
+    jpeg_set_marker_processor,
+)
+from .pool import DecoderPool, default_decoder_pool
+from .py_jpeg_source import PushJpegSource
+
+# Leading bytes that identify the markers probe() looks for
+_EXIF_ID = b"Exif\0\0"
+_ICC_ID = b"ICC_PROFILE\0"
+_XMP_ID = b"http://ns.adobe.com/xap/1.0/\0"
+_APP1 = JPEG_APP0 + 1
+_APP2 = JPEG_APP0 + 2
+
+# Code of each marker that read_metadata() can save
+MARKER_CODES = {**{f"APP{n}": JPEG_APP0 + n for n in range(16)}, "COM": JPEG_COM}
+_MARKER_NAMES = {code: name for name, code in MARKER_CODES.items()}
+
+
+class JpegInfo(object):
+    """What jpeg_read_header found out about an image."""
+    __slots__ = (
+        "width",
+        "height",
+        "components",
+        "colorspace",  # J_COLOR_SPACE of the compressed data
+        "precision",  # bits per sample
+        "progressive",
+        "arithmetic",  # arithmetic rather than Huffman coding
+        "sampling",  # (h_samp_factor, v_samp_factor) of each component
+        "jfif",  # a JFIF APP0 marker was found
+        "adobe",  # an Adobe APP14 marker was found
+        "exif",  # an Exif APP1 marker was found
+        "icc",  # an ICC profile APP2 marker was found
+        "bytes_read",  # bytes read from the source, excluding any skipped
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields[name])
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other):
+        if not isinstance(other, JpegInfo):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    @property
+    def subsampling(self) -> Optional[str]:
+        """Chroma subsampling as a SUBSAMPLING name such as "4:2:0", if it is one of those."""
+        if len(self.sampling) != 3 or any(factors != (1, 1) for factors in self.sampling[1:]):
+            return None
+        for name, factors in SUBSAMPLING.items():
+            if factors == self.sampling[0]:
+                return name
+        return None
+
+
+class _HeaderSource(object):
+    """
+    A file or buffer behind a PushJpegSource: when jpeg_read_header suspends, read_more()
+    seeks past whatever libjpeg skipped and pushes the next, larger, chunk of the file.
+    """
+
+    def __init__(self, file=None, data=None, chunk_size: int = 4096):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.push_source = PushJpegSource()
+        if data is not None:
+            # All the data is there already, and probe() returns before it could change
+            self.push_source.push(data, in_place=True)
+            self.bytes_read = len(data)
+
+    def close(self) -> None:
+        self.push_source.close()
+        self.file = None
+
+    def read_more(self) -> bool:
+        """Push the next chunk of the file. False at the end of the file."""
+        if self.file is None:
+            return False
+        skip = self.push_source.skip_pending
+        if skip and self.file.seekable():
+            self.file.seek(skip, os.SEEK_CUR)
+            self.push_source.skip(skip)
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            if not chunk:
+                return False
+            self.bytes_read += len(chunk)
+            self.chunk_size *= 2  # long headers take a few reads, not many
+            self.push_source.push(chunk)
+            if self.push_source.bytes_in_buffer:
+                return True  # otherwise all of chunk was skipped
+
+
+def _is_file(source) -> bool:
+    """Whether to read source as a file object; an mmap has read() too, but is all in memory."""
+    return hasattr(source, "read") and not isinstance(source, mmap.mmap)
+
+
+def _read_info(decompressor, source: _HeaderSource) -> JpegInfo:
+    c_info = decompressor.c_info
+    cinfo = decompressor.cinfo
+    source.push_source.attach(decompressor)
+    # Keep only as much of APP1 and APP2 as it takes to recognize Exif and ICC data
+    jpeg_save_markers(c_info, _APP1, len(_EXIF_ID))
+    jpeg_save_markers(c_info, _APP2, len(_ICC_ID))
+    try:
+        while jpeg_read_header(c_info, True) == JPEG_SUSPENDED:
+            if not source.read_more():
+                raise ValueError("JPEG data ends before the start of the image")
+        exif = icc = False
+        marker = cinfo.marker_list
+        while marker:
+            saved = ctypes.string_at(marker.contents.data, marker.contents.data_length)
+            exif = exif or marker.contents.marker == _APP1 and saved == _EXIF_ID
+            icc = icc or marker.contents.marker == _APP2 and saved == _ICC_ID
+            marker = marker.contents.next
+        return JpegInfo(
+            width=cinfo.image_width,
+            height=cinfo.image_height,
+            components=cinfo.num_components,
+            colorspace=J_COLOR_SPACE(cinfo.jpeg_color_space),
+            precision=cinfo.data_precision,
+            progressive=bool(cinfo.progressive_mode),
+            arithmetic=bool(cinfo.arith_code),
+            sampling=tuple((cinfo.comp_info[i].h_samp_factor, cinfo.comp_info[i].v_samp_factor)
+                           for i in range(cinfo.num_components)),
+            jfif=bool(cinfo.saw_JFIF_marker),
+            adobe=bool(cinfo.saw_Adobe_marker),
+            exif=exif,
+            icc=icc,
+            bytes_read=source.bytes_read,
+        )
+    finally:
+        # Back to the default of skipping these markers, for the next user of the decompressor,
+        # which must not keep source (and the data it refers to) alive either
+        jpeg_save_markers(c_info, _APP1, 0)
+        jpeg_save_markers(c_info, _APP2, 0)
+        cinfo.src = None
+
+
+def probe(source, pool: Optional[DecoderPool] = None, chunk_size: int = 4096) -> JpegInfo:
+    """
+    Read the header of a JPEG image, stopping at its first scan.
+
+    source is a path, a binary file object positioned at the start of the image,
+    or a bytes-like object holding it. Files are read chunk_size bytes at a time,
+    doubling for each further read, and skipped markers are seeked over.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb", buffering=0) as file:
+            return probe(file, pool=pool, chunk_size=chunk_size)
+    if _is_file(source):
+        header_source = _HeaderSource(file=source, chunk_size=chunk_size)
+    else:
+        header_source = _HeaderSource(data=_as_bytes_array(source))
+    pool = default_decoder_pool if pool is None else pool
+    decompressor = pool.acquire()
+    try:
+        return _read_info(decompressor, header_source)
+    finally:
+        pool.release(decompressor)
+        header_source.close()
+
+
+class Metadata(NamedTuple):
+    markers: Tuple[Tuple[str, memoryview], ...]  # (name, payload) of each marker saved, in stream order
+    icc_profile: Optional[bytes]  # reassembled from the APP2 markers, if they were saved
+
+    def find(self, name: str, prefix: bytes = b"") -> Optional[memoryview]:
+        """The payload of the first name marker that starts with prefix, without prefix."""
+        for marker_name, payload in self.markers:
+            if marker_name == name and payload[:len(prefix)] == prefix:
+                return payload[len(prefix):]
+        return None
+
+    @property
+    def exif(self) -> Optional[memoryview]:
+        """The TIFF structure of the Exif APP1 marker, if saved."""
+        return self.find("APP1", _EXIF_ID)
+
+    @property
+    def xmp(self) -> Optional[memoryview]:
+        """The XML packet of the XMP APP1 marker, if saved."""
+        return self.find("APP1", _XMP_ID)
+
+
+class _MarkerLocator(object):
+    """
+    A marker processor for an image that libjpeg reads in place from data: it
+    notes where the payload of each marker is, and skips it, so that nothing is
+    copied. markers holds (code, start, length) of each, in stream order.
+    """
+
+    def __init__(self, data: numpy.ndarray):
+        self.address = data.ctypes.data
+        self.view = memoryview(data).toreadonly()
+        self.markers: List[Tuple[int, int, int]] = []
+        self.processor = jpeg_marker_parser_method(self.process)
+
+    def process(self, c_info) -> bool:
+        cinfo = c_info.contents
+        src = cinfo.src.contents
+        if src.bytes_in_buffer < 2:
+            return False  # suspend, as libjpeg's own processors do
+        start = ctypes.cast(src.next_input_byte, ctypes.c_void_p).value - self.address
+        # The length includes its own two bytes; libjpeg passes over anything less as empty
+        length = max((self.view[start] << 8 | self.view[start + 1]) - 2, 0)
+        if src.bytes_in_buffer < 2 + length:
+            return False
+        self.markers.append((cinfo.unread_marker, start + 2, length))
+        src.next_input_byte = ctypes.cast(self.address + start + 2 + length, ctypes.POINTER(JOCTET))
+        src.bytes_in_buffer -= 2 + length
+        return True
+
+
+def _icc_profile(payloads: List[memoryview]) -> Optional[bytes]:
+    """
+    The ICC profile split over the APP2 payloads, checked as jpeg_read_icc_profile
+    checks it: None unless each of its numbered chunks is there once.
+    """
+    chunks = {}
+    count = None
+    for payload in payloads:
+        if payload.nbytes < len(_ICC_ID) + 2 or payload[:len(_ICC_ID)] != _ICC_ID:
+            continue
+        number, markers = payload[len(_ICC_ID)], payload[len(_ICC_ID) + 1]
+        if count is None:
+            count = markers
+        if markers != count or not 1 <= number <= count or number in chunks:
+            return None
+        chunks[number] = payload[len(_ICC_ID) + 2:]
+    if not count or len(chunks) != count:
+        return None
+    profile = b"".join(chunks[number] for number in range(1, count + 1))
+    return profile or None
+
+
+def _read_metadata(decompressor, source: _HeaderSource, codes: Tuple[int, ...],
+                   data: Optional[numpy.ndarray] = None) -> Metadata:
+    c_info = decompressor.c_info
+    cinfo = decompressor.cinfo
+    source.push_source.attach(decompressor)
+    locator = None if data is None else _MarkerLocator(data)
+    for code in codes:
+        if locator is None:
+            jpeg_save_markers(c_info, code, 0xFFFF)
+        else:
+            jpeg_set_marker_processor(c_info, code, locator.processor)
+    try:
+        while jpeg_read_header(c_info, True) == JPEG_SUSPENDED:
+            if not source.read_more():
+                raise ValueError("JPEG data ends before the start of the image")
+        markers = []
+        if locator is not None:
+            for code, start, length in locator.markers:
+                markers.append((_MARKER_NAMES[code], locator.view[start:start + length]))
+        marker = cinfo.marker_list
+        while marker:
+            # libjpeg's copy goes with the next image the decompressor reads
+            payload = memoryview(ctypes.string_at(marker.contents.data, marker.contents.data_length))
+            markers.append((_MARKER_NAMES[marker.contents.marker], payload))
+            marker = marker.contents.next
+        icc_profile = None
+        if _APP2 in codes:
+            icc_profile = _icc_profile([payload for name, payload in markers if name == "APP2"])
+        return Metadata(tuple(markers), icc_profile)
+    finally:
+        for code in codes:
+            jpeg_save_markers(c_info, code, 0)
+        cinfo.src = None
+        if locator is not None:
+            locator.processor = None  # which refers back to locator, and so to data
+
+
+def read_metadata(
+        source,
+        markers: Iterable[str] = ("APP1", "APP2", "COM"),
+        pool: Optional[DecoderPool] = None,
+        chunk_size: int = 4096,
+) -> Metadata:
+    """
+    Read the APPn and COM markers of a JPEG image named in markers, stopping at its first scan.
+
+    source, pool and chunk_size are as for probe(); markers are MARKER_CODES
+    names. The payloads of an image in memory, including an mmap, are
+    read-only views of source itself, which they keep alive: an mmap cannot be
+    closed while they exist. Those of a file are read-only views of copies. Either way, the decompression object
+    goes back to pool at once. The ICC profile is reassembled from its APP2
+    markers, when APP2 is among markers.
+    """
+    codes = []
+    for name in markers:
+        if name not in MARKER_CODES:
+            raise ValueError(f"Unknown marker {name!r}; expected APP0 to APP15 or COM")
+        codes.append(MARKER_CODES[name])
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb", buffering=0) as file:
+            return read_metadata(file, markers=markers, pool=pool, chunk_size=chunk_size)
+    data = None
+    if _is_file(source):
+        header_source = _HeaderSource(file=source, chunk_size=chunk_size)
+    else:
+        data = _as_bytes_array(source)
+        header_source = _HeaderSource(data=data)
+    pool = default_decoder_pool if pool is None else pool
+    decompressor = pool.acquire()
+    try:
+        return _read_metadata(decompressor, header_source, tuple(codes), data)
+    finally:
+        pool.release(decompressor)
+        header_source.close()
+
+
+__all__ = [
+    "JpegInfo",
+    "MARKER_CODES",
+    "Metadata",
+    "probe",
+    "read_metadata",
+]
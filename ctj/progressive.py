@@ -0,0 +1,150 @@
+"""
+Previews of progressive JPEG images, refined scan by scan.
+
+decode_progressive() runs libjpeg in buffered-image mode: the coefficients of
+every scan are collected in the library's buffer, and an output pass over that
+buffer produces the whole image as it stands after the latest scan.
+"""
+
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+import numpy
+
+from .decompress import _open_input, _raise_source_error, _scale_to_fit
+from .jpeglib import (
+    JPEG_HEADER_OK,
+    JPEG_REACHED_EOI,
+    JPEG_REACHED_SOS,
+    JPEG_SUSPENDED,
+    jpeg_consume_input,
+    jpeg_finish_decompress,
+    jpeg_finish_output,
+    jpeg_has_multiple_scans,
+    jpeg_input_complete,
+    jpeg_read_header,
+    jpeg_start_decompress,
+    jpeg_start_output,
+)
+from .errors import LimitExceededError
+from .limits import DecodeLimits
+from .pixel_formats import PixelFormat, color_space
+from .pool import DecoderPool, default_decoder_pool
+from .py_jpeg_source import PyJpegSource
+from .scanlines import RowPointers
+
+
+class Preview(NamedTuple):
+    image: numpy.ndarray  # the whole image, as far as the first scans describe it
+    scans: int  # number of scans it is built from
+    final: bool  # True for the last preview, which is the fully decoded image
+
+
+def _consume_scan(decompressor, source: Optional[PyJpegSource]) -> int:
+    """
+    Read input past the current scan, up to the start of the next one or the end of
+    the image, so that the last scan is recognized as such. Returns the number of
+    scans completed.
+    """
+    cinfo = decompressor.cinfo
+    while True:
+        status = jpeg_consume_input(decompressor.c_info)
+        if status == JPEG_REACHED_SOS:
+            return cinfo.input_scan_number - 1
+        if status == JPEG_REACHED_EOI:
+            return cinfo.input_scan_number
+        if status == JPEG_SUSPENDED:
+            _raise_source_error(source)
+            raise ValueError("JPEG data source suspended")
+
+
+def decode_progressive(
+        buf,
+        every: int = 1,
+        pixel_format: Optional[PixelFormat] = None,
+        pool: Optional[DecoderPool] = None,
+        max_size: Optional[Tuple[int, int]] = None,
+        max_scans: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+        max_memory: Optional[int] = None,
+        warnings_as_errors: bool = False,
+) -> Iterator[Preview]:
+    """
+    Decode a JPEG image a scan at a time, yielding a Preview after every
+    completed scan, or after every `every` scans, and always after the last.
+
+    buf, pixel_format, pool, max_size, the limits and warnings_as_errors are as
+    for decode(); a small max_size makes cheap previews, and the scan after the
+    last one max_scans allows raises LimitExceededError instead of being read.
+    Each Preview has an image of its own. Stop iterating, or close() the
+    iterator, to abandon the rest of the image without decoding it. Images with
+    only one scan give a single, final, Preview.
+    """
+    if every < 1:
+        raise ValueError(f"every must be at least 1, not {every}")
+    limits = DecodeLimits(max_scans=max_scans, max_pixels=max_pixels, max_memory=max_memory)
+    data, source = _open_input(buf)
+    pool = default_decoder_pool if pool is None else pool
+    decompressor = pool.acquire()
+    decompressor.errors.warnings_as_errors = warnings_as_errors
+    try:
+        c_info = decompressor.c_info
+        cinfo = decompressor.cinfo
+        if source is not None:
+            source.attach(decompressor)
+        elif data is None:
+            decompressor.file_source(buf)
+        else:
+            decompressor.memory_source(data.ctypes.data, data.size)
+        if jpeg_read_header(c_info, True) != JPEG_HEADER_OK:
+            _raise_source_error(source)
+            raise ValueError("No image in JPEG buffer")
+        if cinfo.data_precision != 8:
+            raise ValueError(f"Unsupported JPEG sample precision {cinfo.data_precision}")
+        if pixel_format is not None:
+            cinfo.out_color_space = color_space(pixel_format)
+        if max_size is not None:
+            _scale_to_fit(decompressor, max_size)
+        cinfo.buffered_image = jpeg_has_multiple_scans(c_info)
+        if limits:
+            limits.check_header(decompressor, buffered=bool(cinfo.buffered_image))
+        if not jpeg_start_decompress(c_info):
+            _raise_source_error(source)
+            raise ValueError("JPEG data source suspended")
+        shape = (cinfo.output_height, cinfo.output_width, cinfo.output_components)
+        if limits:
+            limits.check(shape[0] * shape[1] * shape[2])  # scans are counted here instead
+        if not cinfo.buffered_image:
+            image = numpy.empty(shape, dtype=numpy.uint8)
+            if RowPointers(image, shape[0]).read_scanlines(cinfo) < shape[0]:
+                _raise_source_error(source)
+                raise ValueError("JPEG data source suspended")
+            jpeg_finish_decompress(c_info)
+            yield Preview(image, 1, True)
+            return
+        while True:
+            scans = _consume_scan(decompressor, source)
+            final = bool(jpeg_input_complete(c_info))
+            if max_scans is not None and not final and scans >= max_scans:
+                raise LimitExceededError("max_scans", scans + 1, max_scans)
+            if not final and scans % every:
+                continue
+            image = numpy.empty(shape, dtype=numpy.uint8)
+            # The output pass shows the coefficients as they stand after this scan
+            jpeg_start_output(c_info, scans)
+            RowPointers(image, shape[0]).read_scanlines(cinfo)
+            jpeg_finish_output(c_info)
+            if final:
+                jpeg_finish_decompress(c_info)
+            yield Preview(image, scans, final)
+            if final:
+                return
+    finally:
+        if source is not None:
+            cinfo.src = None  # the decompressor must not keep source alive
+        pool.release(decompressor)
+
+
+__all__ = [
+    "Preview",
+    "decode_progressive",
+]
@@ -1,41 +1,108 @@
+"""
+libjpeg data sources implemented in Python: one that reads any binary file
+object, and a suspending one that is pushed data as it arrives.
+
+Every refill of the buffer is a call from libjpeg back into Python, so these are
+for streams that have no file descriptor, such as network responses; decode()
+reads bytes-like objects and file descriptors without any callbacks.
+"""
+
 import ctypes
+import os
+from typing import Optional
+
+import numpy
 
-from .jpeglib import JOCTET
+from .jpeglib import (
+    JOCTET,
+    j_decompress_ptr,
+    jpeg_resync_to_restart,
+    jpeg_source_mgr,
+)
+from .error_manager import fail_call, library_error, warn_call
+
+# Message codes from the J_MESSAGE_CODE enum of jerror.h
+JERR_INPUT_EMPTY = 42
+JWRN_JPEG_EOF = 120
+
+_PROTOTYPES = dict(jpeg_source_mgr._fields_)
 
 
 class PyJpegSource(object):
-    def __init__(self, file):
+    """
+    A jpeg_source_mgr that fills its buffer from file, starting at its current position.
+
+    Each refill reads up to buffer_size bytes, using file.readinto() where there
+    is one so that the file writes straight into the buffer. With adaptive=True
+    the buffer doubles whenever a refill fills it completely, up to
+    max_buffer_size, so that large images and slow, chunky streams settle on few
+    large reads. refills, bytes_read and bytes_skipped count the work done.
+
+    Markers that libjpeg skips are seeked over on seekable files, rather than
+    read, so large embedded thumbnails or XMP data cost no I/O.
+
+    An exception raised by the file cannot propagate through the library: it is
+    kept in error, and the interrupted libjpeg call raises it on return, through
+    the decompressor's ErrorManager.
+    """
+
+    def __init__(self, file, buffer_size: int = 4096, adaptive: bool = False, max_buffer_size: int = 1 << 20):
+        if buffer_size < 2:
+            raise ValueError("buffer_size must be at least 2, to hold a fake EOI marker")
         self.file = file
-        self.c_info = jpeg_decompress_struct()
-        jpeg_create_decompress(byref(self.c_info), JPEG_LIB_VERSION, sizeof(jpeg_decompress_struct))
-        self.err = MyErrorManager(self.c_info)
-        self.c_info.err = ctypes.pointer(self.err.pub)
+        self.adaptive = adaptive
+        self.max_buffer_size = max(max_buffer_size, buffer_size)
+        self.refills = 0
+        self.bytes_read = 0
+        self.bytes_skipped = 0
+        self.error = None
+        self.start_of_file = True
+        self._full = False
+        self._filled = 0  # bytes put in the buffer by the last fill
+        self._pending_skip = 0
+        self._readinto = getattr(file, "readinto", None)
+        try:
+            self._seekable = file.seekable()
+        except (AttributeError, OSError, ValueError):
+            self._seekable = False
+        self._allocate(buffer_size)
         self.pub = jpeg_source_mgr()
-        self.c_info.src = ctypes.pointer(self.pub)
-        self.buf_size = 4096
-        self.buffer = (JOCTET * self.buf_size)()
-        #
-        self.pub.init_source = pfn_init_source(self.init_source)
-        self.pub.fill_input_buffer = pfn_fill_input_buffer(self.fill_input_buffer)
-        self.pub.skip_input_data = pfn_skip_input_data(self.skip_input_data)
-        self.pub.resync_to_restart = pfn_resync_to_restart(jpeg_resync_to_restart)  # Use default implementation
-        self.pub.term_source = pfn_term_source(self.term_source)
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.c_info is not None:
-            jpeg_destroy_decompress(self.c_info)
-            self.c_info = None
+        self.pub.init_source = _PROTOTYPES["init_source"](self.init_source)
+        self.pub.fill_input_buffer = _PROTOTYPES["fill_input_buffer"](self.fill_input_buffer)
+        self.pub.skip_input_data = _PROTOTYPES["skip_input_data"](self.skip_input_data)
+        # Use the default implementation, called directly rather than through Python
+        self.pub.resync_to_restart = ctypes.cast(jpeg_resync_to_restart.resolve(), _PROTOTYPES["resync_to_restart"])
+        self.pub.term_source = _PROTOTYPES["term_source"](self.term_source)
+
+    def _allocate(self, buffer_size: int) -> None:
+        self.buf_size = buffer_size
+        self.buffer = (JOCTET * buffer_size)()
+        self._view = memoryview(self.buffer).cast("B")
+        self._buffer_start = ctypes.cast(self.buffer, ctypes.POINTER(JOCTET))
+        self._buffer_address = ctypes.addressof(self.buffer)
+
+    def attach(self, decompressor) -> None:
+        """Make this the data source of a Decompressor."""
+        decompressor.cinfo.src = ctypes.pointer(self.pub)
+
+    def _read(self, size: int) -> Optional[int]:
+        """Read up to size bytes of the file into the buffer, and return how many were read."""
+        if self._readinto is not None:
+            # None if a non-blocking stream has nothing yet
+            return self._readinto(self._view if size == self.buf_size else self._view[:size])
+        data = self.file.read(size)
+        if data is None:
+            return None
+        ctypes.memmove(self.buffer, data, len(data))
+        return len(data)
 
     def init_source(self, c_info: j_decompress_ptr) -> None:
         """
         Initialize source --- called by jpeg_read_header
         before any data is actually read.
         """
-        # https://stackoverflow.com/questions/6327784/how-to-use-libjpeg-to-read-a-jpeg-from-a-stdistream
-        self.file.seek(0)
+        self.error = None
+        self.start_of_file = True
 
     def fill_input_buffer(self, c_info: j_decompress_ptr) -> bool:
         """
@@ -71,26 +138,38 @@ class PyJpegSource(object):
         the front of the buffer rather than discarding it.
         """
         src = self.pub
-        err = self.err.pub
-        bytes_src = self.file.read(self.buf_size)
-        n_bytes = len(bytes_src)
-        buf_src = ctypes.c_char_p(bytes_src)  # clever cast to avoid unwriteable error
-        ctypes.memmove(self.buffer, buf_src, n_bytes)
+        if self.error is not None:
+            return False
+        if self.adaptive and self._full and self.buf_size < self.max_buffer_size:
+            # The last read filled the buffer, and libjpeg has used all of it already
+            # (bytes_in_buffer may not say so: the entropy decoder keeps its own copy)
+            self._allocate(min(2 * self.buf_size, self.max_buffer_size))
+        try:
+            if self._pending_skip and not self._skip_pending():
+                return False  # suspend until the stream has more
+            n_bytes = self._read(self.buf_size)
+        except Exception as exc:
+            self.error = exc
+            fail_call(c_info, exc)
+            return False
+        if n_bytes is None:
+            return False  # suspend until the stream has more
+        self.refills += 1
+        self.bytes_read += n_bytes
+        self._full = n_bytes == self.buf_size
         if n_bytes <= 0:
-            if src.start_of_file:  # Treat empty input file as fatal error
-                err.msg_code = JERR_INPUT_EMPTY
-                err.error_exit(c_info)
+            if self.start_of_file:  # Treat empty input file as fatal error
+                fail_call(c_info, library_error(JERR_INPUT_EMPTY))
                 return False
-            err.msg_code = JWRN_JPEG_EOF
-            err.emit_message(c_info, -1)
+            if not warn_call(c_info, JWRN_JPEG_EOF):
+                return False  # warnings are errors
             # Insert a fake EOI marker
             self.buffer[0] = 0xff
             self.buffer[1] = 0xd9  # JPEG_EOI
             n_bytes = 2
-        offset = 0
-        src.next_input_byte = (JOCTET * (self.buf_size - offset)).from_buffer(self.buffer, offset)
-        src.bytes_in_buffer = n_bytes
-        src.start_of_file = False
+        src.next_input_byte = self._buffer_start
+        src.bytes_in_buffer = self._filled = n_bytes
+        self.start_of_file = False
         return True
 
     def skip_input_data(self, c_info: j_decompress_ptr, num_bytes: int) -> None:
@@ -108,20 +187,48 @@ class PyJpegSource(object):
         if num_bytes <= 0:
             return
         src = self.pub
-        while num_bytes > src.bytes_in_buffer:
-            num_bytes -= src.bytes_in_buffer
-            assert self.fill_input_buffer(c_info)
-            # note we assume that fill_input_buffer will never return FALSE,
-            # so suspension need not be handled.
-        # TODO: this is only correct if the prior offset is zero...
-        # We want to emulate "src->next_input_byte += (size_t)num_bytes;" here. It's a lot of lines below...
-        # First compute pointer addresses as integers
-        next_addr = ctypes.cast(src.next_input_byte, ctypes.c_void_p).value
-        buff_addr = ctypes.cast(self.buffer, ctypes.c_void_p).value
-        old_offset_bytes = next_addr - buff_addr  # how deep into the buffer is next_input_byte?
-        new_offset_bytes = old_offset_bytes + num_bytes
-        src.next_input_byte = (JOCTET * (self.buf_size - new_offset_bytes)).from_buffer(self.buffer, new_offset_bytes)
-        src.bytes_in_buffer -= num_bytes
+        available = src.bytes_in_buffer
+        if num_bytes <= available:
+            # next_input_byte is always the unread tail of the last fill, so its offset is known
+            offset = self._filled - available + num_bytes
+            src.next_input_byte = ctypes.cast(self._buffer_address + offset, ctypes.POINTER(JOCTET))
+            src.bytes_in_buffer = available - num_bytes
+            return
+        # Mark the buffer empty, and get past the rest before the next fill
+        src.bytes_in_buffer = 0
+        self._pending_skip = num_bytes - available
+        try:
+            self._skip_pending()
+        except Exception as exc:
+            self.error = exc
+            fail_call(c_info, exc)
+
+    def _skip_pending(self) -> bool:
+        """
+        Get past the bytes that skip_input_data could not skip within the buffer: seek over
+        them if the file can, or else read and discard them. False if that must wait for a
+        non-blocking stream to have more data.
+        """
+        remaining = self._pending_skip
+        if remaining and self._seekable:
+            try:
+                self.file.seek(remaining, os.SEEK_CUR)
+            except OSError:
+                self._seekable = False  # e.g. a pipe whose file object claims otherwise
+            else:
+                self.bytes_skipped += remaining
+                remaining = 0
+        while remaining:
+            count = self._read(min(remaining, self.buf_size))
+            if count is None:
+                break
+            if count == 0:
+                remaining = 0  # the end of the file: the next fill inserts EOI
+                break
+            self.bytes_skipped += count
+            remaining -= count
+        self._pending_skip = remaining
+        return remaining == 0
 
     def term_source(self, c_info: j_decompress_ptr) -> None:
         """
@@ -133,3 +240,125 @@ class PyJpegSource(object):
         for error exit.
         """
         pass  # no work necessary here
+
+
+class PushJpegSource(object):
+    """
+    A suspending jpeg_source_mgr that is given data with push(), rather than reading it.
+
+    When libjpeg runs out of data its call returns early (JPEG_SUSPENDED, or fewer
+    scanlines than asked for) and can be repeated after the next push(). The bytes
+    it had not consumed are kept, ahead of the new data, as the suspension
+    protocol requires. Read-only data, such as bytes, is used in place when there
+    is nothing left over to join it to; other data is copied.
+
+    Data that libjpeg skips beyond the end of what has been pushed is counted in
+    skip_pending, and dropped from the front of later pushes. A reader may
+    instead seek past it and call skip(). After end(), libjpeg gets a fake EOI
+    marker when it needs more, as it does at the end of a file.
+    """
+
+    def __init__(self):
+        self.bytes_pushed = 0
+        self.skip_pending = 0
+        self.at_end = False
+        self.truncated = False  # a fake EOI marker had to be inserted
+        self._data = None  # keeps the bytes libjpeg is reading alive
+        self._filled = 0
+        self._address = 0
+        self.pub = jpeg_source_mgr()
+        self.pub.init_source = _PROTOTYPES["init_source"](self.init_source)
+        self.pub.fill_input_buffer = _PROTOTYPES["fill_input_buffer"](self.fill_input_buffer)
+        self.pub.skip_input_data = _PROTOTYPES["skip_input_data"](self.skip_input_data)
+        self.pub.resync_to_restart = ctypes.cast(jpeg_resync_to_restart.resolve(), _PROTOTYPES["resync_to_restart"])
+        self.pub.term_source = _PROTOTYPES["term_source"](self.term_source)
+
+    def attach(self, decompressor) -> None:
+        """Make this the data source of a Decompressor."""
+        decompressor.cinfo.src = ctypes.pointer(self.pub)
+
+    def close(self) -> None:
+        """Let go of the data; the callbacks refer back to self, so this would otherwise wait for gc."""
+        self._data = None
+        self.pub.bytes_in_buffer = 0
+
+    @property
+    def bytes_in_buffer(self) -> int:
+        """Bytes pushed that libjpeg has not consumed yet."""
+        return self.pub.bytes_in_buffer
+
+    def _point_at(self, data, address: int, size: int) -> None:
+        self._data = data
+        self._address = address
+        self._filled = size
+        self.pub.next_input_byte = ctypes.cast(address, ctypes.POINTER(JOCTET))
+        self.pub.bytes_in_buffer = size
+
+    def push(self, data, in_place: Optional[bool] = None) -> None:
+        """
+        Append data to what libjpeg has yet to read. in_place=True uses writable data
+        in place too, if possible; it must then not change until libjpeg has read it.
+        """
+        view = memoryview(data).cast("B")
+        if self.skip_pending:
+            skipped = min(self.skip_pending, view.nbytes)
+            self.skip(skipped)
+            view = view[skipped:]
+        if not view.nbytes:
+            return
+        self.bytes_pushed += view.nbytes
+        unread = self.pub.bytes_in_buffer
+        if not unread and (view.readonly if in_place is None else in_place):
+            array = numpy.frombuffer(view, dtype=numpy.uint8)
+            self._point_at(array, array.ctypes.data, array.size)
+            return
+        joined = (JOCTET * (unread + view.nbytes))()
+        if unread:
+            ctypes.memmove(joined, self.pub.next_input_byte, unread)
+        memoryview(joined).cast("B")[unread:] = view
+        self._point_at(joined, ctypes.addressof(joined), len(joined))
+
+    def skip(self, count: int) -> None:
+        """Account for count bytes of skip_pending that the reader got past without pushing them."""
+        self.skip_pending -= count
+
+    def end(self) -> None:
+        """No more data will be pushed."""
+        self.at_end = True
+
+    def init_source(self, c_info: j_decompress_ptr) -> None:
+        pass
+
+    def fill_input_buffer(self, c_info: j_decompress_ptr) -> bool:
+        if not self.at_end:
+            return False  # suspend until push()
+        if not warn_call(c_info, JWRN_JPEG_EOF):
+            return False  # warnings are errors
+        self.truncated = True
+        self._point_at(_FAKE_EOI, ctypes.addressof(_FAKE_EOI), len(_FAKE_EOI))
+        return True
+
+    def skip_input_data(self, c_info: j_decompress_ptr, num_bytes: int) -> None:
+        if num_bytes <= 0:
+            return
+        available = self.pub.bytes_in_buffer
+        if num_bytes <= available:
+            offset = self._filled - available + num_bytes
+            self.pub.next_input_byte = ctypes.cast(self._address + offset, ctypes.POINTER(JOCTET))
+            self.pub.bytes_in_buffer = available - num_bytes
+        else:
+            # libjpeg will suspend at its next read; the rest is dropped from later data
+            self.skip_pending += num_bytes - available
+            self.pub.bytes_in_buffer = 0
+
+    def term_source(self, c_info: j_decompress_ptr) -> None:
+        pass
+
+
+_FAKE_EOI = (JOCTET * 2)(0xFF, 0xD9)
+
+
+__all__ = [
+    "PushJpegSource",
+    "PyJpegSource",
+]
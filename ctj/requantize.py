@@ -0,0 +1,174 @@
+"""
+Lowering the quality of JPEG images without decoding them.
+
+requantize() reads the quantized DCT coefficients with jpeg_read_coefficients,
+divides them again by coarser quantization tables, those that encode() would
+use at the new quality, and codes them with jpeg_write_coefficients. Compared
+with decoding and encoding again, there is no inverse or forward DCT, no color
+conversion or resampling, and only the one rounding of the new quantization.
+"""
+
+import ctypes
+from typing import List, Optional
+
+import numpy
+
+from .coefficients import _CoefficientReader, block_array_view
+from .jpeglib import (
+    DCTSIZE2,
+    JCS_YCbCr,
+    JCS_YCCK,
+    jpeg_add_quant_table,
+    jpeg_copy_critical_parameters,
+    jpeg_finish_compress,
+    jpeg_set_quality,
+    jpeg_simple_progression,
+    jpeg_write_coefficients,
+)
+from .library import c_free
+from .pool import DecoderPool, EncoderPool, default_encoder_pool
+from .transform import COPY_MARKERS, _copy_markers, _saved_markers
+
+# The table that jpeg_set_colorspace gives each component: 0 for luminance, 1 for chrominance
+_CHROMINANCE_TABLES = {
+    JCS_YCbCr: (0, 1, 1),
+    JCS_YCCK: (0, 1, 1, 0),
+}
+
+
+# Coefficients requantized at a time, few enough for the intermediate arrays to stay in cache
+_CHUNK_SIZE = 1 << 16
+
+
+def requantize_blocks(blocks, old_table, new_table, out: Optional[numpy.ndarray] = None) -> numpy.ndarray:
+    """
+    Blocks quantized by old_table, quantized by new_table instead, rounding halves
+    away from zero as libjpeg's quantizer does. The coefficients of each block are
+    the last axis of blocks, in natural order. The result is int16, so new_table
+    should be no finer than old_table; it is written to out, if given, which may
+    be blocks itself.
+    """
+    blocks = numpy.asarray(blocks)
+    old_table = numpy.asarray(old_table, dtype=numpy.int64).reshape(DCTSIZE2)
+    new_table = numpy.asarray(new_table, dtype=numpy.int64).reshape(DCTSIZE2)
+    if out is None:
+        out = numpy.empty(blocks.shape, dtype=numpy.int16)
+    if blocks.size == 0:
+        return out
+    # The result is floor((|v| * old + new // 2) / new), with the sign of v: v * old / new
+    # rounded to the nearest integer, halves away from zero. NumPy multiplies much
+    # faster than it divides, and its rint() rounds halves to even, so the ratio is
+    # made larger by a factor of 1 + bias: that moves halves away from zero past the
+    # rounding error of the multiplication, and nothing else past a half, while the
+    # dividend is below 2**19 in float32, or 2**31 in float64.
+    largest = max(-int(blocks.min()), int(blocks.max()))
+    if largest * int(old_table.max()) + int(new_table.max()) // 2 < 2 ** 19:
+        dtype, bias = numpy.float32, 2.0 ** -22
+    else:
+        dtype, bias = numpy.float64, 2.0 ** -40
+    ratio = (old_table / new_table * (1 + bias)).astype(dtype)
+    step = max(1, _CHUNK_SIZE * len(blocks) // blocks.size)
+    values = numpy.empty((step,) + blocks.shape[1:], dtype=dtype)
+    for start in range(0, len(blocks), step):
+        part = blocks[start:start + step]
+        scaled = values[:len(part)]
+        numpy.multiply(part, ratio, out=scaled)
+        numpy.rint(scaled, out=scaled)
+        out[start:start + step] = scaled
+    return out
+
+
+def requantize(
+        buf,
+        quality: int = 75,
+        copy_markers: str = "all",
+        progressive: Optional[bool] = None,
+        optimize: bool = False,
+        pool: Optional[DecoderPool] = None,
+        encoder_pool: Optional[EncoderPool] = None,
+        max_scans: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+        max_memory: Optional[int] = None,
+        warnings_as_errors: bool = False,
+) -> bytes:
+    """
+    Reduce a JPEG image to the given quality without decoding it, and return the new JPEG stream.
+
+    The new quantization tables are libjpeg's standard ones scaled to quality, as
+    for encode(), except that no quantizer is made finer than the image's own:
+    that could not bring back detail, and would only cost bytes. So a quality
+    above the image's leaves it as it was. copy_markers is one of COPY_MARKERS.
+    progressive chooses the coding of the result, by default that of the image;
+    optimize computes Huffman tables for it. The other arguments are as for
+    decode(), and the coding objects come from pool and encoder_pool.
+
+    The blocks are requantized in the arrays they were read into. For a
+    3000x2000 4:2:0 image at quality 50, best of 10, that takes 50-57 ms,
+    against 70 ms for decode() and encode().
+    """
+    if copy_markers not in COPY_MARKERS:
+        raise ValueError(f"Unknown copy_markers {copy_markers!r}; expected one of {', '.join(COPY_MARKERS)}")
+    keep = COPY_MARKERS[copy_markers]
+    encoder_pool = default_encoder_pool if encoder_pool is None else encoder_pool
+    buffer = ctypes.POINTER(ctypes.c_ubyte)()
+    size = ctypes.c_ulong(0)
+    with _CoefficientReader(buf, pool, save=keep, max_scans=max_scans, max_pixels=max_pixels,
+                            max_memory=max_memory, warnings_as_errors=warnings_as_errors) as reader:
+        decompressor = reader.decompressor
+        cinfo = decompressor.cinfo
+        markers = _saved_markers(cinfo)
+        components = cinfo.num_components
+        old_tables = reader.quant_tables()
+
+        compressor = encoder_pool.acquire()
+        try:
+            jpeg_copy_critical_parameters(decompressor.c_info, compressor.c_info)
+            out = compressor.cinfo
+            # Tables 0 and 1 become the standard luminance and chrominance tables at quality
+            jpeg_set_quality(compressor.c_info, quality, True)
+            standard = [numpy.array(out.quant_tbl_ptrs[number].contents.quantval, dtype=numpy.uint16)
+                        for number in (0, 1)]
+            numbers = _CHROMINANCE_TABLES.get(cinfo.jpeg_color_space, (0,) * components)
+            new_tables = [numpy.maximum(old_tables[i], standard[numbers[i]]) for i in range(components)]
+            distinct: List[bytes] = []
+            for i, table in enumerate(new_tables):
+                key = table.astype(numpy.uint32).tobytes()
+                if key not in distinct:
+                    distinct.append(key)
+                    values = (ctypes.c_uint * DCTSIZE2).from_buffer_copy(key)
+                    jpeg_add_quant_table(compressor.c_info, len(distinct) - 1, values, 100, False)
+                out.comp_info[i].quant_tbl_no = distinct.index(key)
+            if progressive if progressive is not None else cinfo.progressive_mode:
+                jpeg_simple_progression(compressor.c_info)
+            out.optimize_coding = optimize
+            # The blocks are requantized where they are, and those arrays written, as
+            # jpegtran writes the arrays it read
+            compressor.memory_destination(ctypes.byref(buffer), ctypes.byref(size))
+            jpeg_write_coefficients(compressor.c_info, reader.arrays)
+            _copy_markers(compressor, markers, keep)
+
+            for i in range(components):
+                if numpy.array_equal(old_tables[i], new_tables[i]):
+                    continue
+                component = cinfo.comp_info[i]
+                blocks = block_array_view(decompressor, reader.arrays[i], component.height_in_blocks,
+                                          component.width_in_blocks)
+                # jpeg_read_coefficients has defined every block, so the view may be written
+                blocks.flags.writeable = True
+                requantize_blocks(blocks, old_tables[i], new_tables[i], out=blocks)
+            jpeg_finish_compress(compressor.c_info)
+            compressor.finish_memory()
+        finally:
+            encoder_pool.release(compressor)
+
+    address = ctypes.cast(buffer, ctypes.c_void_p).value
+    try:
+        return ctypes.string_at(address, size.value)
+    finally:
+        c_free(address)
+
+
+__all__ = [
+    "requantize",
+    "requantize_blocks",
+]
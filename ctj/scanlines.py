@@ -0,0 +1,136 @@
+"""
+Row pointer tables for moving whole images through jpeg_read_scanlines and
+jpeg_write_scanlines without any per-row work in Python.
+"""
+
+import array
+import ctypes
+from typing import Optional, Tuple
+
+from .error_manager import guarded
+from .jpeglib import (
+    JDIMENSION,
+    JSAMPARRAY,
+    JSAMPROW,
+    jpeg_compress_struct,
+    jpeg_decompress_struct,
+    jpeg_read_scanlines,
+    jpeg_write_scanlines,
+)
+
+# array.array type code with the size of a pointer
+_POINTER_TYPECODE = "Q" if ctypes.sizeof(ctypes.c_void_p) == 8 else "L"
+_POINTER_SIZE = ctypes.sizeof(JSAMPROW)
+
+# Bindings that take plain addresses, so the loops below hold the GIL only
+# long enough to make each call, and build no ctypes objects
+_read_scanlines = jpeg_read_scanlines.with_argtypes(ctypes.c_void_p, ctypes.c_void_p, JDIMENSION)
+_write_scanlines = jpeg_write_scanlines.with_argtypes(ctypes.c_void_p, ctypes.c_void_p, JDIMENSION)
+_read_scanlines.wrapper = _write_scanlines.wrapper = guarded
+
+
+def buffer_address(buffer, writable: bool = True) -> Tuple[int, int]:
+    """
+    Address of the first byte of a bytes-like object or NumPy array, and the
+    number of bytes spanned from there. Nothing is copied.
+    """
+    interface = getattr(buffer, "__array_interface__", None)
+    if interface is not None:
+        address, readonly = interface["data"]
+        if writable and readonly:
+            raise ValueError("Buffer is read-only")
+        strides = buffer.strides
+        if any(stride < 0 for stride in strides):
+            raise ValueError("Buffer must not have negative strides")
+        if buffer.size == 0:
+            return address, 0
+        span = buffer.itemsize + sum((n - 1) * stride for n, stride in zip(buffer.shape, strides))
+        return address, span
+    view = memoryview(buffer)
+    if not view.c_contiguous:
+        raise ValueError("Buffer must be contiguous")
+    if view.nbytes == 0:
+        return 0, 0
+    if writable and view.readonly:
+        raise ValueError("Buffer is read-only")
+    if not view.readonly:
+        return ctypes.addressof(ctypes.c_char.from_buffer(view)), view.nbytes
+    # ctypes will not map other read-only buffers, but c_char_p exposes the address of bytes objects
+    if isinstance(buffer, bytes):
+        return ctypes.cast(ctypes.c_char_p(buffer), ctypes.c_void_p).value, view.nbytes
+    raise ValueError("Read-only buffers must be bytes or NumPy arrays")
+
+
+class RowPointers(object):
+    """
+    A JSAMPROW table pointing at each row of a buffer, built once.
+
+    Rows are row_stride bytes apart and row_size bytes long; both default to
+    an even split of the buffer into height rows. The buffer is kept alive for
+    as long as the table is.
+    """
+
+    def __init__(self, buffer, height: int, row_stride: Optional[int] = None, row_size: Optional[int] = None,
+                 writable: bool = True):
+        address, span = buffer_address(buffer, writable=writable)
+        if row_stride is None:
+            row_stride = span // height if height else 0
+        if row_size is None:
+            row_size = row_stride
+        if height > 0 and (height - 1) * row_stride + row_size > span:
+            raise ValueError(
+                f"Buffer of {span} bytes is too small for {height} rows of {row_size} bytes, {row_stride} apart")
+        self.buffer = buffer
+        self.height = height
+        self.row_stride = row_stride
+        self.row_size = row_size
+        # range() produces the addresses in C, so no Python code runs per row
+        rows = range(address, address + height * row_stride, row_stride) if height else ()
+        self._addresses = array.array(_POINTER_TYPECODE, rows)
+        self.table = (JSAMPROW * height).from_buffer(self._addresses) if height else None
+        self._table_address = self._addresses.buffer_info()[0]
+
+    def __len__(self):
+        return self.height
+
+    def at(self, row: int) -> JSAMPARRAY:
+        """The tail of the table starting at row, ready to pass to libjpeg."""
+        return ctypes.cast(self._table_address + row * _POINTER_SIZE, JSAMPARRAY)
+
+    def read_scanlines(self, cinfo: jpeg_decompress_struct, first_row: int = 0, stop_row: Optional[int] = None) -> int:
+        """
+        Read scanlines into rows first_row up to stop_row (default: the end of the table),
+        asking libjpeg for all remaining rows on every call. Returns the number of rows read,
+        which is less than requested only if the data source suspended.
+        """
+        stop_row = self.height if stop_row is None else stop_row
+        read_scanlines = _read_scanlines.bind()
+        c_info = ctypes.addressof(cinfo)
+        table = self._table_address
+        row = first_row
+        while row < stop_row:
+            count = read_scanlines(c_info, table + row * _POINTER_SIZE, stop_row - row)
+            if count == 0:
+                break
+            row += count
+        return row - first_row
+
+    def write_scanlines(self, cinfo: jpeg_compress_struct, first_row: int = 0, stop_row: Optional[int] = None) -> int:
+        """Write rows first_row up to stop_row (default: the end of the table); returns the number written."""
+        stop_row = self.height if stop_row is None else stop_row
+        write_scanlines = _write_scanlines.bind()
+        c_info = ctypes.addressof(cinfo)
+        table = self._table_address
+        row = first_row
+        while row < stop_row:
+            count = write_scanlines(c_info, table + row * _POINTER_SIZE, stop_row - row)
+            if count == 0:
+                break
+            row += count
+        return row - first_row
+
+
+__all__ = [
+    "RowPointers",
+    "buffer_address",
+]
@@ -0,0 +1,410 @@
+"""
+Lossless rotation, flipping and cropping of JPEG images.
+
+transform() reads the quantized DCT coefficients with jpeg_read_coefficients,
+rearranges whole blocks with NumPy, and codes them again with
+jpeg_write_coefficients, as jpegtran does: there is no inverse or forward DCT,
+no color conversion and no requantization, so nothing is lost however often
+an image is transformed. Mirroring a block only negates its odd frequencies
+along that axis, and transposing it transposes its coefficients.
+"""
+
+import ctypes
+import struct
+import warnings
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy
+
+from . import turbojpeg
+from .coefficients import _CoefficientReader, block_array_view, request_block_arrays
+from .decompress import _as_bytes_array
+from .errors import JpegError, JpegWarning
+from .jpeglib import (
+    DCTSIZE,
+    DCTSIZE2,
+    JOCTET,
+    JPEG_APP0,
+    JPEG_COM,
+    jpeg_copy_critical_parameters,
+    jpeg_finish_compress,
+    jpeg_simple_progression,
+    jpeg_write_coefficients,
+    jpeg_write_marker,
+)
+from .library import c_free, libturbojpeg_lib
+from .pool import DecoderPool, EncoderPool, default_encoder_pool
+
+
+class Operation(NamedTuple):
+    transpose: bool  # swap rows and columns first
+    hflip: bool  # then mirror left to right
+    vflip: bool  # and top to bottom
+
+
+TRANSFORMS: Dict[str, Operation] = {
+    "none": Operation(False, False, False),
+    "hflip": Operation(False, True, False),
+    "vflip": Operation(False, False, True),
+    "rot180": Operation(False, True, True),
+    "transpose": Operation(True, False, False),
+    "rot90": Operation(True, True, False),  # clockwise
+    "rot270": Operation(True, False, True),
+    "transverse": Operation(True, True, True),
+}
+
+# The tj3Transform operation for each of TRANSFORMS
+_TJXOPS = {
+    "none": turbojpeg.TJXOP_NONE,
+    "hflip": turbojpeg.TJXOP_HFLIP,
+    "vflip": turbojpeg.TJXOP_VFLIP,
+    "rot180": turbojpeg.TJXOP_ROT180,
+    "transpose": turbojpeg.TJXOP_TRANSPOSE,
+    "rot90": turbojpeg.TJXOP_ROT90,
+    "rot270": turbojpeg.TJXOP_ROT270,
+    "transverse": turbojpeg.TJXOP_TRANSVERSE,
+}
+
+# The transform that displays an image upright, for each value of the Exif Orientation tag
+EXIF_ORIENTATIONS = ("none", "none", "hflip", "rot180", "vflip", "transpose", "rot90", "transverse", "rot270")
+
+# The markers that each copy_markers option keeps
+COPY_MARKERS = {
+    "none": (),
+    "comments": (JPEG_COM,),
+    "icc": (JPEG_APP0 + 2,),
+    "all": (JPEG_COM,) + tuple(range(JPEG_APP0, JPEG_APP0 + 16)),
+}
+
+_EXIF_ID = b"Exif\0\0"
+_ICC_ID = b"ICC_PROFILE\0"
+_JFIF_ID = b"JFIF\0"
+_ADOBE_ID = b"Adobe"
+_ORIENTATION_TAG = 0x0112
+_SHORT = 3  # TIFF field type
+
+# Multiplying a block by these negates its odd horizontal, or vertical, frequencies
+_ODD_COLUMNS = numpy.tile(numpy.array([1, -1], dtype=numpy.int16), (DCTSIZE, DCTSIZE // 2))
+_ODD_ROWS = _ODD_COLUMNS.T.copy()
+
+# Bytes of blocks that _mirror_in_place sets aside at a time, to stay in the cache
+_MIRROR_CHUNK = 1 << 18
+
+
+def _exif_orientation(data: bytes) -> Tuple[int, Optional[int]]:
+    """
+    The Orientation of an Exif APP1 marker, or 1 if it has none, and the offset of
+    its value within data, if present.
+    """
+    if not data.startswith(_EXIF_ID):
+        return 1, None
+    tiff = len(_EXIF_ID)
+    order = {b"II": "<", b"MM": ">"}.get(data[tiff:tiff + 2])
+    try:
+        ifd = tiff + struct.unpack_from(order + "I", data, tiff + 4)[0]
+        count = struct.unpack_from(order + "H", data, ifd)[0]
+        for entry in range(ifd + 2, ifd + 2 + 12 * count, 12):
+            tag, field_type, values = struct.unpack_from(order + "HHI", data, entry)
+            if tag == _ORIENTATION_TAG and field_type == _SHORT and values == 1:
+                value = struct.unpack_from(order + "H", data, entry + 8)[0]
+                return (value, entry + 8) if 1 <= value <= 8 else (1, None)
+    except (TypeError, struct.error):  # unknown byte order, or offsets past the end
+        pass
+    return 1, None
+
+
+def _saved_markers(cinfo) -> List[Tuple[int, bytes]]:
+    markers = []
+    marker = cinfo.marker_list
+    while marker:
+        markers.append((marker.contents.marker, ctypes.string_at(marker.contents.data, marker.contents.data_length)))
+        marker = marker.contents.next
+    return markers
+
+
+def _copy_markers(compressor, markers: List[Tuple[int, bytes]], keep: Tuple[int, ...]) -> None:
+    """Write the markers whose codes are in keep, except those that libjpeg writes itself."""
+    cinfo = compressor.cinfo
+    for code, data in markers:
+        if code not in keep:
+            continue
+        if cinfo.write_JFIF_header and code == JPEG_APP0 and data.startswith(_JFIF_ID):
+            continue
+        if cinfo.write_Adobe_marker and code == JPEG_APP0 + 14 and data.startswith(_ADOBE_ID):
+            continue
+        if keep == COPY_MARKERS["icc"] and not data.startswith(_ICC_ID):
+            continue
+        buffer = (JOCTET * len(data)).from_buffer_copy(data)
+        jpeg_write_marker(compressor.c_info, code, buffer, len(data))
+
+
+def _axis_runs(start: int, count: int, mirrored: int) -> List[Tuple[slice, slice, bool]]:
+    """
+    Split count output blocks, from block start of the transformed axis, into
+    (output slice, source slice, mirrored) runs: the first mirrored blocks of
+    the axis come from the opposite end of that span, and the rest, partial
+    iMCUs that cannot be mirrored, from where they are.
+    """
+    runs = []
+    stop = start + count
+    if start < mirrored:
+        end = min(stop, mirrored)
+        source_stop = mirrored - 1 - end
+        runs.append((slice(0, end - start), slice(mirrored - 1 - start, source_stop if source_stop >= 0 else None, -1),
+                     True))
+    begin = max(start, mirrored)
+    if begin < stop:
+        runs.append((slice(begin - start, count), slice(begin, stop), False))
+    return runs
+
+
+def _blocks_of(view: numpy.ndarray) -> numpy.ndarray:
+    """A (rows, columns, DCTSIZE2) view of blocks as (rows, columns, DCTSIZE, DCTSIZE)."""
+    blocks = view.view()
+    blocks.shape = view.shape[:2] + (DCTSIZE, DCTSIZE)  # raises rather than copy
+    return blocks
+
+
+def _mirror_in_place(blocks: numpy.ndarray, count: int, signs: numpy.ndarray) -> None:
+    """
+    Reverse the order of the first count rows of blocks, and multiply them by signs,
+    in place. blocks is (rows, columns, DCTSIZE, DCTSIZE), or a transposed view.
+    """
+    half = count // 2
+    front = blocks[:half]
+    back = blocks[count - half:count][::-1]
+    step = max(1, _MIRROR_CHUNK // max(1, half * DCTSIZE2 * blocks.itemsize))
+    for start in range(0, blocks.shape[1], step):
+        part = slice(start, start + step)
+        saved = front[:, part] * signs
+        numpy.multiply(back[:, part], signs, out=front[:, part])
+        back[:, part] = saved
+    if count % 2:
+        blocks[half] *= signs
+
+
+def _turbo_transform(data: numpy.ndarray, op: str, copy_markers: str, progressive: Optional[bool], optimize: bool,
+                     warnings_as_errors: bool) -> bytes:
+    """transform() of a whole image in memory by libturbojpeg's tj3Transform."""
+    handle = turbojpeg.tj3Init(turbojpeg.TJINIT_TRANSFORM)
+    if not handle:
+        raise MemoryError("tj3Init failed")
+    source = ctypes.cast(data.ctypes.data, ctypes.POINTER(ctypes.c_ubyte))
+    buffer = ctypes.POINTER(ctypes.c_ubyte)()
+    size = ctypes.c_size_t(0)
+    try:
+        turbojpeg.tj3Set(handle, turbojpeg.TJPARAM_STOPONWARNING, warnings_as_errors)
+        # Reading the header first makes tj3Transform keep the coding of the image, which it otherwise drops
+        if turbojpeg.tj3DecompressHeader(handle, source, data.size) == 0:
+            if progressive is not None:
+                turbojpeg.tj3Set(handle, turbojpeg.TJPARAM_PROGRESSIVE, progressive)
+            turbojpeg.tj3Set(handle, turbojpeg.TJPARAM_ARITHMETIC, False)
+            turbojpeg.tj3Set(handle, turbojpeg.TJPARAM_OPTIMIZE, optimize)
+            operation = turbojpeg.tjtransform()
+            operation.op = _TJXOPS[op]
+            operation.options = turbojpeg.TJXOPT_COPYNONE if copy_markers == "none" else 0
+            status = turbojpeg.tj3Transform(handle, source, data.size, 1, ctypes.byref(buffer), ctypes.byref(size),
+                                            ctypes.byref(operation))
+        else:
+            status = -1
+        if status != 0:
+            message = turbojpeg.tj3GetErrorStr(handle).decode(errors="replace")
+            if turbojpeg.tj3GetErrorCode(handle) != turbojpeg.TJERR_WARNING or not buffer:
+                raise JpegError(message)
+            try:
+                warnings.warn(JpegWarning(message), stacklevel=3)
+            except Warning:  # the warnings filter made it an error
+                raise JpegError(message) from None
+        return ctypes.string_at(buffer, size.value)
+    finally:
+        turbojpeg.tj3Free(buffer)
+        turbojpeg.tj3Destroy(handle)
+
+
+def transform(
+        buf,
+        op: str = "none",
+        crop: Optional[Tuple[int, int, int, int]] = None,
+        copy_markers: str = "all",
+        trim: bool = False,
+        perfect: bool = False,
+        progressive: Optional[bool] = None,
+        optimize: bool = False,
+        pool: Optional[DecoderPool] = None,
+        encoder_pool: Optional[EncoderPool] = None,
+        max_scans: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+        max_memory: Optional[int] = None,
+        warnings_as_errors: bool = False,
+) -> bytes:
+    """
+    Rotate, flip or crop a JPEG image without decoding it, and return the new JPEG stream.
+
+    buf is read as by decode(). op is one of TRANSFORMS, or "exif" to turn the
+    image upright by its Exif Orientation tag, which is then reset to 1 in the
+    copied marker. crop=(x, y, width, height), in the transformed image, keeps
+    only that region; x and y must be multiples of the iMCU size, 8 or 16 pixels
+    depending on subsampling. copy_markers is one of COPY_MARKERS.
+
+    Mirroring needs whole iMCUs: any partial iMCU at the right or bottom edge is
+    kept as it was, as jpegtran does, unless trim is true to drop it, or perfect
+    is true to raise ValueError instead. progressive chooses the coding of the
+    result, by default that of the image; optimize computes Huffman tables for
+    it. The other arguments are as for decode(), and the coding objects come
+    from pool and encoder_pool.
+
+    If libturbojpeg can be loaded, an image in memory with all or none of its
+    markers, no crop, trim, perfect or limits is transformed by its tj3Transform
+    instead. Both take about as long as decoding the image, and twice that to
+    transpose it: for a 3000x2000 4:2:0 image, best of 10, tj3Transform takes
+    47 ms for "none", 48 ms for "hflip" and 85-94 ms for "rot90", the blocks
+    mirrored in place here 45-49 ms, 51-58 ms and 91-102 ms, and
+    encode(decode()) 74-94 ms.
+    """
+    if op != "exif" and op not in TRANSFORMS:
+        raise ValueError(f"Unknown transform {op!r}; expected one of {', '.join(TRANSFORMS)} or 'exif'")
+    if copy_markers not in COPY_MARKERS:
+        raise ValueError(f"Unknown copy_markers {copy_markers!r}; expected one of {', '.join(COPY_MARKERS)}")
+    keep = COPY_MARKERS[copy_markers]
+    if op != "exif" and copy_markers in ("all", "none") and crop is None and not trim and not perfect \
+            and max_scans is None and max_pixels is None and max_memory is None \
+            and not hasattr(buf, "read") and not isinstance(buf, int) and libturbojpeg_lib.available():
+        return _turbo_transform(_as_bytes_array(buf), op, copy_markers, progressive, optimize, warnings_as_errors)
+    encoder_pool = default_encoder_pool if encoder_pool is None else encoder_pool
+    saved = set(keep) | ({JPEG_APP0 + 1} if op == "exif" else set())
+    buffer = ctypes.POINTER(ctypes.c_ubyte)()
+    size = ctypes.c_ulong(0)
+    with _CoefficientReader(buf, pool, save=saved, max_scans=max_scans, max_pixels=max_pixels,
+                            max_memory=max_memory, warnings_as_errors=warnings_as_errors) as reader:
+        decompressor = reader.decompressor
+        cinfo = decompressor.cinfo
+        markers = _saved_markers(cinfo)
+        if op == "exif":
+            op = "none"
+            for index, (code, marker_data) in enumerate(markers):
+                orientation, offset = _exif_orientation(marker_data) if code == JPEG_APP0 + 1 else (1, None)
+                if offset is not None:
+                    op = EXIF_ORIENTATIONS[orientation]
+                    patched = bytearray(marker_data)
+                    # The value is the first of the 4 bytes of the field, in either byte order
+                    patched[offset:offset + 2] = (1).to_bytes(2, "little" if marker_data[6:8] == b"II" else "big")
+                    markers[index] = (code, bytes(patched))
+                    break
+        operation = TRANSFORMS[op]
+
+        # Geometry of the result, in the transformed orientation
+        components = cinfo.num_components
+        sampling = [(cinfo.comp_info[i].h_samp_factor, cinfo.comp_info[i].v_samp_factor) for i in range(components)]
+        width, height = cinfo.image_width, cinfo.image_height
+        max_h, max_v = cinfo.max_h_samp_factor, cinfo.max_v_samp_factor
+        if operation.transpose:
+            sampling = [(v, h) for h, v in sampling]
+            width, height, max_h, max_v = height, width, max_v, max_h
+        # A single component is coded in single blocks, whatever its sampling factors
+        imcu_width = DCTSIZE * (max_h if components > 1 else 1)
+        imcu_height = DCTSIZE * (max_v if components > 1 else 1)
+        partial_column = operation.hflip and width % imcu_width
+        partial_row = operation.vflip and height % imcu_height
+        if perfect and not trim and (partial_column or partial_row):
+            raise ValueError(f"{op} of a {cinfo.image_width}x{cinfo.image_height} image is not perfect: "
+                             f"it has partial {imcu_width}x{imcu_height} iMCUs")
+        full_width, full_height = width, height
+        if trim:
+            width -= partial_column and width % imcu_width
+            height -= partial_row and height % imcu_height
+            if width == 0 or height == 0:
+                raise ValueError(f"{op} with trim leaves nothing of a {cinfo.image_width}x{cinfo.image_height} image")
+        x = y = 0
+        if crop is not None:
+            x, y, crop_width, crop_height = crop
+            if crop_width < 1 or crop_height < 1 or x < 0 or y < 0 or x + crop_width > width \
+                    or y + crop_height > height:
+                raise ValueError(f"Crop {tuple(crop)} is not within the {width}x{height} image")
+            if x % imcu_width or y % imcu_height:
+                raise ValueError(f"Crop {tuple(crop)} must start at a multiple of the "
+                                 f"{imcu_width}x{imcu_height} iMCU size")
+            width, height = crop_width, crop_height
+
+        compressor = encoder_pool.acquire()
+        try:
+            jpeg_copy_critical_parameters(decompressor.c_info, compressor.c_info)
+            out = compressor.cinfo
+            out.image_width, out.image_height = width, height
+            for i, (h, v) in enumerate(sampling):
+                out.comp_info[i].h_samp_factor, out.comp_info[i].v_samp_factor = h, v
+            if operation.transpose:
+                for table in out.quant_tbl_ptrs:
+                    if table:
+                        values = numpy.ctypeslib.as_array(table.contents.quantval).reshape(DCTSIZE, DCTSIZE)
+                        values[:] = values.T.copy()
+            if progressive if progressive is not None else cinfo.progressive_mode:
+                jpeg_simple_progression(compressor.c_info)
+            out.optimize_coding = optimize
+            # Blocks of each component of the result, and the whole rows of iMCUs that hold them
+            shapes = []
+            for h, v in sampling:
+                columns = -(-width * h // (max_h * DCTSIZE))
+                rows = -(-height * v // (max_v * DCTSIZE))
+                shapes.append((-(-rows // v) * v, -(-columns // h) * h, rows, columns))
+            # Without transposing or cropping, the blocks stay in their arrays, and only
+            # mirroring moves them, as jpegtran does; otherwise they go to new arrays
+            in_place = not operation.transpose and crop is None
+            if in_place:
+                out_arrays = reader.arrays
+            else:
+                out_arrays = request_block_arrays(compressor, [shape[:2] for shape in shapes])
+            compressor.memory_destination(ctypes.byref(buffer), ctypes.byref(size))
+            jpeg_write_coefficients(compressor.c_info, out_arrays)
+            _copy_markers(compressor, markers, keep)
+
+            for i, (array_rows, _, rows, columns) in enumerate(shapes):
+                component = cinfo.comp_info[i]
+                blocks = _blocks_of(block_array_view(decompressor, reader.arrays[i], component.height_in_blocks,
+                                                     component.width_in_blocks))
+                h, v = sampling[i] if components > 1 else (1, 1)
+                # Blocks in whole iMCUs of the full transformed image can be mirrored
+                mirrored_columns = full_width // imcu_width * h if operation.hflip else 0
+                mirrored_rows = full_height // imcu_height * v if operation.vflip else 0
+                if in_place:
+                    # jpeg_read_coefficients has defined every block, so the view may be written
+                    blocks.flags.writeable = True
+                    if mirrored_columns:
+                        _mirror_in_place(blocks.swapaxes(0, 1), mirrored_columns, _ODD_COLUMNS)
+                    if mirrored_rows:
+                        _mirror_in_place(blocks, mirrored_rows, _ODD_ROWS)
+                    continue
+                if operation.transpose:
+                    # Rows of blocks become columns, and so do the rows within each block
+                    blocks = blocks.transpose(1, 0, 3, 2)
+                result = _blocks_of(block_array_view(compressor, out_arrays[i], array_rows, columns, writable=True))
+                for rows_out, rows_in, vflip in _axis_runs(y // imcu_height * v, rows, mirrored_rows):
+                    for columns_out, columns_in, hflip in _axis_runs(x // imcu_width * h, columns, mirrored_columns):
+                        part = blocks[rows_in, columns_in]
+                        target = result[rows_out, columns_out]
+                        if hflip and vflip:
+                            numpy.multiply(part, _ODD_ROWS * _ODD_COLUMNS, out=target)
+                        elif hflip:
+                            numpy.multiply(part, _ODD_COLUMNS, out=target)
+                        elif vflip:
+                            numpy.multiply(part, _ODD_ROWS, out=target)
+                        else:
+                            target[...] = part
+            jpeg_finish_compress(compressor.c_info)
+            compressor.finish_memory()
+        finally:
+            encoder_pool.release(compressor)
+
+    address = ctypes.cast(buffer, ctypes.c_void_p).value
+    try:
+        return ctypes.string_at(address, size.value)
+    finally:
+        c_free(address)
+
+
+__all__ = [
+    "COPY_MARKERS",
+    "EXIF_ORIENTATIONS",
+    "Operation",
+    "TRANSFORMS",
+    "transform",
+]
@@ -0,0 +1,698 @@
+from ctypes import (
+    CFUNCTYPE,
+    POINTER,
+    Structure,
+    c_char_p,
+    c_int,
+    c_short,
+    c_size_t,
+    c_ubyte,
+    c_ushort,
+    c_void_p,
+)
+from enum import IntFlag
+
+from .library import libturbojpeg_lib
+
+TJ_NUMINIT = 3  # The number of initialization options
+
+
+class TJINIT(IntFlag):
+    TJINIT_COMPRESS = 0
+    TJINIT_DECOMPRESS = 1
+    TJINIT_TRANSFORM = 2
+
+
+TJINIT_COMPRESS = TJINIT.TJINIT_COMPRESS
+TJINIT_DECOMPRESS = TJINIT.TJINIT_DECOMPRESS
+TJINIT_TRANSFORM = TJINIT.TJINIT_TRANSFORM
+
+TJ_NUMSAMP = 7  # The number of chrominance subsampling options
+
+
+class TJSAMP(IntFlag):
+    TJSAMP_444 = 0
+    TJSAMP_422 = 1
+    TJSAMP_420 = 2
+    TJSAMP_GRAY = 3
+    TJSAMP_440 = 4
+    TJSAMP_411 = 5
+    TJSAMP_441 = 6
+    TJSAMP_UNKNOWN = -1
+
+
+TJSAMP_444 = TJSAMP.TJSAMP_444
+TJSAMP_422 = TJSAMP.TJSAMP_422
+TJSAMP_420 = TJSAMP.TJSAMP_420
+TJSAMP_GRAY = TJSAMP.TJSAMP_GRAY
+TJSAMP_440 = TJSAMP.TJSAMP_440
+TJSAMP_411 = TJSAMP.TJSAMP_411
+TJSAMP_441 = TJSAMP.TJSAMP_441
+TJSAMP_UNKNOWN = TJSAMP.TJSAMP_UNKNOWN
+
+tjMCUWidth = (8, 16, 16, 8, 8, 32, 8)  # MCU block width (in pixels) for a given level of chrominance subsampling.
+tjMCUHeight = (8, 8, 16, 8, 16, 8, 32)  # MCU block height (in pixels) for a given level of chrominance subsampling.
+
+TJ_NUMPF = 12  # The number of pixel formats
+
+
+class TJPF(IntFlag):
+    TJPF_RGB = 0
+    TJPF_BGR = 1
+    TJPF_RGBX = 2
+    TJPF_BGRX = 3
+    TJPF_XBGR = 4
+    TJPF_XRGB = 5
+    TJPF_GRAY = 6
+    TJPF_RGBA = 7
+    TJPF_BGRA = 8
+    TJPF_ABGR = 9
+    TJPF_ARGB = 10
+    TJPF_CMYK = 11
+    TJPF_UNKNOWN = -1
+
+
+TJPF_RGB = TJPF.TJPF_RGB
+TJPF_BGR = TJPF.TJPF_BGR
+TJPF_RGBX = TJPF.TJPF_RGBX
+TJPF_BGRX = TJPF.TJPF_BGRX
+TJPF_XBGR = TJPF.TJPF_XBGR
+TJPF_XRGB = TJPF.TJPF_XRGB
+TJPF_GRAY = TJPF.TJPF_GRAY
+TJPF_RGBA = TJPF.TJPF_RGBA
+TJPF_BGRA = TJPF.TJPF_BGRA
+TJPF_ABGR = TJPF.TJPF_ABGR
+TJPF_ARGB = TJPF.TJPF_ARGB
+TJPF_CMYK = TJPF.TJPF_CMYK
+TJPF_UNKNOWN = TJPF.TJPF_UNKNOWN
+
+tjRedOffset = (0, 2, 0, 2, 3, 1, -1, 0, 2, 3, 1, -1)  # Red offset (in samples) for a given pixel format.
+tjGreenOffset = (1, 1, 1, 1, 2, 2, -1, 1, 1, 2, 2, -1)  # Green offset (in samples) for a given pixel format.
+tjBlueOffset = (2, 0, 2, 0, 1, 3, -1, 2, 0, 1, 3, -1)  # Blue offset (in samples) for a given pixel format.
+tjAlphaOffset = (-1, -1, -1, -1, -1, -1, -1, 3, 3, 0, 0, -1)  # Alpha offset (in samples) for a given pixel format.
+tjPixelSize = (3, 3, 4, 4, 4, 4, 1, 4, 4, 4, 4, 4)  # Pixel size (in samples) for a given pixel format
+
+TJ_NUMCS = 5  # The number of JPEG colorspaces
+
+
+class TJCS(IntFlag):
+    TJCS_RGB = 0
+    TJCS_YCbCr = 1
+    TJCS_GRAY = 2
+    TJCS_CMYK = 3
+    TJCS_YCCK = 4
+
+
+TJCS_RGB = TJCS.TJCS_RGB
+TJCS_YCbCr = TJCS.TJCS_YCbCr
+TJCS_GRAY = TJCS.TJCS_GRAY
+TJCS_CMYK = TJCS.TJCS_CMYK
+TJCS_YCCK = TJCS.TJCS_YCCK
+
+
+class TJPARAM(IntFlag):
+    TJPARAM_STOPONWARNING = 0
+    TJPARAM_BOTTOMUP = 1
+    TJPARAM_NOREALLOC = 2
+    TJPARAM_QUALITY = 3
+    TJPARAM_SUBSAMP = 4
+    TJPARAM_JPEGWIDTH = 5
+    TJPARAM_JPEGHEIGHT = 6
+    TJPARAM_PRECISION = 7
+    TJPARAM_COLORSPACE = 8
+    TJPARAM_FASTUPSAMPLE = 9
+    TJPARAM_FASTDCT = 10
+    TJPARAM_OPTIMIZE = 11
+    TJPARAM_PROGRESSIVE = 12
+    TJPARAM_SCANLIMIT = 13
+    TJPARAM_ARITHMETIC = 14
+    TJPARAM_LOSSLESS = 15
+    TJPARAM_LOSSLESSPSV = 16
+    TJPARAM_LOSSLESSPT = 17
+    TJPARAM_RESTARTBLOCKS = 18
+    TJPARAM_RESTARTROWS = 19
+    TJPARAM_XDENSITY = 20
+    TJPARAM_YDENSITY = 21
+    TJPARAM_DENSITYUNITS = 22
+    TJPARAM_MAXMEMORY = 23
+    TJPARAM_MAXPIXELS = 24
+
+
+TJPARAM_STOPONWARNING = TJPARAM.TJPARAM_STOPONWARNING
+TJPARAM_BOTTOMUP = TJPARAM.TJPARAM_BOTTOMUP
+TJPARAM_NOREALLOC = TJPARAM.TJPARAM_NOREALLOC
+TJPARAM_QUALITY = TJPARAM.TJPARAM_QUALITY
+TJPARAM_SUBSAMP = TJPARAM.TJPARAM_SUBSAMP
+TJPARAM_JPEGWIDTH = TJPARAM.TJPARAM_JPEGWIDTH
+TJPARAM_JPEGHEIGHT = TJPARAM.TJPARAM_JPEGHEIGHT
+TJPARAM_PRECISION = TJPARAM.TJPARAM_PRECISION
+TJPARAM_COLORSPACE = TJPARAM.TJPARAM_COLORSPACE
+TJPARAM_FASTUPSAMPLE = TJPARAM.TJPARAM_FASTUPSAMPLE
+TJPARAM_FASTDCT = TJPARAM.TJPARAM_FASTDCT
+TJPARAM_OPTIMIZE = TJPARAM.TJPARAM_OPTIMIZE
+TJPARAM_PROGRESSIVE = TJPARAM.TJPARAM_PROGRESSIVE
+TJPARAM_SCANLIMIT = TJPARAM.TJPARAM_SCANLIMIT
+TJPARAM_ARITHMETIC = TJPARAM.TJPARAM_ARITHMETIC
+TJPARAM_LOSSLESS = TJPARAM.TJPARAM_LOSSLESS
+TJPARAM_LOSSLESSPSV = TJPARAM.TJPARAM_LOSSLESSPSV
+TJPARAM_LOSSLESSPT = TJPARAM.TJPARAM_LOSSLESSPT
+TJPARAM_RESTARTBLOCKS = TJPARAM.TJPARAM_RESTARTBLOCKS
+TJPARAM_RESTARTROWS = TJPARAM.TJPARAM_RESTARTROWS
+TJPARAM_XDENSITY = TJPARAM.TJPARAM_XDENSITY
+TJPARAM_YDENSITY = TJPARAM.TJPARAM_YDENSITY
+TJPARAM_DENSITYUNITS = TJPARAM.TJPARAM_DENSITYUNITS
+TJPARAM_MAXMEMORY = TJPARAM.TJPARAM_MAXMEMORY
+TJPARAM_MAXPIXELS = TJPARAM.TJPARAM_MAXPIXELS
+
+TJ_NUMERR = 2  # The number of error codes
+
+
+class TJERR(IntFlag):
+    TJERR_WARNING = 0
+    TJERR_FATAL = 1
+
+
+TJERR_WARNING = TJERR.TJERR_WARNING
+TJERR_FATAL = TJERR.TJERR_FATAL
+
+TJ_NUMXOP = 8  # The number of transform operations
+
+
+class TJXOP(IntFlag):
+    TJXOP_NONE = 0
+    TJXOP_HFLIP = 1
+    TJXOP_VFLIP = 2
+    TJXOP_TRANSPOSE = 3
+    TJXOP_TRANSVERSE = 4
+    TJXOP_ROT90 = 5
+    TJXOP_ROT180 = 6
+    TJXOP_ROT270 = 7
+
+
+TJXOP_NONE = TJXOP.TJXOP_NONE
+TJXOP_HFLIP = TJXOP.TJXOP_HFLIP
+TJXOP_VFLIP = TJXOP.TJXOP_VFLIP
+TJXOP_TRANSPOSE = TJXOP.TJXOP_TRANSPOSE
+TJXOP_TRANSVERSE = TJXOP.TJXOP_TRANSVERSE
+TJXOP_ROT90 = TJXOP.TJXOP_ROT90
+TJXOP_ROT180 = TJXOP.TJXOP_ROT180
+TJXOP_ROT270 = TJXOP.TJXOP_ROT270
+
+TJXOPT_PERFECT = (1 << 0)  # This option will cause tj3Transform() to return an error if the transform is not perfect.
+TJXOPT_TRIM = (1 << 1)  # This option will cause tj3Transform() to discard any partial MCU blocks that cannot be transformed.
+TJXOPT_CROP = (1 << 2)  # This option will enable lossless cropping.
+TJXOPT_GRAY = (1 << 3)  # This option will discard the color data in the source image and produce a grayscale destination image.
+TJXOPT_NOOUTPUT = (1 << 4)  # This option will prevent tj3Transform() from outputting a JPEG image for this particular transform.
+TJXOPT_PROGRESSIVE = (1 << 5)  # This option will enable progressive entropy coding in the JPEG image generated by this particular transform.
+TJXOPT_COPYNONE = (1 << 6)  # This option will prevent tj3Transform() from copying any extra markers (including EXIF and ICC profile data) from the source image to the destination image.
+TJXOPT_ARITHMETIC = (1 << 7)  # This option will enable arithmetic entropy coding in the JPEG image generated by this particular transform.
+TJXOPT_OPTIMIZE = (1 << 8)  # This option will enable optimized baseline entropy coding in the JPEG image generated by this particular transform.
+
+
+class tjscalingfactor(Structure):
+    _fields_ = (
+        ("num", c_int),  # Numerator
+
+        ("denom", c_int),  # Denominator
+    )
+
+
+class tjregion(Structure):
+    _fields_ = (
+        ("x", c_int),  # The left boundary of the cropping region.
+
+        ("y", c_int),  # The upper boundary of the cropping region.
+
+        ("w", c_int),  # The width of the cropping region.
+
+        ("h", c_int),  # The height of the cropping region.
+    )
+
+
+# Forward declaration. Definition of _fields_ will appear later.
+class tjtransform(Structure):
+    pass
+
+
+tjtransform._fields_ = (
+        ("r", tjregion),  # Cropping region
+
+        ("op", c_int),  # One of the transform operations
+
+        ("options", c_int),  # The bitwise OR of one of more of the transform options
+
+        ("data", c_void_p),  # Arbitrary data that can be accessed within the body of the callback function
+
+        # A callback function that can be used to modify the DCT coefficients after
+        # they are losslessly transformed but before they are transcoded to a new
+        # JPEG image.
+        ("customFilter", CFUNCTYPE(c_int, POINTER(c_short), tjregion, tjregion, c_int, c_int, POINTER(tjtransform))),
+    )
+
+
+tjhandle: type = c_void_p  # TurboJPEG instance handle
+
+# Create a new TurboJPEG instance.
+tj3Init = libturbojpeg_lib.tj3Init
+tj3Init.restype = tjhandle
+tj3Init.argtypes = [
+    c_int,
+]
+
+# Set the value of a parameter.
+tj3Set = libturbojpeg_lib.tj3Set
+tj3Set.restype = c_int
+tj3Set.argtypes = [
+    tjhandle,
+    c_int,
+    c_int,
+]
+
+# Get the value of a parameter.
+tj3Get = libturbojpeg_lib.tj3Get
+tj3Get.restype = c_int
+tj3Get.argtypes = [
+    tjhandle,
+    c_int,
+]
+
+# Compress an 8-bit-per-sample packed-pixel RGB, grayscale, or CMYK image into an 8-bit-per-sample JPEG image.
+tj3Compress8 = libturbojpeg_lib.tj3Compress8
+tj3Compress8.restype = c_int
+tj3Compress8.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+    POINTER(POINTER(c_ubyte)),
+    POINTER(c_size_t),
+]
+
+# Compress a 12-bit-per-sample packed-pixel RGB, grayscale, or CMYK image into a 12-bit-per-sample JPEG image.
+tj3Compress12 = libturbojpeg_lib.tj3Compress12
+tj3Compress12.restype = c_int
+tj3Compress12.argtypes = [
+    tjhandle,
+    POINTER(c_short),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+    POINTER(POINTER(c_ubyte)),
+    POINTER(c_size_t),
+]
+
+# Compress a 16-bit-per-sample packed-pixel RGB, grayscale, or CMYK image into a 16-bit-per-sample lossless JPEG image.
+tj3Compress16 = libturbojpeg_lib.tj3Compress16
+tj3Compress16.restype = c_int
+tj3Compress16.argtypes = [
+    tjhandle,
+    POINTER(c_ushort),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+    POINTER(POINTER(c_ubyte)),
+    POINTER(c_size_t),
+]
+
+# Compress an 8-bit-per-sample unified planar YUV image into an 8-bit-per-sample JPEG image.
+tj3CompressFromYUV8 = libturbojpeg_lib.tj3CompressFromYUV8
+tj3CompressFromYUV8.restype = c_int
+tj3CompressFromYUV8.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_int,
+    c_int,
+    c_int,
+    POINTER(POINTER(c_ubyte)),
+    POINTER(c_size_t),
+]
+
+# Compress a set of 8-bit-per-sample Y, U (Cb), and V (Cr) image planes into an 8-bit-per-sample JPEG image.
+tj3CompressFromYUVPlanes8 = libturbojpeg_lib.tj3CompressFromYUVPlanes8
+tj3CompressFromYUVPlanes8.restype = c_int
+tj3CompressFromYUVPlanes8.argtypes = [
+    tjhandle,
+    POINTER(POINTER(c_ubyte)),
+    c_int,
+    POINTER(c_int),
+    c_int,
+    POINTER(POINTER(c_ubyte)),
+    POINTER(c_size_t),
+]
+
+# The maximum size of the buffer (in bytes) required to hold a JPEG image with the given parameters.
+tj3JPEGBufSize = libturbojpeg_lib.tj3JPEGBufSize
+tj3JPEGBufSize.restype = c_size_t
+tj3JPEGBufSize.argtypes = [
+    c_int,
+    c_int,
+    c_int,
+]
+
+# The size of the buffer (in bytes) required to hold a unified planar YUV image with the given parameters.
+tj3YUVBufSize = libturbojpeg_lib.tj3YUVBufSize
+tj3YUVBufSize.restype = c_size_t
+tj3YUVBufSize.argtypes = [
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+]
+
+# The size of the buffer (in bytes) required to hold a YUV image plane with the given parameters.
+tj3YUVPlaneSize = libturbojpeg_lib.tj3YUVPlaneSize
+tj3YUVPlaneSize.restype = c_size_t
+tj3YUVPlaneSize.argtypes = [
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+]
+
+# The plane width of a YUV image plane with the given parameters.
+tj3YUVPlaneWidth = libturbojpeg_lib.tj3YUVPlaneWidth
+tj3YUVPlaneWidth.restype = c_int
+tj3YUVPlaneWidth.argtypes = [
+    c_int,
+    c_int,
+    c_int,
+]
+
+# The plane height of a YUV image plane with the given parameters.
+tj3YUVPlaneHeight = libturbojpeg_lib.tj3YUVPlaneHeight
+tj3YUVPlaneHeight.restype = c_int
+tj3YUVPlaneHeight.argtypes = [
+    c_int,
+    c_int,
+    c_int,
+]
+
+# Encode an 8-bit-per-sample packed-pixel RGB or grayscale image into an 8-bit-per-sample unified planar YUV image.
+tj3EncodeYUV8 = libturbojpeg_lib.tj3EncodeYUV8
+tj3EncodeYUV8.restype = c_int
+tj3EncodeYUV8.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+    POINTER(c_ubyte),
+    c_int,
+]
+
+# Encode an 8-bit-per-sample packed-pixel RGB or grayscale image into separate 8-bit-per-sample Y, U (Cb), and V (Cr) image planes.
+tj3EncodeYUVPlanes8 = libturbojpeg_lib.tj3EncodeYUVPlanes8
+tj3EncodeYUVPlanes8.restype = c_int
+tj3EncodeYUVPlanes8.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+    POINTER(POINTER(c_ubyte)),
+    POINTER(c_int),
+]
+
+# Retrieve information about a JPEG image without decompressing it, or prime the decompressor with quantization and Huffman tables.
+tj3DecompressHeader = libturbojpeg_lib.tj3DecompressHeader
+tj3DecompressHeader.restype = c_int
+tj3DecompressHeader.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_size_t,
+]
+
+# Returns a list of fractional scaling factors that the JPEG decompressor supports.
+tj3GetScalingFactors = libturbojpeg_lib.tj3GetScalingFactors
+tj3GetScalingFactors.restype = POINTER(tjscalingfactor)
+tj3GetScalingFactors.argtypes = [
+    POINTER(c_int),
+]
+
+# Set the scaling factor for subsequent lossy decompression operations.
+tj3SetScalingFactor = libturbojpeg_lib.tj3SetScalingFactor
+tj3SetScalingFactor.restype = c_int
+tj3SetScalingFactor.argtypes = [
+    tjhandle,
+    tjscalingfactor,
+]
+
+# Set the cropping region for partially decompressing a lossy JPEG image into a packed-pixel image @param handle handle to a TurboJPEG instance that has been initialized for decompression @param croppingRegion tjregion structure that specifies a subregion of the JPEG image to decompress, or <tt>TJUNCROPPED</tt> for no cropping.
+tj3SetCroppingRegion = libturbojpeg_lib.tj3SetCroppingRegion
+tj3SetCroppingRegion.restype = c_int
+tj3SetCroppingRegion.argtypes = [
+    tjhandle,
+    tjregion,
+]
+
+# Decompress an 8-bit-per-sample JPEG image into an 8-bit-per-sample packed-pixel RGB, grayscale, or CMYK image.
+tj3Decompress8 = libturbojpeg_lib.tj3Decompress8
+tj3Decompress8.restype = c_int
+tj3Decompress8.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_size_t,
+    POINTER(c_ubyte),
+    c_int,
+    c_int,
+]
+
+# Decompress a 12-bit-per-sample JPEG image into a 12-bit-per-sample packed-pixel RGB, grayscale, or CMYK image.
+tj3Decompress12 = libturbojpeg_lib.tj3Decompress12
+tj3Decompress12.restype = c_int
+tj3Decompress12.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_size_t,
+    POINTER(c_short),
+    c_int,
+    c_int,
+]
+
+# Decompress a 16-bit-per-sample lossless JPEG image into a 16-bit-per-sample packed-pixel RGB, grayscale, or CMYK image.
+tj3Decompress16 = libturbojpeg_lib.tj3Decompress16
+tj3Decompress16.restype = c_int
+tj3Decompress16.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_size_t,
+    POINTER(c_ushort),
+    c_int,
+    c_int,
+]
+
+# Decompress an 8-bit-per-sample JPEG image into an 8-bit-per-sample unified planar YUV image.
+tj3DecompressToYUV8 = libturbojpeg_lib.tj3DecompressToYUV8
+tj3DecompressToYUV8.restype = c_int
+tj3DecompressToYUV8.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_size_t,
+    POINTER(c_ubyte),
+    c_int,
+]
+
+# Decompress an 8-bit-per-sample JPEG image into separate 8-bit-per-sample Y, U (Cb), and V (Cr) image planes.
+tj3DecompressToYUVPlanes8 = libturbojpeg_lib.tj3DecompressToYUVPlanes8
+tj3DecompressToYUVPlanes8.restype = c_int
+tj3DecompressToYUVPlanes8.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_size_t,
+    POINTER(POINTER(c_ubyte)),
+    POINTER(c_int),
+]
+
+# Decode an 8-bit-per-sample unified planar YUV image into an 8-bit-per-sample packed-pixel RGB or grayscale image.
+tj3DecodeYUV8 = libturbojpeg_lib.tj3DecodeYUV8
+tj3DecodeYUV8.restype = c_int
+tj3DecodeYUV8.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_int,
+    POINTER(c_ubyte),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+]
+
+# Decode a set of 8-bit-per-sample Y, U (Cb), and V (Cr) image planes into an 8-bit-per-sample packed-pixel RGB or grayscale image.
+tj3DecodeYUVPlanes8 = libturbojpeg_lib.tj3DecodeYUVPlanes8
+tj3DecodeYUVPlanes8.restype = c_int
+tj3DecodeYUVPlanes8.argtypes = [
+    tjhandle,
+    POINTER(POINTER(c_ubyte)),
+    POINTER(c_int),
+    POINTER(c_ubyte),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+]
+
+# Losslessly transform a JPEG image into another JPEG image.
+tj3Transform = libturbojpeg_lib.tj3Transform
+tj3Transform.restype = c_int
+tj3Transform.argtypes = [
+    tjhandle,
+    POINTER(c_ubyte),
+    c_size_t,
+    c_int,
+    POINTER(POINTER(c_ubyte)),
+    POINTER(c_size_t),
+    POINTER(tjtransform),
+]
+
+# Destroy a TurboJPEG instance.
+tj3Destroy = libturbojpeg_lib.tj3Destroy
+tj3Destroy.restype = None
+tj3Destroy.argtypes = [
+    tjhandle,
+]
+
+# Allocate a byte buffer for use with TurboJPEG.
+tj3Alloc = libturbojpeg_lib.tj3Alloc
+tj3Alloc.restype = c_void_p
+tj3Alloc.argtypes = [
+    c_size_t,
+]
+
+# Load an 8-bit-per-sample packed-pixel image from disk into memory.
+tj3LoadImage8 = libturbojpeg_lib.tj3LoadImage8
+tj3LoadImage8.restype = POINTER(c_ubyte)
+tj3LoadImage8.argtypes = [
+    tjhandle,
+    c_char_p,
+    POINTER(c_int),
+    c_int,
+    POINTER(c_int),
+    POINTER(c_int),
+]
+
+# Load a 12-bit-per-sample packed-pixel image from disk into memory.
+tj3LoadImage12 = libturbojpeg_lib.tj3LoadImage12
+tj3LoadImage12.restype = POINTER(c_short)
+tj3LoadImage12.argtypes = [
+    tjhandle,
+    c_char_p,
+    POINTER(c_int),
+    c_int,
+    POINTER(c_int),
+    POINTER(c_int),
+]
+
+# Load a 16-bit-per-sample packed-pixel image from disk into memory.
+tj3LoadImage16 = libturbojpeg_lib.tj3LoadImage16
+tj3LoadImage16.restype = POINTER(c_ushort)
+tj3LoadImage16.argtypes = [
+    tjhandle,
+    c_char_p,
+    POINTER(c_int),
+    c_int,
+    POINTER(c_int),
+    POINTER(c_int),
+]
+
+# Save an 8-bit-per-sample packed-pixel image from memory to disk.
+tj3SaveImage8 = libturbojpeg_lib.tj3SaveImage8
+tj3SaveImage8.restype = c_int
+tj3SaveImage8.argtypes = [
+    tjhandle,
+    c_char_p,
+    POINTER(c_ubyte),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+]
+
+# Save a 12-bit-per-sample packed-pixel image from memory to disk.
+tj3SaveImage12 = libturbojpeg_lib.tj3SaveImage12
+tj3SaveImage12.restype = c_int
+tj3SaveImage12.argtypes = [
+    tjhandle,
+    c_char_p,
+    POINTER(c_short),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+]
+
+# Save a 16-bit-per-sample packed-pixel image from memory to disk.
+tj3SaveImage16 = libturbojpeg_lib.tj3SaveImage16
+tj3SaveImage16.restype = c_int
+tj3SaveImage16.argtypes = [
+    tjhandle,
+    c_char_p,
+    POINTER(c_ushort),
+    c_int,
+    c_int,
+    c_int,
+    c_int,
+]
+
+# Free a byte buffer previously allocated by TurboJPEG.
+tj3Free = libturbojpeg_lib.tj3Free
+tj3Free.restype = None
+tj3Free.argtypes = [
+    c_void_p,
+]
+
+# Returns a descriptive error message explaining why the last command failed.
+tj3GetErrorStr = libturbojpeg_lib.tj3GetErrorStr
+tj3GetErrorStr.restype = c_char_p
+tj3GetErrorStr.argtypes = [
+    tjhandle,
+]
+
+# Returns a code indicating the severity of the last error.
+tj3GetErrorCode = libturbojpeg_lib.tj3GetErrorCode
+tj3GetErrorCode.restype = c_int
+tj3GetErrorCode.argtypes = [
+    tjhandle,
+]
+
+__all__ = [
+    "TJCS",
+    "TJERR",
+    "TJINIT",
+    "TJPARAM",
+    "TJPF",
+    "TJSAMP",
+    "TJXOP",
+    "TJXOPT_ARITHMETIC",
+    "TJXOPT_COPYNONE",
+    "TJXOPT_CROP",
+    "TJXOPT_GRAY",
+    "TJXOPT_NOOUTPUT",
+    "TJXOPT_OPTIMIZE",
+    "TJXOPT_PERFECT",
+    "TJXOPT_PROGRESSIVE",
+    "TJXOPT_TRIM",
+    "TJ_NUMCS",
+    "TJ_NUMERR",
+    "TJ_NUMINIT",
+    "TJ_NUMPF",
+    "TJ_NUMSAMP",
+    "TJ_NUMXOP",
+    "tjAlphaOffset",
+    "tjBlueOffset",
+    "tjGreenOffset",
+    "tjMCUHeight",
+    "tjMCUWidth",
+    "tjPixelSize",
+    "tjRedOffset",
+    "tjhandle",
+    "tjregion",
+    "tjscalingfactor",
+    "tjtransform",
+]
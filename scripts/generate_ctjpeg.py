@@ -1,11 +1,13 @@
 import inspect
+import io
+import re
 
 from wrapid import CTypesCodeGenerator, ModuleBuilder
 
 from ctj.resources import resource_filename, resource_string
 
 
-def main():
+def generate_jpeglib():
     jpeglib_path = resource_filename("ctj", "jpeglib.h")
     jpeglib_contents = resource_string("ctj", "jpeglib.h")
     mb = ModuleBuilder(
@@ -107,8 +109,164 @@ def main():
     ct = CTypesCodeGenerator(
         mb,
         ("libjpeg_lib", "jpeg62.dll"))
+    module = io.StringIO()
+    ct.write_module(module)
     with open("../ctj/jpeglib.py", "w") as output:
-        ct.write_module(output)
+        output.write(fix_generated_module(module.getvalue()))
+
+
+# Return types that the code generator gets wrong, because it does not look through the EXTERN() macro
+RESTYPE_FIXES = {
+    "jpeg_std_error": "POINTER(jpeg_error_mgr)",
+    "jpeg_alloc_quant_table": "POINTER(JQUANT_TBL)",
+    "jpeg_alloc_huff_table": "POINTER(JHUFF_TBL)",
+    "jpeg_read_header": "c_int",
+    "jpeg_consume_input": "c_int",
+    "jpeg_quality_scaling": "c_int",
+    "jpeg_read_coefficients": "POINTER(jvirt_barray_ptr)",
+}
+
+
+def fix_generated_module(source: str) -> str:
+    """
+    Patch up the generated module:
+     * load the library lazily, through ctj.library, instead of at import time
+     * size boolean per platform, because the header was parsed with the Windows jconfig.h
+     * declare enum-typed fields and parameters as c_int, because IntFlag is not a ctypes type
+     * correct return types listed in RESTYPE_FIXES
+    """
+    source = source.replace("    cdll,\n", "")
+    source = re.sub(
+        r"^libjpeg_lib = cdll\.LoadLibrary\(.*\)$",
+        "from .library import libjpeg_lib\n",
+        source, count=1, flags=re.MULTILINE)
+    source = source.replace("from enum import IntFlag\n", "import sys\nfrom enum import IntFlag\n", 1)
+    source = re.sub(
+        r"^boolean: type = c_ubyte$",
+        "# jconfig.h makes boolean an unsigned char on Windows only; jmorecfg.h makes it an int elsewhere\n"
+        'boolean: type = c_ubyte if sys.platform == "win32" else c_int',
+        source, count=1, flags=re.MULTILINE)
+    enums = "J_COLOR_SPACE|J_DCT_METHOD|J_DITHER_MODE"
+    source = re.sub(rf'^(\s+\("\w+", )({enums})\)', r"\1c_int)", source, flags=re.MULTILINE)
+    source = re.sub(rf"^    ({enums}),$", "    c_int,", source, flags=re.MULTILINE)
+    for function, restype in RESTYPE_FIXES.items():
+        source = re.sub(
+            rf"^{function}\.restype = .*$", f"{function}.restype = {restype}", source, flags=re.MULTILINE)
+    return source
+
+
+# The TurboJPEG 3 API. The older tj* functions are left out on purpose.
+TJ3_FUNCTIONS = [
+    "tj3Init",
+    "tj3Set",
+    "tj3Get",
+    "tj3Compress8",
+    "tj3Compress12",
+    "tj3Compress16",
+    "tj3CompressFromYUV8",
+    "tj3CompressFromYUVPlanes8",
+    "tj3JPEGBufSize",
+    "tj3YUVBufSize",
+    "tj3YUVPlaneSize",
+    "tj3YUVPlaneWidth",
+    "tj3YUVPlaneHeight",
+    "tj3EncodeYUV8",
+    "tj3EncodeYUVPlanes8",
+    "tj3DecompressHeader",
+    "tj3GetScalingFactors",
+    "tj3SetScalingFactor",
+    "tj3SetCroppingRegion",
+    "tj3Decompress8",
+    "tj3Decompress12",
+    "tj3Decompress16",
+    "tj3DecompressToYUV8",
+    "tj3DecompressToYUVPlanes8",
+    "tj3DecodeYUV8",
+    "tj3DecodeYUVPlanes8",
+    "tj3Transform",
+    "tj3Destroy",
+    "tj3Alloc",
+    "tj3LoadImage8",
+    "tj3LoadImage12",
+    "tj3LoadImage16",
+    "tj3SaveImage8",
+    "tj3SaveImage12",
+    "tj3SaveImage16",
+    "tj3Free",
+    "tj3GetErrorStr",
+    "tj3GetErrorCode",
+]
+
+# Macros worth exporting; the rest of turbojpeg.h's macros belong to the deprecated API
+TJ3_MACRO_PREFIXES = ("TJ_NUM", "TJXOPT_")
+
+
+def generate_turbojpeg():
+    turbojpeg_path = resource_filename("ctj", "turbojpeg.h")
+    turbojpeg_contents = resource_string("ctj", "turbojpeg.h")
+    mb = ModuleBuilder(
+        path=turbojpeg_path,
+        # turbojpeg.h needs stddef.h for size_t
+        unsaved_files=(
+            (turbojpeg_path, inspect.cleandoc(f"""
+                #include "stddef.h"
+            """) + "\n" + turbojpeg_contents),
+        ),
+    )
+    turbojpeg_header = mb.in_header(turbojpeg_path)
+    turbojpeg_header.enums().include()
+    for macro in turbojpeg_header.macros():
+        if macro.name.startswith(TJ3_MACRO_PREFIXES):
+            macro.include()
+    turbojpeg_header.structs().include()
+    mb.typedef("tjhandle").include()
+
+    # The customFilter callback takes a pointer to its own struct
+    tjtransform = mb.struct("tjtransform")
+    tjtransform.include_forward(before=tjtransform)
+
+    for function_name in TJ3_FUNCTIONS:
+        mb.function(function_name).include()
+
+    ct = CTypesCodeGenerator(
+        mb,
+        ("libturbojpeg_lib", "turbojpeg.dll"))
+    module = io.StringIO()
+    ct.write_module(module)
+    with open("../ctj/turbojpeg.py", "w") as output:
+        output.write(fix_generated_turbojpeg_module(module.getvalue(), turbojpeg_contents))
+
+
+def fix_generated_turbojpeg_module(source: str, header: str) -> str:
+    """
+    Patch up the generated module:
+     * load the library lazily, through ctj.library
+     * add the static const lookup tables (tjMCUWidth, tjPixelSize, ...), which the code generator skips
+    """
+    source = source.replace("    cdll,\n", "")
+    source = re.sub(
+        r"^libturbojpeg_lib = cdll\.LoadLibrary\(.*\)$",
+        "from .library import libturbojpeg_lib\n",
+        source, count=1, flags=re.MULTILINE)
+    tables = re.findall(r"static const int (\w+)\[(\w+)\]\s*=\s*\{(.*?)\};", header, flags=re.DOTALL)
+    # Place each group of tables after the enum that indexes it
+    anchors = {
+        "TJ_NUMSAMP": "TJSAMP_UNKNOWN = TJSAMP.TJSAMP_UNKNOWN\n",
+        "TJ_NUMPF": "TJPF_UNKNOWN = TJPF.TJPF_UNKNOWN\n",
+    }
+    for size, anchor in anchors.items():
+        lines = [
+            f"{name} = ({', '.join(value.strip() for value in values.split(','))})\n"
+            for name, table_size, values in tables if table_size == size]
+        source = source.replace(anchor, anchor + "\n" + "".join(lines), 1)
+    names = "".join(f'    "{name}",\n' for name, _, _ in tables)
+    source = source.replace("__all__ = [\n", "__all__ = [\n" + names, 1)
+    return source
+
+
+def main():
+    generate_jpeglib()
+    generate_turbojpeg()
 
 
 if __name__ == "__main__":
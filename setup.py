@@ -0,0 +1,6 @@
+from setuptools import Extension, setup
+
+# Everything else is in pyproject.toml; the extension is the one thing that needs a compiler
+setup(
+    ext_modules=[Extension("ctj._guard", ["ctj/_guard.c"])],
+)
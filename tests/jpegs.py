@@ -0,0 +1,101 @@
+"""
+JPEG streams for the tests, made with ctj itself so that no image files are needed,
+and helpers to take them apart.
+"""
+
+import functools
+from typing import Iterator, Tuple
+
+import numpy
+
+import ctj
+
+SOI = 0xD8
+EOI = 0xD9
+SOS = 0xDA
+DQT = 0xDB
+DRI = 0xDD
+DHT = 0xC4
+SOF0 = 0xC0
+SOF2 = 0xC2
+APP0 = 0xE0
+APP1 = 0xE1
+APP2 = 0xE2
+COM = 0xFE
+
+
+def pixels(height: int = 48, width: int = 64, components: int = 3) -> numpy.ndarray:
+    """A smooth test image with some detail, the same every time."""
+    y, x = numpy.mgrid[0:height, 0:width]
+    channels = [(x * 255 // max(width - 1, 1) + 40 * c) % 256 for c in range(components)]
+    image = numpy.stack(channels, axis=-1).astype(numpy.uint8)
+    image[::8, :] //= 2
+    image[(y + x) % 7 == 0] = 255
+    return image
+
+
+@functools.lru_cache()
+def baseline() -> bytes:
+    return ctj.encode(pixels(), quality=90)
+
+
+@functools.lru_cache()
+def grayscale() -> bytes:
+    return ctj.encode(pixels(components=1), quality=90)
+
+
+@functools.lru_cache()
+def cmyk() -> bytes:
+    return ctj.encode(pixels(components=4), pixel_format="CMYK", quality=90)
+
+
+@functools.lru_cache()
+def progressive() -> bytes:
+    return ctj.optimize(baseline()).data
+
+
+@functools.lru_cache()
+def arithmetic(progressive: bool = False) -> bytes:
+    return ctj.optimize(baseline(), progressive=progressive, arithmetic=True).data
+
+
+def segment(marker: int, payload: bytes = b"") -> bytes:
+    """A marker segment with payload."""
+    return bytes((0xFF, marker)) + (len(payload) + 2).to_bytes(2, "big") + payload
+
+
+def segments(stream: bytes) -> Iterator[Tuple[int, int, int]]:
+    """(marker, start, end) of each marker segment after SOI, up to and including the first SOS."""
+    position = 2
+    while position + 4 <= len(stream):
+        marker = stream[position + 1]
+        end = position + 2 + int.from_bytes(stream[position + 2:position + 4], "big")
+        yield marker, position, end
+        if marker == SOS:
+            return
+        position = end
+
+
+def find(stream: bytes, marker: int) -> Tuple[int, int]:
+    """(start, end) of the first segment with marker."""
+    for code, start, end in segments(stream):
+        if code == marker:
+            return start, end
+    raise ValueError(f"No marker {marker:02X}")
+
+
+def insert_before(stream: bytes, marker: int, data: bytes) -> bytes:
+    start, _ = find(stream, marker)
+    return stream[:start] + data + stream[start:]
+
+
+def replace(stream: bytes, marker: int, data: bytes) -> bytes:
+    start, end = find(stream, marker)
+    return stream[:start] + data + stream[end:]
+
+
+def patch(stream: bytes, marker: int, offset: int, *values: int) -> bytes:
+    """stream with the bytes at offset into the payload of marker's segment replaced by values."""
+    start, _ = find(stream, marker)
+    position = start + 4 + offset
+    return stream[:position] + bytes(values) + stream[position + len(values):]
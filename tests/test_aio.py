@@ -0,0 +1,109 @@
+import asyncio
+import io
+import threading
+
+import numpy
+import pytest
+
+import ctj
+from ctj.aio import AsyncIncrementalDecoder, BoundedExecutor, adecode, aencode, aprobe
+
+from . import jpegs
+
+
+def test_coroutines():
+    async def main():
+        executor = BoundedExecutor(workers=2)
+        data = await aencode(jpegs.pixels(), quality=90, executor=executor)
+        info = await aprobe(data)
+        image = await adecode(data, executor=executor)
+        executor.shutdown()
+        return data, info, image
+
+    data, info, image = asyncio.run(main())
+    assert (info.width, info.height) == (64, 48)
+    numpy.testing.assert_array_equal(image, ctj.decode(data))
+    with pytest.raises(TypeError, match="AsyncIncrementalDecoder"):
+        asyncio.run(adecode(io.BytesIO(data)))
+
+
+def test_executor_bounds_pending_calls():
+    executor = BoundedExecutor(workers=1, max_pending=2)
+    running = []
+    release = threading.Event()
+
+    def work():
+        running.append(True)
+        release.wait(5)
+
+    async def main():
+        tasks = [asyncio.ensure_future(executor.run(work)) for _ in range(4)]
+        await asyncio.sleep(0.1)
+        # One call runs, one waits for the worker, and two wait for room
+        state = len(running), executor._semaphores[asyncio.get_running_loop()].locked()
+        release.set()
+        await asyncio.gather(*tasks)
+        return state
+
+    assert asyncio.run(main()) == (1, True)
+    executor.shutdown()
+    assert len(running) == 4
+
+
+def test_incremental_decoder_runs_on_executor(monkeypatch):
+    data = jpegs.progressive()
+    threads = set()
+    feed = ctj.IncrementalDecoder.feed
+
+    def recording_feed(self, chunk):
+        threads.add(threading.current_thread().name)
+        return feed(self, chunk)
+
+    monkeypatch.setattr(ctj.IncrementalDecoder, "feed", recording_feed)
+
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        executor = BoundedExecutor(workers=1)
+        async with AsyncIncrementalDecoder(reader, chunk_size=100, executor=executor) as decoder:
+            image = await decoder.read()
+        executor.shutdown()
+        return image
+
+    numpy.testing.assert_array_equal(asyncio.run(main()), ctj.decode(data))
+    assert threads and all(name.startswith("ctj-aio") for name in threads)
+
+
+def test_incremental_decoder_closes_after_pending_feed():
+    data = jpegs.baseline()
+    started = threading.Event()
+    release = threading.Event()
+
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        executor = BoundedExecutor(workers=1)
+        decoder = AsyncIncrementalDecoder(reader, executor=executor)
+        feed = decoder.decoder.feed
+
+        def slow_feed(chunk):
+            started.set()
+            release.wait(5)
+            return feed(chunk)
+
+        decoder.decoder.feed = slow_feed
+        task = asyncio.ensure_future(decoder.read())
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        decoder.close()
+        closed_early = decoder.decoder._decompressor is None
+        release.set()
+        await asyncio.sleep(0.1)
+        executor.shutdown()
+        return closed_early, decoder.decoder._decompressor is None
+
+    assert asyncio.run(main()) == (False, True)
@@ -0,0 +1,107 @@
+import os
+from multiprocessing import shared_memory
+
+import numpy
+import pytest
+
+import ctj
+from ctj.batch import transcode
+from ctj.pool import DecoderPool
+
+from . import jpegs
+
+
+def _files(tmp_path, count: int):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"{i}.jpg"
+        path.write_bytes(ctj.encode(numpy.roll(jpegs.pixels(), i, axis=1), quality=90))
+        paths.append(path)
+    return paths
+
+
+def _blocks() -> set:
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+def _buffers(count: int):
+    return [ctj.encode(numpy.roll(jpegs.pixels(), i, axis=1), quality=90) for i in range(count)]
+
+
+def test_decode_many():
+    buffers = _buffers(8)
+    expected = [ctj.decode(data) for data in buffers]
+    with DecoderPool() as pool:
+        images = list(ctj.decode_many(buffers, workers=3, pool=pool))
+    assert len(images) == 8
+    for image, reference in zip(images, expected):
+        numpy.testing.assert_array_equal(image, reference)
+    found = dict(ctj.decode_many(iter(buffers), workers=3, ordered=False))
+    assert sorted(found) == list(range(8))
+    for index, image in found.items():
+        numpy.testing.assert_array_equal(image, expected[index])
+    thumbnails = list(ctj.decode_many(buffers[:2], workers=2, max_size=(32, 32), pixel_format="GRAY"))
+    assert [image.shape for image in thumbnails] == [(24, 32, 1)] * 2
+    with pytest.raises(ValueError, match="at least 1"):
+        next(ctj.decode_many(buffers, workers=0))
+
+
+def test_decode_many_prefetches_a_bounded_number():
+    buffers = _buffers(2)
+    taken = []
+
+    def stream():
+        for i in range(100):
+            taken.append(i)
+            yield buffers[i % 2]
+
+    results = ctj.decode_many(stream(), workers=2, prefetch=3)
+    next(results)
+    # The first result freed one place, and it was filled at once
+    assert len(taken) == 4
+    results.close()
+    assert len(taken) == 4
+
+
+def test_decode_many_raises_in_place():
+    buffers = _buffers(4)
+    buffers[2] = b"not a jpeg"
+    results = ctj.decode_many(buffers, workers=2)
+    assert len([next(results), next(results)]) == 2
+    with pytest.raises(ctj.JpegError, match="Not a JPEG file"):
+        next(results)
+    # The rest of the buffers are abandoned
+    assert next(results, None) is None
+
+
+def test_transcode(tmp_path):
+    paths = _files(tmp_path, 4)
+    with transcode(paths, workers=2, quality=50, progressive=True) as results:
+        for path, result in zip(paths, results):
+            with result:
+                assert result.path == path
+                data = bytes(result.data)
+                assert ctj.probe(data).progressive
+                assert ctj.decode(data).shape == (48, 64, 3)
+        assert results.total.images == 4
+    with transcode(paths, workers=2, ordered=False, reencode=False) as results:
+        found = {}
+        for index, result in results:
+            with result:
+                found[index] = numpy.array(result.data)
+    for index, path in enumerate(paths):
+        numpy.testing.assert_array_equal(found[index], ctj.decode(path.read_bytes()))
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="needs /dev/shm to see shared memory blocks")
+def test_transcode_frees_shared_memory(tmp_path):
+    paths = _files(tmp_path, 6)
+    before = _blocks()
+    with transcode(paths, workers=2, prefetch=4) as results:
+        result = next(results)
+        name = result._block.name
+        result.close()
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+    # The results computed ahead, but never consumed, were unlinked too
+    assert _blocks() <= before
@@ -0,0 +1,84 @@
+import gc
+
+import numpy
+import pytest
+
+import ctj
+from ctj.coefficients import block_shape
+from ctj.pool import DecoderPool
+
+from . import jpegs
+
+
+def _assert_same_coefficients(data: bytes, expected: bytes) -> None:
+    for blocks, expected_blocks in zip(ctj.read_coefficients(data).blocks, ctj.read_coefficients(expected).blocks):
+        numpy.testing.assert_array_equal(blocks, expected_blocks)
+
+
+def test_coefficients_round_trip():
+    data = jpegs.baseline()
+    coefficients = ctj.read_coefficients(data)
+    assert (coefficients.width, coefficients.height, coefficients.sampling) == (64, 48, ((2, 2), (1, 1), (1, 1)))
+    assert [blocks.shape for blocks in coefficients.blocks] == [(6, 8, 64), (3, 4, 64), (3, 4, 64)]
+    for progressive in (False, True):
+        written = ctj.write_coefficients(coefficients, progressive=progressive)
+        _assert_same_coefficients(written, data)
+        numpy.testing.assert_array_equal(ctj.decode(written), ctj.decode(data))
+
+
+@pytest.mark.parametrize("stream", [jpegs.progressive, jpegs.grayscale, jpegs.cmyk])
+def test_other_images_round_trip(stream):
+    data = stream()
+    coefficients = ctj.read_coefficients(data)
+    assert coefficients.progressive == ctj.probe(data).progressive
+    written = ctj.write_coefficients(coefficients, optimize=True)
+    _assert_same_coefficients(written, data)
+    numpy.testing.assert_array_equal(ctj.decode(written), ctj.decode(data))
+
+
+def test_blocks_are_read_only_views():
+    with DecoderPool() as pool:
+        coefficients = ctj.read_coefficients(jpegs.baseline(), pool=pool)
+        blocks = coefficients.blocks[0]
+        assert not blocks.flags.writeable and blocks.dtype == numpy.int16
+        with pytest.raises(ValueError):
+            blocks[0, 0, 0] = 1
+        # The decompressor is held while a view of its memory is alive
+        dc = blocks[..., 0]
+        del coefficients, blocks
+        gc.collect()
+        ctj.read_coefficients(jpegs.baseline(), pool=pool)
+        assert pool.stats.creations == 2
+        del dc
+        gc.collect()
+        assert pool.stats.creations == 2 and pool.stats.hits == 0
+        ctj.read_coefficients(jpegs.baseline(), pool=pool)
+        assert pool.stats.hits == 1
+
+
+def test_made_up_coefficients():
+    # A flat gray image: only the DC coefficient of each block is set
+    shape = block_shape(20, 12, ((1, 1),), 0)
+    assert shape == (2, 3)
+    blocks = numpy.zeros(shape + (64,), dtype=numpy.int32)
+    blocks[..., 0] = 40  # 40 * 2 / 8 above mid-gray
+    coefficients = ctj.Coefficients(
+        blocks=(blocks,), quant_tables=(numpy.full(64, 2),), width=20, height=12,
+        colorspace=ctj.probe(jpegs.grayscale()).colorspace, sampling=((1, 1),), progressive=False)
+    image = ctj.decode(ctj.write_coefficients(coefficients))
+    assert image.shape == (12, 20, 1)
+    numpy.testing.assert_array_equal(image, 128 + 10)
+
+
+def test_write_rejects_bad_coefficients():
+    coefficients = ctj.read_coefficients(jpegs.baseline())
+    blocks = [numpy.array(component) for component in coefficients.blocks]
+    with pytest.raises(ValueError, match="shape"):
+        ctj.write_coefficients(coefficients._replace(blocks=(blocks[0][:-1],) + tuple(blocks[1:])))
+    blocks[1][0, 0, 5] = 2000
+    with pytest.raises(ValueError, match="out of the range"):
+        ctj.write_coefficients(coefficients._replace(blocks=tuple(blocks)))
+    with pytest.raises(ValueError, match="outside 1 to 32767"):
+        ctj.write_coefficients(coefficients._replace(quant_tables=(numpy.zeros(64),) * 3))
+    with pytest.raises(ValueError, match="sampling"):
+        ctj.write_coefficients(coefficients._replace(sampling=((5, 1), (1, 1), (1, 1))))
@@ -0,0 +1,200 @@
+import io
+import os
+import warnings
+
+import numpy
+import pytest
+
+import ctj
+from ctj.jpeglib import JCS_YCCK
+
+from . import jpegs
+
+
+def _error(decoded: numpy.ndarray, pixels: numpy.ndarray) -> int:
+    return int(numpy.abs(decoded.astype(int) - pixels).max())
+
+
+def test_round_trip():
+    pixels = jpegs.pixels()
+    assert _error(ctj.decode(ctj.encode(pixels, quality=100, subsampling="4:4:4")), pixels) <= 4
+    gray = jpegs.pixels(components=1)
+    decoded = ctj.decode(ctj.encode(gray[..., 0], quality=100))
+    assert decoded.shape == (48, 64, 1) and _error(decoded, gray) <= 1
+    cmyk = jpegs.pixels(components=4)
+    decoded = ctj.decode(ctj.encode(cmyk, pixel_format="CMYK", quality=100, subsampling="4:4:4"))
+    assert decoded.shape == (48, 64, 4) and _error(decoded, cmyk) <= 4  # coded as YCCK, as RGB is as YCbCr
+
+
+def test_cmyk_keeps_k_at_full_resolution():
+    cmyk = numpy.full((48, 64, 4), 128, dtype=numpy.uint8)
+    cmyk[..., 3] = jpegs.pixels(components=1)[..., 0]  # all the detail is in K
+    data = ctj.encode(cmyk, pixel_format="CMYK", quality=100)
+    info = ctj.probe(data)
+    assert info.colorspace == JCS_YCCK
+    assert info.sampling == ((2, 2), (1, 1), (1, 1), (2, 2))
+    assert _error(ctj.decode(data), cmyk) <= 2
+
+
+@pytest.mark.parametrize("stream", [jpegs.progressive, jpegs.arithmetic, lambda: jpegs.arithmetic(progressive=True)])
+def test_other_codings_decode_alike(stream):
+    # optimize() only codes the same coefficients again
+    numpy.testing.assert_array_equal(ctj.decode(stream()), ctj.decode(jpegs.baseline()))
+
+
+def test_sources_decode_alike(tmp_path):
+    data = jpegs.baseline()
+    image = ctj.decode(data)
+    numpy.testing.assert_array_equal(ctj.decode(bytearray(data)), image)
+    numpy.testing.assert_array_equal(ctj.decode(io.BytesIO(data)), image)
+    path = tmp_path / "image.jpg"
+    path.write_bytes(data)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        numpy.testing.assert_array_equal(ctj.decode(fd), image)
+    finally:
+        os.close(fd)
+    out = numpy.zeros_like(image)
+    assert ctj.decode(data, out=out) is out
+    numpy.testing.assert_array_equal(out, image)
+    assert ctj.decode(data, pixel_format="BGR")[..., ::-1].tolist() == image.tolist()
+
+
+def test_file_descriptors(tmp_path):
+    data = jpegs.baseline()
+    image = ctj.decode(data)
+    path = tmp_path / "images.jpg"
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        # Two images, one after the other
+        assert ctj.encode(jpegs.pixels(), quality=90, out=fd) is None
+        assert ctj.encode(jpegs.pixels(), quality=90, out=fd) is None
+        assert path.read_bytes() == data * 2
+        os.lseek(fd, 0, os.SEEK_SET)
+        numpy.testing.assert_array_equal(ctj.decode(fd), image)
+    finally:
+        os.close(fd)
+    # A pipe cannot seek, and is read through a PyJpegSource instead
+    read, write = os.pipe()
+    os.write(write, data)
+    os.close(write)
+    try:
+        numpy.testing.assert_array_equal(ctj.decode(read), image)
+    finally:
+        os.close(read)
+
+
+def test_encode_into_buffers():
+    data = jpegs.baseline()
+    grown = bytearray(10)
+    assert ctj.encode(jpegs.pixels(), quality=90, out=grown) is grown and grown == data
+    fits = bytearray(len(data) + 100)
+    assert ctj.encode(jpegs.pixels(), quality=90, out=fits) is fits and fits == data
+    room = numpy.zeros(len(data) + 100, dtype=numpy.uint8)
+    view = ctj.encode(jpegs.pixels(), quality=90, out=room)
+    assert view.nbytes == len(data) and bytes(view) == data
+    with pytest.raises(ValueError, match="does not fit"):
+        ctj.encode(jpegs.pixels(), quality=90, out=memoryview(bytearray(100)))
+
+
+@pytest.mark.parametrize("max_size, shape", [
+    ((32, 32), (24, 32)),
+    ((10, 100), (12, 16)),  # no smaller than the size that fits
+    ((1000, 1000), (48, 64)),  # never enlarged
+])
+def test_max_size(max_size, shape):
+    assert ctj.decode(jpegs.baseline(), max_size=max_size).shape[:2] == shape
+
+
+@pytest.mark.parametrize("max_size, shape", [
+    ((50, 50), (38, 50)),  # 2/8 gives exactly the size that fits
+    ((60, 60), (57, 75)),  # 3/8 is the smallest that covers 60x45
+    ((1, 1), (19, 25)),  # no further than 1/8
+])
+def test_max_size_scales_in_eighths(max_size, shape):
+    data = ctj.encode(jpegs.pixels(150, 200), quality=90)
+    for stream in (data, ctj.transform(data, "none", progressive=True)):
+        assert ctj.decode(stream, max_size=max_size).shape == shape + (3,)
+    assert ctj.decode(data, max_size=max_size, pixel_format="GRAY").shape == shape + (1,)
+
+
+def test_max_size_is_a_reduced_image():
+    y, x = numpy.mgrid[0:96, 0:128]
+    smooth = numpy.stack([x * 2, y * 2, (x + y) % 256], axis=-1).astype(numpy.uint8)
+    data = ctj.encode(smooth, quality=95)
+    image = ctj.decode(data).astype(int)
+    halved = (image[0::2, 0::2] + image[1::2, 0::2] + image[0::2, 1::2] + image[1::2, 1::2]) / 4
+    assert numpy.abs(ctj.decode(data, max_size=(64, 48)) - halved).mean() < 1
+    for max_size in ((0, 10), (10, -1)):
+        with pytest.raises(ValueError, match="max_size must be positive"):
+            ctj.decode(data, max_size=max_size)
+
+
+@pytest.mark.parametrize("region", [(20, 10, 17, 9), (0, 0, 64, 48), (63, 47, 1, 1)])
+def test_region_as_in_whole_image(region):
+    image = ctj.decode(jpegs.baseline())
+    part, decoded = ctj.decode_region(jpegs.baseline(), region)
+    x, y, width, height = region
+    assert decoded.x <= x and x + width <= decoded.x + decoded.width and (decoded.y, decoded.height) == (y, height)
+    assert part.shape == (height, decoded.width, 3)
+    # Only the columns asked for are exact: the edges of a wider window have no neighbours to upsample with
+    numpy.testing.assert_array_equal(part[:, x - decoded.x:x - decoded.x + width], image[y:y + height, x:x + width])
+    with pytest.raises(ValueError):
+        ctj.decode_region(jpegs.baseline(), (60, 0, 5, 5))
+
+
+@pytest.mark.parametrize("stream", [jpegs.progressive, jpegs.grayscale, jpegs.cmyk])
+def test_region_of_other_images(stream):
+    data = stream()
+    image = ctj.decode(data)
+    part, decoded = ctj.decode_region(data, (33, 17, 20, 30))
+    assert decoded.y == 17 and part.shape == (30, decoded.width, image.shape[2])
+    numpy.testing.assert_array_equal(part[:, 33 - decoded.x:53 - decoded.x], image[17:47, 33:53])
+
+
+def test_region_of_scaled_image():
+    data = ctj.encode(jpegs.pixels(150, 200), quality=90)
+    image = ctj.decode(data, max_size=(50, 50))
+    region = (10, 20, 30, 15)  # in the pixels of the 50x38 output
+    part, decoded = ctj.decode_region(data, region, max_size=(50, 50))
+    numpy.testing.assert_array_equal(part[:, 10 - decoded.x:40 - decoded.x], image[20:35, 10:40])
+    with pytest.raises(ValueError, match="not within the 50x38 image"):
+        ctj.decode_region(data, (0, 0, 51, 10), max_size=(50, 50))
+
+
+def test_region_into_out():
+    data = jpegs.baseline()
+    _, decoded = ctj.decode_region(data, (20, 10, 17, 9))
+    out = numpy.zeros((decoded.height, decoded.width, 3), dtype=numpy.uint8)
+    part, again = ctj.decode_region(data, (20, 10, 17, 9), out=out)
+    assert part is out and again == decoded
+    with pytest.raises(ValueError):
+        ctj.decode_region(data, (20, 10, 17, 9), out=numpy.zeros((9, 17, 3), dtype=numpy.uint8))
+
+
+@pytest.mark.parametrize("region", [(-1, 0, 5, 5), (0, -1, 5, 5), (0, 0, 0, 5), (0, 0, 5, 0), (0, 44, 5, 5)])
+def test_region_outside_image(region):
+    with pytest.raises(ValueError, match="not within the 64x48 image"):
+        ctj.decode_region(jpegs.baseline(), region)
+
+
+@pytest.mark.parametrize("stream", [jpegs.baseline, jpegs.progressive, jpegs.arithmetic])
+def test_truncated(stream):
+    data = stream()[:len(stream()) // 2]
+    with pytest.warns(ctj.JpegWarning, match="(?i)premature end"):
+        assert ctj.decode(data).shape == (48, 64, 3)
+    with pytest.raises(ctj.JpegError, match="Premature end"):
+        ctj.decode(data, warnings_as_errors=True)
+
+
+def test_garbage():
+    with pytest.raises(ctj.JpegError, match="Not a JPEG file"):
+        ctj.decode(b"garbage" * 50)
+    with pytest.raises(ValueError):
+        ctj.decode(b"")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ctj.JpegWarning)
+        with pytest.raises(ctj.JpegError, match="no image"):
+            ctj.decode(jpegs.baseline()[:100])  # cut short in the header
+    # The pooled decompressor is fine after all that
+    numpy.testing.assert_array_equal(ctj.decode(jpegs.arithmetic()), ctj.decode(jpegs.baseline()))
@@ -0,0 +1,177 @@
+import ctypes
+import io
+import os
+import subprocess
+import sys
+import warnings
+
+import pytest
+
+import ctj
+from ctj.error_manager import guarded_method
+from ctj.jpeglib import j_common_ptr, jpeg_read_header, jpeg_start_decompress
+from ctj.pool import Compressor, Decompressor
+from ctj.py_jpeg_source import PushJpegSource
+from ctj.scanlines import RowPointers
+
+from . import jpegs
+from .jpegs import DHT, DQT, DRI, SOF0, SOS, segment
+
+
+def _sos_payload(stream: bytes) -> bytes:
+    start, end = jpegs.find(stream, SOS)
+    return stream[start + 4:end]
+
+
+def _bad_progression(stream: bytes) -> bytes:
+    count = _sos_payload(stream)[0]
+    return jpegs.patch(stream, SOS, 2 + 2 * count, 5)  # Se of a DC scan
+
+
+def _second_scan(stream: bytes) -> bytes:
+    start, end = jpegs.find(stream, SOS)
+    return stream[:-2] + stream[start:end] + bytes(4) + stream[-2:]
+
+
+def _duplicate_sof(stream: bytes) -> bytes:
+    start, end = jpegs.find(stream, SOF0)
+    return jpegs.insert_before(stream, SOS, stream[start:end])
+
+
+# Streams with a fault for one of libjpeg's checks
+INVALID = {
+    "no SOI": lambda s: s[2:],
+    "two SOI": lambda s: s[:2] + s,
+    "two SOF": _duplicate_sof,
+    "hierarchical SOF": lambda s: jpegs.patch(s, SOF0, -3, 0xC5),
+    "empty image": lambda s: jpegs.patch(s, SOF0, 1, 0, 0),
+    "image too big": lambda s: jpegs.patch(s, SOF0, 3, 0xFF, 0xDD),
+    "bad precision": lambda s: jpegs.patch(s, SOF0, 0, 9),
+    "bad sampling": lambda s: jpegs.patch(s, SOF0, 7, 0x50),
+    "DHT index": lambda s: jpegs.insert_before(s, SOS, segment(DHT, bytes([4, 1] + [0] * 15) + bytes(1))),
+    "Huffman count": lambda s: jpegs.insert_before(s, SOS, segment(DHT, bytes([0] + [0] * 15 + [200]) + bytes(10))),
+    "Huffman code overflow": lambda s: jpegs.insert_before(s, SOS, segment(DHT, bytes([16, 3] + [0] * 15) + bytes(3))),
+    "DQT index": lambda s: jpegs.insert_before(s, SOS, segment(DQT, bytes([4]) + bytes(64))),
+    "DQT length": lambda s: jpegs.insert_before(s, SOS, segment(DQT, bytes([0]) + bytes(63))),
+    "DRI length": lambda s: jpegs.insert_before(s, SOS, segment(DRI, bytes(1))),
+    "reserved marker": lambda s: jpegs.insert_before(s, SOS, segment(0xC8, bytes(1))),
+    "SOS before SOF": lambda s: jpegs.replace(s, SOF0, b""),
+    "unknown component": lambda s: jpegs.patch(s, SOS, 1, 9),
+    "no quantization table": lambda s: jpegs.patch(s, SOF0, 8, 3),
+    "no Huffman table": lambda s: jpegs.patch(s, SOS, 2, 0x33),
+    "second scan": _second_scan,
+}
+
+
+def _decode_from(kind: str, data: bytes, tmp_path):
+    if kind == "bytes":
+        return ctj.decode(data)
+    if kind == "file object":
+        return ctj.decode(io.BytesIO(data))
+    path = tmp_path / "image.jpg"
+    path.write_bytes(data)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return ctj.decode(fd)
+    finally:
+        os.close(fd)
+
+
+@pytest.mark.parametrize("kind", ["bytes", "file object", "file descriptor"])
+@pytest.mark.parametrize("name", INVALID)
+def test_invalid_streams_raise_through_every_source(name, kind, tmp_path):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ctj.JpegWarning)
+        with pytest.raises(ctj.JpegError):
+            _decode_from(kind, INVALID[name](jpegs.baseline()), tmp_path)
+
+
+def test_bad_progression_raises():
+    with pytest.raises(ctj.JpegError, match="progressive parameters"):
+        ctj.decode(_bad_progression(jpegs.progressive()))
+
+
+def test_failed_decompressor_not_reused():
+    with ctj.DecoderPool() as pool:
+        with pytest.raises(ctj.JpegError):
+            ctj.decode(INVALID["DHT index"](jpegs.baseline()), pool=pool)
+        assert pool.stats == (0, 1, 1)
+        assert ctj.decode(jpegs.baseline(), pool=pool).shape == (48, 64, 3)
+
+
+def test_file_object_error_raised():
+    class Broken(io.RawIOBase):
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            raise OSError("disk on fire")
+
+    with pytest.raises(OSError, match="disk on fire"):
+        ctj.decode(Broken())
+
+
+def test_memory_manager_errors_raise():
+    # Its methods are called through pointers in the struct, not through the bindings
+    with Compressor() as compressor:
+        request = guarded_method(compressor.cinfo.mem.contents.request_virt_barray)
+        with pytest.raises(ctj.JpegError, match="memory pool code 5"):
+            request(ctypes.cast(compressor.c_info, j_common_ptr), 5, False, 1, 1, 1)
+
+
+def test_warning_as_error_stops_memory_source():
+    data = jpegs.baseline()
+    with pytest.raises(ctj.JpegError, match="(?i)premature end"):
+        ctj.decode(data[:len(data) // 2], warnings_as_errors=True)
+
+
+@pytest.mark.parametrize("progressive", [False, True])
+def test_suspension_in_arithmetic_decoder(progressive):
+    # The arithmetic decoder cannot suspend, and reports that as a fatal error
+    data = jpegs.arithmetic(progressive=progressive)
+    image = ctj.decode(data)
+    for size in (997, len(data) // 2):
+        with Decompressor() as decompressor:
+            source = PushJpegSource()
+            source.attach(decompressor)
+            source.push(data[:size])
+            with pytest.raises(ctj.JpegError, match="Suspension"):
+                jpeg_read_header(decompressor.c_info, True)
+                jpeg_start_decompress(decompressor.c_info)
+                RowPointers(image, image.shape[0]).read_scanlines(decompressor.cinfo)
+            decompressor.cinfo.src = None
+
+
+def test_jpegmem_limit_raises():
+    # A memory limit from the environment makes libjpeg ask for a backing store, which it does not have
+    script = "import ctj, sys; ctj.read_coefficients(sys.stdin.buffer.read())"
+    result = subprocess.run([sys.executable, "-c", script], input=jpegs.baseline(), capture_output=True,
+                            env=dict(os.environ, JPEGMEM="1"), cwd=os.path.dirname(os.path.dirname(ctj.__file__)))
+    assert result.returncode == 1
+    assert b"JpegError: Backing store not supported" in result.stderr
+
+
+def test_segment_between_scans_rejected(tmp_path):
+    # Only parsed when libjpeg's marker reader gets to it, after the first scan
+    data = jpegs.progressive()
+    _, end = jpegs.find(data, SOS)
+    second = data.index(bytes((0xFF, SOS)), end)
+    bad = data[:second] + segment(DHT, bytes([0] + [0] * 15 + [200]) + bytes(10)) + data[second:]
+    for kind in ("bytes", "file object", "file descriptor"):
+        with pytest.raises(ctj.JpegError):
+            _decode_from(kind, bad, tmp_path)
+
+
+def test_file_source_reads_pipe_once():
+    data = jpegs.baseline()
+    read_end, write_end = os.pipe()
+    try:
+        os.write(write_end, data)
+        os.close(write_end)
+        with Decompressor() as decompressor:
+            decompressor.file_source(read_end)
+            assert jpeg_read_header(decompressor.c_info, True)
+            assert (decompressor.cinfo.image_width, decompressor.cinfo.image_height) == (64, 48)
+            decompressor.reset()
+    finally:
+        os.close(read_end)
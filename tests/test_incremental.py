@@ -0,0 +1,61 @@
+import gc
+
+import numpy
+import pytest
+
+import ctj
+
+from . import jpegs
+
+
+def _feed(data: bytes, size: int, **kwargs):
+    """The rows that an IncrementalDecoder gives for data fed in pieces of size, and the decoder."""
+    decoder = ctj.IncrementalDecoder(**kwargs)
+    rows = []
+    for start in range(0, len(data), size):
+        piece = decoder.feed(data[start:start + size])
+        if piece is not None:
+            rows.append(piece)
+    rows.append(decoder.finish())
+    return numpy.concatenate(rows), decoder
+
+
+@pytest.mark.parametrize("stream", [jpegs.baseline, jpegs.progressive, jpegs.cmyk])
+@pytest.mark.parametrize("size", [1, 997])
+def test_pieces_decode_as_whole(stream, size):
+    data = stream()
+    image, decoder = _feed(data, size)
+    assert decoder.done and not decoder.truncated
+    numpy.testing.assert_array_equal(image, ctj.decode(data))
+
+
+@pytest.mark.parametrize("progressive", [False, True])
+def test_arithmetic_decoded_at_finish(progressive):
+    # The arithmetic decoder cannot suspend, so these images wait for the end of the stream
+    data = jpegs.arithmetic(progressive=progressive)
+    decoder = ctj.IncrementalDecoder()
+    for start in range(0, len(data), 997):
+        assert decoder.feed(data[start:start + 997]) is None
+    numpy.testing.assert_array_equal(decoder.finish(), ctj.decode(data))
+    assert decoder.done
+
+
+def test_error_closes_decoder():
+    data = jpegs.baseline()
+    decoder = ctj.IncrementalDecoder()
+    with pytest.raises(ctj.JpegError):
+        decoder.feed(data[2:])
+    with pytest.raises(ValueError):
+        decoder.feed(data)
+    decoder.close()
+
+
+def test_abandoned_in_cycle():
+    # Collected together with its decompression object, which must then not be pooled
+    pool = ctj.DecoderPool()
+    decoder = ctj.IncrementalDecoder(pool=pool)
+    decoder.feed(jpegs.baseline()[:300])
+    decoder.cycle = decoder
+    del decoder
+    gc.collect()
+    numpy.testing.assert_array_equal(ctj.decode(jpegs.baseline(), pool=pool), ctj.decode(jpegs.baseline()))
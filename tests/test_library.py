@@ -0,0 +1,68 @@
+import ctypes.util
+import os
+import sys
+
+import pytest
+
+import ctj
+from ctj.library import LazyLibrary, libjpeg_lib
+
+
+def _library(**kwargs) -> LazyLibrary:
+    options = dict(
+        env_var="CTJ_TEST_LIBRARY",
+        bundled={sys.platform: "no-such-library"},
+        system=libjpeg_lib.system,
+        link_name=libjpeg_lib.link_name,
+        marker=libjpeg_lib.marker,
+    )
+    options.update(kwargs)
+    return LazyLibrary(**options)
+
+
+def test_library_info():
+    info = ctj.library_info()
+    assert libjpeg_lib.is_loaded
+    assert info.path == libjpeg_lib.path and os.path.isfile(info.path)
+    assert info.origin in ("environment", "bundled", "system")
+    if info.version is not None:
+        assert all(part.isdigit() for part in info.version.split("."))
+        assert info.build.isdigit()
+    assert set(info.simd) <= {"MMX", "3DNOW", "SSE", "SSE2", "AVX2", "NEON", "DSPR2", "MMI", "ALTIVEC"}
+    assert ctj.library_info() is info
+
+
+def test_candidates_order(monkeypatch):
+    monkeypatch.delenv("CTJ_TEST_LIBRARY", raising=False)
+    candidates = list(_library(system=("first", "second")).candidates())
+    assert [origin for origin, _ in candidates[:3]] == ["bundled", "system", "system"]
+    assert candidates[0][1].endswith("no-such-library")
+    assert [name for _, name in candidates[1:3]] == ["first", "second"]
+    monkeypatch.setenv("CTJ_TEST_LIBRARY", "/explicit/libjpeg.so")
+    assert list(_library().candidates()) == [("environment", "/explicit/libjpeg.so")]
+
+
+def test_falls_back_to_system(monkeypatch):
+    monkeypatch.delenv("CTJ_TEST_LIBRARY", raising=False)
+    library = _library(system=("no-such-library",) + libjpeg_lib.system)
+    assert library.available()
+    assert library.origin == "system"
+    assert library.jpeg_std_error.resolve() is not None
+
+
+def test_override_does_not_fall_back(monkeypatch, tmp_path):
+    missing = str(tmp_path / "libjpeg.so")
+    monkeypatch.setenv("CTJ_TEST_LIBRARY", missing)
+    library = _library()
+    with pytest.raises(OSError, match="CTJ_TEST_LIBRARY") as raised:
+        library.load()
+    assert missing in str(raised.value)
+    assert not library.is_loaded
+    assert not library.available()
+
+
+@pytest.mark.skipif(ctypes.util.find_library("c") is None, reason="needs a C runtime to load by name")
+def test_override_needs_marker(monkeypatch):
+    monkeypatch.setenv("CTJ_TEST_LIBRARY", ctypes.util.find_library("c"))
+    with pytest.raises(OSError, match="does not export jpeg_std_error"):
+        _library().load()
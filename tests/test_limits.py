@@ -0,0 +1,73 @@
+import numpy
+import pytest
+
+import ctj
+
+from . import jpegs
+
+OUTPUT_BYTES = 48 * 64 * 3
+
+
+def _needed(function, *args, **kwargs) -> int:
+    with pytest.raises(ctj.LimitExceededError) as raised:
+        function(*args, **kwargs)
+    assert raised.value.limit == "max_memory"
+    return raised.value.value
+
+
+def _first_preview(*args, **kwargs):
+    return next(ctj.decode_progressive(*args, **kwargs))
+
+
+COEFFICIENTS = (6 * 8 + 2 * 3 * 4) * 64 * 2  # 4:2:0 blocks of 64 int16
+
+
+def test_max_memory_counts_output():
+    data = jpegs.baseline()
+    assert _needed(ctj.decode, data, max_memory=1) == OUTPUT_BYTES
+    assert _needed(_first_preview, data, max_memory=1) == OUTPUT_BYTES
+    out = numpy.empty((48, 64, 3), dtype=numpy.uint8)
+    ctj.decode(data, out=out, max_memory=1)  # the caller's, not counted
+    numpy.testing.assert_array_equal(ctj.decode(data, max_memory=OUTPUT_BYTES), out)
+
+
+def test_max_memory_checks_coefficients_first():
+    # All the coefficients of a multi-scan image, which are allocated before its scans are read
+    data = jpegs.progressive()
+    assert _needed(ctj.decode, data, max_memory=1) == COEFFICIENTS
+    assert _needed(ctj.read_coefficients, data, max_memory=1) == COEFFICIENTS
+    assert _needed(ctj.decode, data, max_memory=COEFFICIENTS) == COEFFICIENTS + OUTPUT_BYTES
+    assert _needed(_first_preview, data, max_memory=COEFFICIENTS) == COEFFICIENTS + OUTPUT_BYTES
+    ctj.decode(data, max_memory=COEFFICIENTS + OUTPUT_BYTES)
+    ctj.read_coefficients(data, max_memory=COEFFICIENTS)
+
+
+def test_max_memory_bounds_libjpeg_allocations():
+    # libjpeg's own memory comes on top of the coefficients, and it has no backing store to spill them to
+    data = jpegs.baseline()
+    assert _needed(ctj.read_coefficients, data, max_memory=COEFFICIENTS) is None
+    ctj.read_coefficients(data, max_memory=4 * COEFFICIENTS)
+    with ctj.DecoderPool() as pool:
+        ctj.read_coefficients(jpegs.progressive(), max_memory=COEFFICIENTS, pool=pool)
+        ctj.read_coefficients(data, pool=pool)  # the limit does not stay with the decompressor
+        assert pool.stats.hits == 1
+
+
+def _exceeded(function, data: bytes, **kwargs) -> ctj.LimitExceededError:
+    with pytest.raises(ctj.LimitExceededError) as raised:
+        function(data, **kwargs)
+    return raised.value
+
+
+@pytest.mark.parametrize("function", [
+    ctj.decode, ctj.read_coefficients, ctj.optimize, lambda data, **kwargs: ctj.transform(data, "rot90", **kwargs),
+])
+def test_max_scans_and_pixels(function):
+    data = jpegs.progressive()
+    scans = data.count(bytes((0xFF, jpegs.SOS)))
+    function(data, max_scans=scans, max_pixels=48 * 64)
+    error = _exceeded(function, data, max_scans=scans - 1)
+    assert (error.limit, error.maximum) == ("max_scans", scans - 1)
+    error = _exceeded(function, data, max_pixels=48 * 64 - 1)
+    assert (error.limit, error.value) == ("max_pixels", 48 * 64)
+    function(jpegs.baseline(), max_scans=1)  # a single scan is read however many are allowed
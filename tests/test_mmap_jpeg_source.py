@@ -0,0 +1,54 @@
+import numpy
+import pytest
+
+import ctj
+from ctj.jpeglib import jpeg_finish_decompress, jpeg_read_header, jpeg_start_decompress
+from ctj.pool import Decompressor
+from ctj.scanlines import RowPointers
+
+from . import jpegs
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "image.jpg"
+    path.write_bytes(jpegs.progressive())
+    return path
+
+
+def test_decode_and_probe(path):
+    data = path.read_bytes()
+    with ctj.MmapJpegSource(path) as source:
+        assert len(source) == len(data)
+        assert not source.buffer.flags.writeable
+        numpy.testing.assert_array_equal(source.decode(), ctj.decode(data))
+        assert source.decode(max_size=(32, 32)).shape == (24, 32, 3)
+        assert source.probe() == ctj.probe(data)
+        part, _ = ctj.decode_region(source.buffer, (10, 10, 20, 20))
+        assert part.shape[0] == 20
+    with open(path, "rb") as file, ctj.MmapJpegSource(file) as source:
+        numpy.testing.assert_array_equal(source.decode(pixel_format="GRAY"), ctj.decode(data, pixel_format="GRAY"))
+        assert file.tell() == 0
+
+
+def test_attach(path):
+    image = numpy.empty((48, 64, 3), dtype=numpy.uint8)
+    with ctj.MmapJpegSource(path) as source, Decompressor() as decompressor:
+        source.attach(decompressor)
+        jpeg_read_header(decompressor.c_info, True)
+        jpeg_start_decompress(decompressor.c_info)
+        assert RowPointers(image, 48).read_scanlines(decompressor.cinfo) == 48
+        jpeg_finish_decompress(decompressor.c_info)
+    numpy.testing.assert_array_equal(image, ctj.decode(path.read_bytes()))
+
+
+def test_close(path, tmp_path):
+    source = ctj.MmapJpegSource(path)
+    mapping = source.mmap
+    source.close()
+    assert mapping.closed and source.buffer is None
+    source.close()
+    empty = tmp_path / "empty.jpg"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError, match="Empty JPEG file"):
+        ctj.MmapJpegSource(empty)
@@ -0,0 +1,60 @@
+import io
+
+import numpy
+import pytest
+
+import ctj
+
+from . import jpegs
+from .jpegs import COM, SOS, segment
+
+
+def _assert_same_coefficients(data: bytes, expected: bytes) -> None:
+    for blocks, expected_blocks in zip(ctj.read_coefficients(data).blocks, ctj.read_coefficients(expected).blocks):
+        numpy.testing.assert_array_equal(blocks, expected_blocks)
+
+
+def test_optimize_is_lossless():
+    data = jpegs.baseline()
+    for arithmetic in (False, True):
+        optimized = ctj.optimize(data, arithmetic=arithmetic)
+        assert optimized.input_bytes == len(data) and optimized.saved > 0
+        _assert_same_coefficients(optimized.data, data)
+
+
+def test_optimize_options():
+    data = jpegs.insert_before(jpegs.baseline(), SOS, segment(COM, b"kept"))
+    progressive = ctj.optimize(data)
+    assert ctj.probe(progressive.data).progressive
+    assert b"kept" in progressive.data
+    sequential = ctj.optimize(data, progressive=False, copy_markers="none")
+    info = ctj.probe(sequential.data)
+    assert not info.progressive and not info.arithmetic
+    assert b"kept" not in sequential.data
+    assert ctj.probe(ctj.optimize(data, arithmetic=True).data).arithmetic
+    with pytest.raises(ValueError, match="Unknown copy_markers"):
+        ctj.optimize(data, copy_markers="some")
+
+
+def test_optimize_file():
+    data = jpegs.progressive()
+    optimized = ctj.optimize(io.BytesIO(data), progressive=False)
+    assert optimized.input_bytes == len(data)
+    _assert_same_coefficients(optimized.data, data)
+
+
+def test_optimize_many(tmp_path):
+    streams = [jpegs.baseline(), jpegs.grayscale(), jpegs.cmyk(), jpegs.progressive()]
+    path = tmp_path / "image.jpg"
+    path.write_bytes(streams[0])
+    with open(path, "rb") as file:
+        results = list(ctj.optimize_many(streams + [file], workers=2, copy_markers="none"))
+    assert [result.input_bytes for result in results] == [len(data) for data in streams] + [len(streams[0])]
+    assert results[-1].data == results[0].data
+    for result, data in zip(results, streams):
+        assert result == ctj.optimize(data, copy_markers="none")
+    found = dict(ctj.optimize_many(streams, workers=2, ordered=False))
+    assert sorted(found) == list(range(4))
+    assert sum(result.saved for result in found.values()) > 0
+    with pytest.raises(ctj.JpegError, match="Not a JPEG file"):
+        list(ctj.optimize_many([streams[0], b"not a jpeg"]))
@@ -0,0 +1,103 @@
+import ctypes
+import gc
+import threading
+
+import numpy
+import pytest
+
+import ctj
+from ctj.jpeglib import JCS_RGB, jpeg_set_defaults, jpeg_start_compress
+from ctj.pool import Compressor, DecoderPool, EncoderPool, _mem_destination_mgr
+from ctj.scanlines import RowPointers
+
+from . import jpegs
+
+
+def test_abandoned_memory_output_freed():
+    # Noise outgrows the first buffer of jpeg_mem_dest long before the end of the image
+    image = numpy.random.default_rng(0).integers(0, 256, (256, 256, 3), dtype=numpy.uint8)
+    buffer = ctypes.POINTER(ctypes.c_ubyte)()
+    size = ctypes.c_ulong(0)
+    with Compressor() as compressor:
+        cinfo = compressor.cinfo
+        compressor.memory_destination(ctypes.byref(buffer), ctypes.byref(size))
+        cinfo.image_width, cinfo.image_height = 256, 256
+        cinfo.input_components = 3
+        cinfo.in_color_space = JCS_RGB
+        jpeg_set_defaults(compressor.c_info)
+        jpeg_start_compress(compressor.c_info, True)
+        RowPointers(image, 256, writable=False).write_scanlines(cinfo, 0, 200)
+        dest = ctypes.cast(cinfo.dest, ctypes.POINTER(_mem_destination_mgr)).contents
+        assert dest.newbuffer
+        compressor.reset()
+        assert not dest.newbuffer
+
+
+def test_held_decompressor_released_on_its_thread():
+    with DecoderPool() as pool:
+        blocks = ctj.read_coefficients(jpegs.baseline(), pool=pool).blocks
+        assert pool.stats.creations == 1
+        del blocks
+        gc.collect()
+        ctj.read_coefficients(jpegs.baseline(), pool=pool)
+        assert pool.stats == (1, 1, 0)
+
+
+def test_held_decompressor_destroyed_on_other_threads():
+    with DecoderPool() as pool:
+        read = []
+        thread = threading.Thread(target=lambda: read.append(ctj.read_coefficients(jpegs.baseline(), pool=pool)))
+        thread.start()
+        thread.join()
+        assert pool.stats == (0, 1, 0)
+        read.clear()
+        gc.collect()
+        assert pool.stats == (0, 1, 1)
+        ctj.read_coefficients(jpegs.baseline(), pool=pool)
+        assert pool.stats == (0, 2, 1)
+
+
+def test_encoder_pool_reuses_compressors():
+    image = jpegs.pixels()
+    settings = [
+        dict(quality=90),
+        dict(quality=30, subsampling="4:4:4", progressive=True),
+        dict(quality=75, subsampling="4:2:2"),
+    ]
+    fresh = [ctj.encode(image, pool=EncoderPool(), **options) for options in settings]
+    with EncoderPool() as pool:
+        # Each encode starts from the defaults, whatever the one before it set
+        for _ in range(2):
+            assert [ctj.encode(image, pool=pool, **options) for options in settings] == fresh
+        assert pool.stats == (5, 1, 0)
+        # optimize() leaves computed Huffman tables behind, which release() replaces
+        ctj.optimize(fresh[0], encoder_pool=pool)
+        assert ctj.encode(image, pool=pool, **settings[0]) == fresh[0]
+    assert pool.stats.evictions == 1
+
+
+def test_encoder_pool_limits_idle_compressors():
+    with EncoderPool(max_idle=1, idle_timeout=None) as pool:
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        assert pool.stats == (0, 2, 1)
+        assert pool.acquire() is first
+    with EncoderPool(idle_timeout=0) as pool:
+        pool.release(pool.acquire())
+        pool.acquire()
+        assert pool.stats == (0, 2, 1)
+
+
+def test_encoder_pool_destroys_failed_compressors():
+    with EncoderPool() as pool:
+        compressor = pool.acquire()
+        buffer = ctypes.POINTER(ctypes.c_ubyte)()
+        size = ctypes.c_ulong(0)
+        compressor.memory_destination(ctypes.byref(buffer), ctypes.byref(size))
+        with pytest.raises(ctj.JpegError, match="Empty JPEG image"):
+            jpeg_start_compress(compressor.c_info, True)  # before any image size is set
+        pool.release(compressor)
+        assert compressor.cinfo is None
+        assert pool.stats == (0, 1, 1)
+        assert pool.acquire() is not compressor
@@ -0,0 +1,106 @@
+import io
+import mmap
+
+import pytest
+
+import ctj
+from ctj.pool import DecoderPool
+
+from . import jpegs
+from .jpegs import APP1, APP2, COM, SOS, segment
+
+_EXIF = b"Exif\0\0MM\0\x2a\0\0\0\x08\0\0"
+
+
+def _with_markers() -> bytes:
+    return jpegs.insert_before(jpegs.baseline(), SOS, segment(APP1, _EXIF) + segment(COM, b"first") + segment(COM))
+
+
+def test_probe():
+    info = ctj.probe(io.BytesIO(jpegs.baseline()))
+    assert (info.width, info.height, info.components, info.subsampling) == (64, 48, 3, "4:2:0")
+    assert not info.progressive and ctj.probe(jpegs.progressive()).progressive
+    assert ctj.probe(_with_markers()).exif
+
+
+class _Unseekable(io.BytesIO):
+    def seekable(self):
+        return False
+
+
+def test_probe_skips_large_markers(tmp_path):
+    padding = segment(APP1 + 3, bytes(60000))
+    data = jpegs.insert_before(jpegs.baseline(), SOS, padding + segment(APP2, b"ICC_PROFILE\0\1\1"))
+    path = tmp_path / "padded.jpg"
+    path.write_bytes(data)
+    info = ctj.probe(path, chunk_size=256)
+    assert info.icc and not info.exif
+    # The padding was seeked over, and the scan never reached
+    assert info.bytes_read < 4096
+    # Without seek() the padding has to be read through
+    unseekable = ctj.probe(_Unseekable(data), chunk_size=256)
+    assert unseekable.bytes_read > 60000
+    unseekable.bytes_read = info.bytes_read
+    assert unseekable == info
+
+
+def test_probe_many(tmp_path):
+    streams = [jpegs.baseline(), jpegs.progressive(), jpegs.grayscale(), jpegs.cmyk()]
+    paths = []
+    for i, data in enumerate(streams):
+        paths.append(tmp_path / f"{i}.jpg")
+        paths[-1].write_bytes(data)
+    expected = [ctj.probe(data) for data in streams]
+    infos = list(ctj.probe_many(paths, workers=3))
+    assert [info.progressive for info in infos] == [False, True, False, False]
+    assert [info.components for info in infos] == [3, 3, 1, 4]
+    assert [(info.width, info.height, info.sampling) for info in infos] == \
+        [(info.width, info.height, info.sampling) for info in expected]
+    found = dict(ctj.probe_many(paths + streams, workers=3, ordered=False, chunk_size=512))
+    assert sorted(found) == list(range(8))
+    assert found[4] == expected[0]
+    with pytest.raises(FileNotFoundError):
+        list(ctj.probe_many([paths[0], tmp_path / "missing.jpg"]))
+
+
+def test_metadata_copied():
+    with DecoderPool() as pool:
+        metadata = ctj.read_metadata(_with_markers(), pool=pool)
+        assert [name for name, _ in metadata.markers] == ["APP1", "COM", "COM"]
+        # The decompressor went back to the pool, and reading another image leaves the payloads be
+        ctj.read_metadata(jpegs.insert_before(jpegs.baseline(), SOS, segment(COM, b"other")), pool=pool)
+        assert pool.stats == (1, 1, 0)
+        assert bytes(metadata.find("COM")) == b"first"
+        assert bytes(metadata.markers[2][1]) == b""
+        assert bytes(metadata.exif) == _EXIF[6:]
+        assert metadata.xmp is None and metadata.icc_profile is None
+
+
+def test_metadata_views_memory():
+    data = bytearray(_with_markers())
+    comment = ctj.read_metadata(data).find("COM")
+    assert comment.readonly
+    data[data.index(b"first")] = ord("F")  # the payload is data itself, not a copy
+    assert bytes(comment) == b"First"
+
+
+def test_metadata_views_mmap(tmp_path):
+    path = tmp_path / "markers.jpg"
+    path.write_bytes(_with_markers())
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        metadata = ctj.read_metadata(mapped)
+        assert bytes(metadata.exif) == _EXIF[6:]
+        with pytest.raises(BufferError):
+            mapped.close()
+        del metadata
+
+
+def test_icc_profile():
+    def icc(number, count, data):
+        return segment(APP2, b"ICC_PROFILE\0" + bytes([number, count]) + data)
+
+    data = jpegs.insert_before(jpegs.baseline(), SOS, icc(2, 2, b"world") + icc(1, 2, b"hello "))
+    for source in (data, io.BytesIO(data)):
+        assert ctj.read_metadata(source).icc_profile == b"hello world"
+    missing = jpegs.insert_before(jpegs.baseline(), SOS, icc(1, 2, b"hello "))
+    assert ctj.read_metadata(missing).icc_profile is None
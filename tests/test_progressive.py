@@ -0,0 +1,51 @@
+import io
+
+import numpy
+import pytest
+
+import ctj
+from ctj.pool import DecoderPool
+
+from . import jpegs
+
+
+def _scans(data: bytes) -> int:
+    # 0xFF is always followed by 0 within entropy-coded data, so every FF DA starts a scan
+    return data.count(b"\xff\xda")
+
+
+def test_a_preview_after_each_scan():
+    data = jpegs.progressive()
+    previews = list(ctj.decode_progressive(data))
+    assert [preview.scans for preview in previews] == list(range(1, _scans(data) + 1))
+    assert [preview.final for preview in previews] == [False] * (len(previews) - 1) + [True]
+    final = ctj.decode(data)
+    numpy.testing.assert_array_equal(previews[-1].image, final)
+    errors = [numpy.abs(preview.image.astype(int) - final).mean() for preview in previews]
+    assert errors[0] > errors[len(errors) // 2] > errors[-1] == 0
+
+
+def test_every():
+    data = jpegs.progressive()
+    scans = _scans(data)
+    previews = list(ctj.decode_progressive(io.BytesIO(data), every=3, max_size=(32, 32)))
+    assert [preview.scans for preview in previews] == list(range(3, scans, 3)) + [scans]
+    assert previews[-1].image.shape == (24, 32, 3)
+    with pytest.raises(ValueError, match="at least 1"):
+        next(ctj.decode_progressive(data, every=0))
+
+
+def test_single_scan():
+    (preview,) = ctj.decode_progressive(jpegs.baseline(), pixel_format="GRAY")
+    assert preview.scans == 1 and preview.final
+    numpy.testing.assert_array_equal(preview.image, ctj.decode(jpegs.baseline(), pixel_format="GRAY"))
+
+
+def test_abandoned():
+    with DecoderPool() as pool:
+        previews = ctj.decode_progressive(jpegs.progressive(), pool=pool)
+        first = next(previews)
+        assert not first.final
+        previews.close()
+        ctj.decode(jpegs.progressive(), pool=pool)
+        assert pool.stats == (1, 1, 0)
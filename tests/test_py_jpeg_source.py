@@ -0,0 +1,146 @@
+import io
+
+import numpy
+import pytest
+
+import ctj
+from ctj.jpeglib import jpeg_finish_decompress, jpeg_read_header, jpeg_start_decompress
+from ctj.pool import Decompressor
+from ctj.py_jpeg_source import PyJpegSource
+from ctj.scanlines import RowPointers
+
+from . import jpegs
+from .jpegs import SOS, segment
+
+
+@pytest.fixture(scope="module")
+def large():
+    return ctj.encode(jpegs.pixels(240, 320), quality=90)
+
+
+def _decode(source: PyJpegSource) -> numpy.ndarray:
+    with Decompressor() as decompressor:
+        source.attach(decompressor)
+        try:
+            jpeg_read_header(decompressor.c_info, True)
+            jpeg_start_decompress(decompressor.c_info)
+            cinfo = decompressor.cinfo
+            image = numpy.empty((cinfo.output_height, cinfo.output_width, cinfo.output_components), numpy.uint8)
+            RowPointers(image, image.shape[0]).read_scanlines(cinfo)
+            jpeg_finish_decompress(decompressor.c_info)
+        finally:
+            decompressor.cinfo.src = None
+    return image
+
+
+class _ReadOnly(object):
+    """A file object with read() but no readinto()."""
+
+    def __init__(self, data: bytes):
+        self._file = io.BytesIO(data)
+        self.read = self._file.read
+
+
+def test_fixed_buffer(large):
+    source = PyJpegSource(io.BytesIO(large), buffer_size=1000)
+    numpy.testing.assert_array_equal(_decode(source), ctj.decode(large))
+    assert source.buf_size == 1000
+    assert source.bytes_read == len(large)
+    assert source.refills >= len(large) // 1000
+    with pytest.raises(ValueError, match="at least 2"):
+        PyJpegSource(io.BytesIO(large), buffer_size=1)
+
+
+def test_adaptive_buffer(large):
+    fixed = PyJpegSource(io.BytesIO(large), buffer_size=512)
+    adaptive = PyJpegSource(io.BytesIO(large), buffer_size=512, adaptive=True, max_buffer_size=16384)
+    numpy.testing.assert_array_equal(_decode(adaptive), _decode(fixed))
+    assert adaptive.buf_size == 16384
+    assert adaptive.bytes_read == fixed.bytes_read == len(large)
+    assert adaptive.refills < fixed.refills // 10
+
+
+def test_adaptive_buffer_stays_small_for_short_reads(large):
+    # A stream that returns little at a time never fills the buffer, so there is no point growing it
+    class Trickle(io.RawIOBase):
+        def __init__(self):
+            self._file = io.BytesIO(large)
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            return self._file.readinto(memoryview(buffer)[:100])
+
+    source = PyJpegSource(Trickle(), buffer_size=512, adaptive=True)
+    _decode(source)
+    assert source.buf_size == 512
+
+
+def test_read_without_readinto(large):
+    source = PyJpegSource(_ReadOnly(large), buffer_size=1000, adaptive=True)
+    numpy.testing.assert_array_equal(_decode(source), ctj.decode(large))
+    assert source.bytes_read == len(large)
+
+
+def test_file_errors_raised(large):
+    class Failing(io.BytesIO):
+        def readinto(self, buffer):
+            if self.tell() > 5000:
+                raise OSError("disk on fire")
+            return super().readinto(buffer)
+
+    source = PyJpegSource(Failing(large), buffer_size=1000)
+    with pytest.raises(OSError, match="disk on fire"):
+        _decode(source)
+    assert isinstance(source.error, OSError)
+    with pytest.raises(OSError, match="disk on fire"):
+        ctj.decode(Failing(large))
+
+
+def _padded(data: bytes) -> bytes:
+    # Four APP3 markers of 60000 bytes, which libjpeg skips with skip_input_data
+    return jpegs.insert_before(data, SOS, segment(0xE3, bytes(60000)) * 4)
+
+
+class _Unseekable(io.BytesIO):
+    def seekable(self):
+        return False
+
+
+class _FalselySeekable(io.BytesIO):
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            raise OSError("Illegal seek")
+        return super().seek(offset, whence)
+
+
+def test_skip_seeks():
+    data = _padded(jpegs.baseline())
+    source = PyJpegSource(io.BytesIO(data), buffer_size=1000)
+    numpy.testing.assert_array_equal(_decode(source), ctj.decode(jpegs.baseline()))
+    assert source.bytes_skipped >= 4 * 59000
+    assert source.bytes_read + source.bytes_skipped == len(data)
+    assert source.bytes_read < 10000
+
+
+@pytest.mark.parametrize("file_type", [_Unseekable, _FalselySeekable])
+def test_skip_reads_through(file_type):
+    data = _padded(jpegs.baseline())
+    source = PyJpegSource(file_type(data), buffer_size=1000)
+    numpy.testing.assert_array_equal(_decode(source), ctj.decode(jpegs.baseline()))
+    assert source.bytes_read + source.bytes_skipped == len(data)
+    assert source.refills < 20  # the skipped bytes are not refills
+    assert not source._seekable
+
+
+def test_skip_past_end():
+    data = jpegs.baseline()
+    start, _ = jpegs.find(data, SOS)
+    # The marker claims more bytes than there are
+    truncated = data[:start] + bytes((0xFF, 0xE3, 0xFF, 0xFF)) + bytes(100)
+    source = PyJpegSource(io.BytesIO(truncated), buffer_size=64)
+    # The file ends within the skip, and the fake EOI after it leaves the header incomplete
+    with pytest.raises(ctj.JpegError, match="missing SOS"):
+        with pytest.warns(ctj.JpegWarning, match="(?i)premature end"):
+            _decode(source)
@@ -0,0 +1,43 @@
+import numpy
+
+import ctj
+from ctj.requantize import requantize_blocks
+
+from . import jpegs
+
+
+def _assert_same_coefficients(data: bytes, expected: bytes) -> None:
+    for blocks, expected_blocks in zip(ctj.read_coefficients(data).blocks, ctj.read_coefficients(expected).blocks):
+        numpy.testing.assert_array_equal(blocks, expected_blocks)
+
+
+def test_requantize():
+    data = jpegs.baseline()
+    _assert_same_coefficients(ctj.requantize(data, quality=90), data)  # the tables it was encoded with
+    _assert_same_coefficients(ctj.requantize(data, quality=100), data)  # never finer
+    smaller = ctj.requantize(data, quality=30)
+    assert len(smaller) < len(data)
+    assert ctj.read_coefficients(smaller).quant_tables[0].min() > ctj.read_coefficients(data).quant_tables[0].min()
+
+
+def test_requantize_blocks_rounds_as_libjpeg():
+    values = numpy.arange(-2047, 2048, dtype=numpy.int16)[:, None]
+    blocks = numpy.repeat(values, 64, axis=1)
+    for old in (1, 2, 3, 16, 99, 255):
+        for start in range(old, 256, 64):
+            new = numpy.minimum(numpy.arange(start, start + 64), 255)  # a different divisor for each coefficient
+            expected = numpy.sign(values) * ((numpy.abs(values.astype(int)) * old + new // 2) // new)
+            numpy.testing.assert_array_equal(requantize_blocks(blocks, [old] * 64, new), expected)
+    # Past what float32 can do exactly, such as in a corrupt image
+    blocks = numpy.array([[-32767, -20001, 20001, 32767] * 16], dtype=numpy.int16)
+    expected = numpy.sign(blocks) * ((numpy.abs(blocks.astype(int)) * 255 + 1000 // 2) // 1000)
+    numpy.testing.assert_array_equal(requantize_blocks(blocks, [255] * 64, [1000] * 64), expected)
+
+
+def test_requantize_keeps_what_it_read():
+    data = ctj.encode(jpegs.pixels(44, 60), quality=95)
+    coefficients = ctj.read_coefficients(data)
+    result = ctj.read_coefficients(ctj.requantize(data, quality=40))
+    for blocks, old, new, expected in zip(coefficients.blocks, coefficients.quant_tables, result.quant_tables,
+                                          result.blocks):
+        numpy.testing.assert_array_equal(requantize_blocks(blocks, old, new), expected)
@@ -0,0 +1,68 @@
+import ctypes
+
+import numpy
+import pytest
+
+import ctj
+from ctj.jpeglib import jpeg_finish_decompress, jpeg_read_header, jpeg_start_decompress
+from ctj.pool import Decompressor
+from ctj.scanlines import RowPointers, buffer_address
+
+from . import jpegs
+
+
+def test_table_points_at_rows():
+    buffer = bytearray(10 * 7)
+    rows = RowPointers(buffer, 7)
+    start, _ = buffer_address(buffer)
+    assert len(rows) == 7 and rows.row_stride == rows.row_size == 10
+    assert [ctypes.cast(row, ctypes.c_void_p).value for row in rows.table] == list(range(start, start + 70, 10))
+    assert ctypes.cast(rows.at(3).contents, ctypes.c_void_p).value == start + 30
+    assert rows.buffer is buffer
+    assert RowPointers(bytearray(), 0).table is None
+
+
+def test_rejects_unusable_buffers():
+    with pytest.raises(ValueError, match="too small"):
+        RowPointers(bytearray(100), 10, row_stride=12, row_size=10)
+    RowPointers(bytearray(118), 10, row_stride=12, row_size=10)  # the last row needs no padding
+    with pytest.raises(ValueError, match="read-only"):
+        RowPointers(bytes(100), 10)
+    assert len(RowPointers(bytes(100), 10, writable=False)) == 10
+    with pytest.raises(ValueError, match="negative strides"):
+        RowPointers(numpy.zeros((10, 10), dtype=numpy.uint8)[::-1], 10)
+    with pytest.raises(ValueError, match="contiguous"):
+        RowPointers(memoryview(bytearray(200))[::2], 10)
+
+
+def test_buffer_address():
+    image = numpy.zeros((4, 6, 3), dtype=numpy.uint8)
+    assert buffer_address(image) == (image.ctypes.data, image.nbytes)
+    # A column slice spans from its first byte to its last, gaps included
+    assert buffer_address(image[:, 2:4]) == (image.ctypes.data + 6, 3 * 18 + 6)
+    data = b"abc"
+    address, size = buffer_address(data, writable=False)
+    assert size == 3 and ctypes.string_at(address, size) == data
+
+
+def _read(data: bytes, image, **kwargs) -> int:
+    with Decompressor() as decompressor:
+        decompressor.memory_source(*buffer_address(data, writable=False))
+        jpeg_read_header(decompressor.c_info, True)
+        jpeg_start_decompress(decompressor.c_info)
+        count = RowPointers(image, decompressor.cinfo.output_height, **kwargs).read_scanlines(decompressor.cinfo)
+        jpeg_finish_decompress(decompressor.c_info)
+    return count
+
+
+def test_read_scanlines_into_padded_rows():
+    data = jpegs.baseline()
+    expected = ctj.decode(data)
+    padded = numpy.zeros((48, 80, 3), dtype=numpy.uint8)
+    assert _read(data, padded, row_stride=80 * 3, row_size=64 * 3) == 48
+    numpy.testing.assert_array_equal(padded[:, :64], expected)
+    assert not padded[:, 64:].any()
+    # A view into a larger array, with the strides of the array
+    canvas = numpy.zeros((60, 100, 3), dtype=numpy.uint8)
+    _read(data, canvas[5:53, 10:74], row_stride=canvas.strides[0], row_size=64 * 3)
+    numpy.testing.assert_array_equal(canvas[5:53, 10:74], expected)
@@ -0,0 +1,68 @@
+import numpy
+import pytest
+
+import ctj
+from ctj.library import libturbojpeg_lib
+from ctj.transform import TRANSFORMS
+
+from . import jpegs
+
+
+def _blocks(data: bytes):
+    return [numpy.array(blocks) for blocks in ctj.read_coefficients(data).blocks]
+
+
+def _assert_same_coefficients(data: bytes, expected: bytes) -> None:
+    for blocks, expected_blocks in zip(_blocks(data), _blocks(expected)):
+        numpy.testing.assert_array_equal(blocks, expected_blocks)
+
+
+@pytest.mark.parametrize("op, times", [("hflip", 2), ("vflip", 2), ("rot180", 2), ("rot90", 4), ("transpose", 2)])
+def test_transforms_undo_themselves(op, times):
+    data = jpegs.baseline()  # 64x48, whole 16x16 iMCUs, so every transform is perfect
+    result = data
+    for _ in range(times):
+        result = ctj.transform(result, op, perfect=True)
+    _assert_same_coefficients(result, data)
+
+
+def test_transforms_match_pixels():
+    image = ctj.decode(ctj.encode(jpegs.pixels(), quality=100, subsampling="4:4:4"))
+    data = ctj.encode(image, quality=100, subsampling="4:4:4")
+    decoded = ctj.decode(data)
+    expected = {
+        "hflip": decoded[:, ::-1],
+        "vflip": decoded[::-1],
+        "rot90": decoded.transpose(1, 0, 2)[:, ::-1],
+        "transpose": decoded.transpose(1, 0, 2),
+    }
+    for op, pixels in expected.items():
+        # The inverse DCT of a mirrored block is not quite the mirror of the inverse DCT
+        assert numpy.abs(ctj.decode(ctj.transform(data, op)).astype(int) - pixels).max() <= 2
+
+
+@pytest.mark.parametrize("op", list(TRANSFORMS))
+def test_in_place_matches_copy(op):
+    data = ctj.encode(jpegs.pixels(44, 60))  # 4:2:0, with partial iMCUs at both edges
+    # Cropping to the whole image makes transform() copy the blocks to new arrays
+    whole = (0, 0, 44, 60) if TRANSFORMS[op].transpose else (0, 0, 60, 44)
+    expected = ctj.transform(data, op, copy_markers="comments", crop=whole)
+    _assert_same_coefficients(ctj.transform(data, op, copy_markers="comments"), expected)
+
+
+@pytest.mark.skipif(not libturbojpeg_lib.available(), reason="libturbojpeg not found")
+@pytest.mark.parametrize("op", list(TRANSFORMS))
+def test_turbojpeg_matches(op):
+    data = ctj.transform(ctj.encode(jpegs.pixels(44, 60)), progressive=True)
+    result = ctj.transform(data, op)  # by tj3Transform
+    _assert_same_coefficients(result, ctj.transform(data, op, copy_markers="comments"))
+    assert ctj.probe(result).progressive
+    assert not ctj.probe(ctj.transform(data, op, progressive=False)).progressive
+
+
+def test_crop():
+    data = jpegs.baseline()
+    cropped = ctj.transform(data, "none", crop=(16, 16, 32, 20))
+    assert ctj.decode(cropped).shape == (20, 32, 3)
+    with pytest.raises(ValueError, match="multiple"):
+        ctj.transform(data, "none", crop=(8, 0, 16, 16))
@@ -0,0 +1,67 @@
+import ctypes
+
+import numpy
+import pytest
+
+import ctj
+from ctj.library import libturbojpeg_lib
+
+from . import jpegs
+
+pytestmark = pytest.mark.skipif(not libturbojpeg_lib.available(), reason="libturbojpeg not found")
+
+
+@pytest.fixture
+def turbojpeg():
+    from ctj import turbojpeg
+    return turbojpeg
+
+
+def _pointer(data: bytes):
+    return ctypes.cast(ctypes.c_char_p(data), ctypes.POINTER(ctypes.c_ubyte))
+
+
+def test_header(turbojpeg):
+    data = jpegs.baseline()
+    handle = turbojpeg.tj3Init(turbojpeg.TJINIT_DECOMPRESS)
+    try:
+        assert turbojpeg.tj3DecompressHeader(handle, _pointer(data), len(data)) == 0
+        assert turbojpeg.tj3Get(handle, turbojpeg.TJPARAM_JPEGWIDTH) == 64
+        assert turbojpeg.tj3Get(handle, turbojpeg.TJPARAM_JPEGHEIGHT) == 48
+        assert turbojpeg.tj3Get(handle, turbojpeg.TJPARAM_SUBSAMP) == turbojpeg.TJSAMP_420
+        assert turbojpeg.tj3DecompressHeader(handle, _pointer(b"not a jpeg"), 10) == -1
+        assert turbojpeg.tj3GetErrorStr(handle).startswith(b"Not a JPEG file")
+    finally:
+        turbojpeg.tj3Destroy(handle)
+
+
+def test_decompress_matches_decode(turbojpeg):
+    data = jpegs.baseline()
+    image = numpy.empty((48, 64, 3), dtype=numpy.uint8)
+    handle = turbojpeg.tj3Init(turbojpeg.TJINIT_DECOMPRESS)
+    try:
+        assert turbojpeg.tj3DecompressHeader(handle, _pointer(data), len(data)) == 0
+        output = ctypes.cast(image.ctypes.data, ctypes.POINTER(ctypes.c_ubyte))
+        assert turbojpeg.tj3Decompress8(handle, _pointer(data), len(data), output, 0, turbojpeg.TJPF_RGB) == 0
+    finally:
+        turbojpeg.tj3Destroy(handle)
+    numpy.testing.assert_array_equal(image, ctj.decode(data))
+
+
+def test_transform(turbojpeg):
+    data = jpegs.baseline()
+    handle = turbojpeg.tj3Init(turbojpeg.TJINIT_TRANSFORM)
+    buffer = ctypes.POINTER(ctypes.c_ubyte)()
+    size = ctypes.c_size_t(0)
+    try:
+        operation = turbojpeg.tjtransform()
+        operation.op = turbojpeg.TJXOP_ROT90
+        operation.options = turbojpeg.TJXOPT_PERFECT
+        assert turbojpeg.tj3Transform(handle, _pointer(data), len(data), 1, ctypes.byref(buffer), ctypes.byref(size),
+                                      ctypes.byref(operation)) == 0
+        rotated = ctypes.string_at(buffer, size.value)
+    finally:
+        turbojpeg.tj3Free(buffer)
+        turbojpeg.tj3Destroy(handle)
+    assert ctj.probe(rotated).sampling[0] == (2, 2)
+    numpy.testing.assert_array_equal(ctj.decode(rotated), ctj.decode(ctj.transform(data, "rot90", copy_markers="icc")))